@@ -0,0 +1,29 @@
+"""dsarrequest listing indexes
+
+Revision ID: a1f3c9d2e4b7
+Revises: 61c7e5805869
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1f3c9d2e4b7'
+down_revision: Union[str, Sequence[str], None] = '61c7e5805869'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_dsarrequest_user_status_due', 'dsarrequest', ['user_id', 'status', 'due_date'], unique=False)
+    op.create_index('ix_dsarrequest_user_created_id', 'dsarrequest', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_dsarrequest_user_created_id', table_name='dsarrequest')
+    op.drop_index('ix_dsarrequest_user_status_due', table_name='dsarrequest')
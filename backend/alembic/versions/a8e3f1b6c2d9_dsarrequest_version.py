@@ -0,0 +1,28 @@
+"""dsarrequest row version
+
+Revision ID: a8e3f1b6c2d9
+Revises: f2c6a8d4b9e3
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8e3f1b6c2d9'
+down_revision: Union[str, Sequence[str], None] = 'f2c6a8d4b9e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('dsarrequest', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('dsarrequest', 'version')
@@ -0,0 +1,48 @@
+"""source snapshots
+
+Revision ID: b3d7f2a9c4e8
+Revises: a8e3f1b6c2d9
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3d7f2a9c4e8'
+down_revision: Union[str, Sequence[str], None] = 'a8e3f1b6c2d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('sourcesnapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('subject_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('source', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('fmt', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('fingerprint', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('blob_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('record_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('account_id', 'subject_key', 'source', 'fmt', name='uq_sourcesnapshot_subject_source_fmt')
+    )
+    op.create_index(op.f('ix_sourcesnapshot_account_id'), 'sourcesnapshot', ['account_id'], unique=False)
+    op.create_index(op.f('ix_sourcesnapshot_subject_key'), 'sourcesnapshot', ['subject_key'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_sourcesnapshot_subject_key'), table_name='sourcesnapshot')
+    op.drop_index(op.f('ix_sourcesnapshot_account_id'), table_name='sourcesnapshot')
+    op.drop_table('sourcesnapshot')
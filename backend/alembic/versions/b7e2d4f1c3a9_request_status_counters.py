@@ -0,0 +1,43 @@
+"""request status counters
+
+Revision ID: b7e2d4f1c3a9
+Revises: a1f3c9d2e4b7
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d4f1c3a9'
+down_revision: Union[str, Sequence[str], None] = 'a1f3c9d2e4b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('requeststatuscounter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'status', name='uq_requeststatuscounter_user_status')
+    )
+    # Seed counters for existing tenants
+    op.execute(
+        "INSERT INTO requeststatuscounter (user_id, status, count, updated_at) "
+        "SELECT user_id, status, COUNT(*), CURRENT_TIMESTAMP FROM dsarrequest GROUP BY user_id, status"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('requeststatuscounter')
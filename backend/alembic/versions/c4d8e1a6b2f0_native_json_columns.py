@@ -0,0 +1,81 @@
+"""native json columns
+
+Revision ID: c4d8e1a6b2f0
+Revises: b7e2d4f1c3a9
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8e1a6b2f0'
+down_revision: Union[str, Sequence[str], None] = 'b7e2d4f1c3a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column, GIN index) - columns that held json.dumps() text
+JSON_COLUMNS = [
+    ('dsarrequest', 'additional_info', True),
+    ('databreachreport', 'affected_data', True),
+    ('databreachreport', 'notes', False),
+    ('datasource', 'config', False),
+    ('auditlog', 'details', True),
+    ('breachevent', 'payload', True),
+]
+
+JSON_KEY_INDEXES = [
+    ('ix_dsarrequest_user_shop_domain', 'shop_domain'),
+    ('ix_dsarrequest_user_customer_id', 'customer_id'),
+]
+
+
+def _json_text(dialect: str, key: str) -> str:
+    if dialect == 'postgresql':
+        return f"(additional_info ->> '{key}')"
+    return f"json_extract(additional_info, '$.{key}')"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    tables = set(sa.inspect(bind).get_table_names())
+
+    # SQLite keeps JSON as TEXT (JSON1 functions work on it as-is); Postgres gets JSONB
+    if dialect == 'postgresql':
+        for table, column, gin in JSON_COLUMNS:
+            if table not in tables:
+                continue
+            op.execute(
+                f'ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB '
+                f"USING NULLIF({column}, '')::jsonb"
+            )
+            if gin:
+                op.execute(f'CREATE INDEX ix_{table}_{column}_gin ON {table} USING GIN ({column})')
+
+    if 'dsarrequest' in tables:
+        for name, key in JSON_KEY_INDEXES:
+            op.execute(f'CREATE INDEX {name} ON dsarrequest (user_id, {_json_text(dialect, key)})')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    tables = set(sa.inspect(bind).get_table_names())
+
+    if 'dsarrequest' in tables:
+        for name, _ in JSON_KEY_INDEXES:
+            op.drop_index(name, table_name='dsarrequest')
+
+    if dialect == 'postgresql':
+        for table, column, gin in JSON_COLUMNS:
+            if table not in tables:
+                continue
+            if gin:
+                op.drop_index(f'ix_{table}_{column}_gin', table_name=table)
+            op.execute(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE VARCHAR USING {column}::text')
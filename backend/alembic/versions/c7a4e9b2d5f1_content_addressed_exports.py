@@ -0,0 +1,60 @@
+"""content-addressed export artifacts
+
+Revision ID: c7a4e9b2d5f1
+Revises: b3d7f2a9c4e8
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+from app.json_columns import JSONType
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7a4e9b2d5f1'
+down_revision: Union[str, Sequence[str], None] = 'b3d7f2a9c4e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('casobject',
+    sa.Column('key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('sha256', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('refcount', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_table('exportmanifest',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('request_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('digest', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('bundle_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('bundle_sha256', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('entries', JSONType, nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('released_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_exportmanifest_account_id'), 'exportmanifest', ['account_id'], unique=False)
+    op.create_index(op.f('ix_exportmanifest_request_id'), 'exportmanifest', ['request_id'], unique=False)
+    # Snapshot blobs now live in the CAS; older snapshot rows point outside it and are dropped
+    # (the next export of each subject rebuilds them)
+    op.execute("DELETE FROM sourcesnapshot")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM sourcesnapshot")
+    op.drop_index(op.f('ix_exportmanifest_request_id'), table_name='exportmanifest')
+    op.drop_index(op.f('ix_exportmanifest_account_id'), table_name='exportmanifest')
+    op.drop_table('exportmanifest')
+    op.drop_table('casobject')
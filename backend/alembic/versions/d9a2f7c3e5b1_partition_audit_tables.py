@@ -0,0 +1,125 @@
+"""partition auditlog and breachevent by month
+
+Revision ID: d9a2f7c3e5b1
+Revises: c4d8e1a6b2f0
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a2f7c3e5b1'
+down_revision: Union[str, Sequence[str], None] = 'c4d8e1a6b2f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, partition key, json column, foreign key)
+PARTITIONED = [
+    ('auditlog', 'created_at', 'details', ('user_id', 'user')),
+    ('breachevent', 'timestamp', 'payload', ('breach_id', 'databreachreport')),
+]
+
+# Partitions created ahead of the current month (app.services.partitions keeps them coming)
+MONTHS_AHEAD = 3
+
+
+def month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(dt: datetime, months: int) -> datetime:
+    index = dt.year * 12 + dt.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, start: datetime) -> str:
+    return f'{table}_y{start.year:04d}m{start.month:02d}'
+
+
+def _set_aside(bind, table: str, renamed: str) -> None:
+    """Rename `table` with its primary key and indexes, freeing their names for the new table."""
+    op.execute(f'ALTER TABLE {table} RENAME TO {renamed}')
+    op.execute(f'ALTER TABLE {renamed} RENAME CONSTRAINT {table}_pkey TO {renamed}_pkey')
+    indexes = bind.execute(
+        sa.text('SELECT indexname FROM pg_indexes WHERE tablename = :t AND indexname <> :pk'),
+        {'t': renamed, 'pk': f'{renamed}_pkey'},
+    ).scalars().all()
+    for name in indexes:
+        op.execute(f'ALTER INDEX {name} RENAME TO {name}_old')
+
+
+def _create_partitioned(bind, table: str, key: str, json_col: str, fk) -> None:
+    legacy = f'{table}_legacy'
+    _set_aside(bind, table, legacy)
+    op.execute(f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE ({key})')
+    op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, {key})')
+    # Keep the id sequence alive when the legacy table goes
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+
+    # One partition per month from the oldest row up to MONTHS_AHEAD from now
+    oldest = bind.execute(sa.text(f'SELECT min({key}) FROM {legacy}')).scalar()
+    now = datetime.utcnow()
+    start = month_start(oldest or now)
+    end = add_months(month_start(now), MONTHS_AHEAD + 1)
+    while start < end:
+        upper = add_months(start, 1)
+        op.execute(
+            f'CREATE TABLE {partition_name(table, start)} PARTITION OF {table} '
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        )
+        start = upper
+    # Catch-all so a late maintenance run never rejects inserts; maintenance
+    # moves its rows out when it creates their month and retires old ones
+    op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+    op.execute(f'INSERT INTO {table} SELECT * FROM {legacy}')
+    op.execute(f'DROP TABLE {legacy}')
+
+    column, target = fk
+    op.execute(f'ALTER TABLE {table} ADD FOREIGN KEY ({column}) REFERENCES "{target}" (id)')
+    op.execute(f'CREATE INDEX ix_{table}_{key} ON {table} ({key})')
+    op.execute(f'CREATE INDEX ix_{table}_{column} ON {table} ({column}, {key})')
+    op.execute(f'CREATE INDEX ix_{table}_{json_col}_gin ON {table} USING GIN ({json_col})')
+
+
+def _create_plain(bind, table: str, key: str, json_col: str, fk) -> None:
+    partitioned = f'{table}_partitioned'
+    _set_aside(bind, table, partitioned)
+    op.execute(f'CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS)')
+    op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id)')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    op.execute(f'INSERT INTO {table} SELECT * FROM {partitioned}')
+    op.execute(f'DROP TABLE {partitioned} CASCADE')
+
+    column, target = fk
+    op.execute(f'ALTER TABLE {table} ADD FOREIGN KEY ({column}) REFERENCES "{target}" (id)')
+    op.execute(f'CREATE INDEX ix_{table}_{json_col}_gin ON {table} USING GIN ({json_col})')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    # Native partitioning is Postgres-only; SQLite keeps plain tables and
+    # retention falls back to a ranged DELETE (app.services.partitions)
+    if bind.dialect.name != 'postgresql':
+        return
+    tables = set(sa.inspect(bind).get_table_names())
+    for table, key, json_col, fk in PARTITIONED:
+        if table in tables:
+            _create_partitioned(bind, table, key, json_col, fk)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    tables = set(sa.inspect(bind).get_table_names())
+    for table, key, json_col, fk in PARTITIONED:
+        if table in tables:
+            _create_plain(bind, table, key, json_col, fk)
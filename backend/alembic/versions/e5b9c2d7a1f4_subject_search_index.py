@@ -0,0 +1,76 @@
+"""subject search index
+
+Revision ID: e5b9c2d7a1f4
+Revises: d9a2f7c3e5b1
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b9c2d7a1f4'
+down_revision: Union[str, Sequence[str], None] = 'd9a2f7c3e5b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = 'subject_email, subject_name, description'
+
+# SQLite: FTS5 trigram table + sync triggers (filled from existing rows)
+SQLITE_INSTALL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS dsarrequest_fts USING fts5(
+        {COLUMNS}, content='dsarrequest', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS dsarrequest_fts_ai AFTER INSERT ON dsarrequest BEGIN
+        INSERT INTO dsarrequest_fts(rowid, {COLUMNS})
+        VALUES (new.id, new.subject_email, new.subject_name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS dsarrequest_fts_ad AFTER DELETE ON dsarrequest BEGIN
+        INSERT INTO dsarrequest_fts(dsarrequest_fts, rowid, {COLUMNS})
+        VALUES ('delete', old.id, old.subject_email, old.subject_name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS dsarrequest_fts_au
+        AFTER UPDATE OF {COLUMNS} ON dsarrequest BEGIN
+        INSERT INTO dsarrequest_fts(dsarrequest_fts, rowid, {COLUMNS})
+        VALUES ('delete', old.id, old.subject_email, old.subject_name, old.description);
+        INSERT INTO dsarrequest_fts(rowid, {COLUMNS})
+        VALUES (new.id, new.subject_email, new.subject_name, new.description);
+    END""",
+    "INSERT INTO dsarrequest_fts(dsarrequest_fts) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS dsarrequest_fts_au',
+    'DROP TRIGGER IF EXISTS dsarrequest_fts_ad',
+    'DROP TRIGGER IF EXISTS dsarrequest_fts_ai',
+    'DROP TABLE IF EXISTS dsarrequest_fts',
+]
+
+# Postgres: pg_trgm GIN index on the subject document
+PG_INSTALL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    "CREATE INDEX IF NOT EXISTS ix_dsarrequest_subject_trgm ON dsarrequest USING GIN "
+    "((subject_email || ' ' || subject_name || ' ' || coalesce(description, '')) gin_trgm_ops)",
+]
+
+PG_UNINSTALL = ['DROP INDEX IF EXISTS ix_dsarrequest_subject_trgm']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if 'dsarrequest' not in sa.inspect(bind).get_table_names():
+        return
+    statements = {'postgresql': PG_INSTALL, 'sqlite': SQLITE_INSTALL}.get(bind.dialect.name, [])
+    for ddl in statements:
+        op.execute(ddl)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    statements = {'postgresql': PG_UNINSTALL, 'sqlite': SQLITE_UNINSTALL}.get(op.get_bind().dialect.name, [])
+    for ddl in statements:
+        op.execute(ddl)
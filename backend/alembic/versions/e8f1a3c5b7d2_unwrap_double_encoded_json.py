@@ -0,0 +1,83 @@
+"""unwrap double-encoded json, text key indexes
+
+Revision ID: e8f1a3c5b7d2
+Revises: c7a4e9b2d5f1
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8f1a3c5b7d2'
+down_revision: Union[str, Sequence[str], None] = 'c7a4e9b2d5f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Webhooks and the service layer kept calling json.dumps() after these columns
+# became JSON, so those rows hold a JSON string whose text is the object.
+JSON_COLUMNS = [
+    ('dsarrequest', 'additional_info'),
+    ('databreachreport', 'affected_data'),
+    ('databreachreport', 'notes'),
+    ('datasource', 'config'),
+    ('auditlog', 'details'),
+    ('breachevent', 'payload'),
+]
+
+JSON_KEY_INDEXES = [
+    ('ix_dsarrequest_user_shop_domain', 'shop_domain'),
+    ('ix_dsarrequest_user_customer_id', 'customer_id'),
+]
+
+
+def _unwrap(dialect: str, table: str, column: str) -> str:
+    if dialect == 'postgresql':
+        return (
+            f"UPDATE {table} SET {column} = ({column} #>> '{{}}')::jsonb "
+            f"WHERE jsonb_typeof({column}) = 'string' AND left({column} #>> '{{}}', 1) IN ('{{', '[')"
+        )
+    return (
+        f"UPDATE {table} SET {column} = json_extract({column}, '$') "
+        f"WHERE json_type({column}) = 'text' AND json_valid(json_extract({column}, '$')) "
+        f"AND json_type(json_extract({column}, '$')) IN ('object', 'array')"
+    )
+
+
+def _key_index(name: str, key: str, as_text: bool) -> str:
+    expr = f"json_extract(additional_info, '$.{key}')"
+    if as_text:
+        expr = f"CAST({expr} AS TEXT)"
+    return f'CREATE INDEX {name} ON dsarrequest (user_id, {expr})'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    tables = set(sa.inspect(bind).get_table_names())
+
+    for table, column in JSON_COLUMNS:
+        if table in tables:
+            op.execute(_unwrap(dialect, table, column))
+
+    # SQLite: key lookups now compare text (json_extract returns numbers as numbers)
+    if dialect == 'sqlite' and 'dsarrequest' in tables:
+        for name, key in JSON_KEY_INDEXES:
+            op.execute(f'DROP INDEX IF EXISTS {name}')
+            op.execute(_key_index(name, key, as_text=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+
+    # The unwrapped rows stay objects: that is what the columns should hold
+    if bind.dialect.name == 'sqlite' and 'dsarrequest' in tables:
+        for name, key in JSON_KEY_INDEXES:
+            op.execute(f'DROP INDEX IF EXISTS {name}')
+            op.execute(_key_index(name, key, as_text=False))
@@ -0,0 +1,39 @@
+"""collection versions
+
+Revision ID: f2c6a8d4b9e3
+Revises: e5b9c2d7a1f4
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6a8d4b9e3'
+down_revision: Union[str, Sequence[str], None] = 'e5b9c2d7a1f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # No seeding: a missing row reads as version 0 and the first write creates it
+    op.create_table('collectionversion',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('collection', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'collection', name='uq_collectionversion_user_collection')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('collectionversion')
@@ -3,7 +3,6 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import hmac
 import hashlib
-import json
 import logging
 from typing import Dict, Any
 
@@ -82,12 +81,12 @@ async def shopify_data_request(
             subject_email=customer_email,
             subject_name=customer_data.get("first_name", "") + " " + customer_data.get("last_name", ""),
             description=f"Data access request from Shopify store: {shop_domain}",
-            additional_info=json.dumps({
+            additional_info={
                 "source": "shopify",
                 "shop_domain": shop_domain,
                 "customer_id": customer_data.get("id"),
                 "webhook_data": body
-            })
+            }
         )
         
         db.add(new_request)
@@ -151,12 +150,12 @@ async def shopify_customer_redact(
             subject_email=customer_email,
             subject_name=customer_data.get("first_name", "") + " " + customer_data.get("last_name", ""),
             description=f"Data deletion request from Shopify store: {shop_domain}",
-            additional_info=json.dumps({
+            additional_info={
                 "source": "shopify",
                 "shop_domain": shop_domain,
                 "customer_id": customer_data.get("id"),
                 "webhook_data": body
-            })
+            }
         )
         
         db.add(new_request)
@@ -213,11 +212,11 @@ async def shopify_shop_redact(
             subject_email=account.email,  # Shop owner email
             subject_name=f"Shop Owner - {shop_domain}",
             description=f"Shop deletion request from Shopify store: {shop_domain}",
-            additional_info=json.dumps({
+            additional_info={
                 "source": "shopify",
                 "shop_domain": shop_domain,
                 "webhook_data": body
-            })
+            }
         )
         
         db.add(new_request)
@@ -275,11 +274,11 @@ async def woo_webhook(
                 request_type=RequestType.ACCESS,
                 subject_email=customer_email,
                 description=f"Data access request from WooCommerce site: {site_url}",
-                additional_info=json.dumps({
+                additional_info={
                     "source": "woocommerce",
                     "site_url": site_url,
                     "webhook_data": body
-                })
+                }
             )
             
         elif webhook_type == "customer_data_deletion":
@@ -292,11 +291,11 @@ async def woo_webhook(
                 request_type=RequestType.ERASURE,
                 subject_email=customer_email,
                 description=f"Data deletion request from WooCommerce site: {site_url}",
-                additional_info=json.dumps({
+                additional_info={
                     "source": "woocommerce",
                     "site_url": site_url,
                     "webhook_data": body
-                })
+                }
             )
             
         else:
@@ -26,6 +26,7 @@ if os.getenv("CELERY_EAGER") == "1":
     celery_app.conf.task_eager_propagates = True
 
 from celery import Celery
+from celery.schedules import crontab
 from app.config import settings
 import logging
 
@@ -34,7 +35,7 @@ celery_app = Celery(
     "gdpr_hub_lite",
     broker=settings.redis_url,
     backend=settings.redis_url,
-    include=['app.tasks.export']
+    include=['app.tasks.export', 'app.tasks.monitoring']
 )
 
 # Celery config
@@ -49,6 +50,18 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    beat_schedule={
+        # Monthly audit/breach-event partitions + retention
+        'maintain-partitions': {
+            'task': 'app.tasks.maintain_partitions',
+            'schedule': crontab(hour=2, minute=15),
+        },
+        # Orphaned export multipart uploads (parts are billed until aborted)
+        'abort-stale-uploads': {
+            'task': 'app.tasks.abort_stale_uploads',
+            'schedule': crontab(hour=3, minute=30),
+        },
+    },
 )
 
 # Logging
@@ -0,0 +1,35 @@
+# Conditional GET helpers: weak ETags + If-None-Match -> 304
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+
+CACHE_CONTROL = "private, no-cache"
+
+def weak_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def list_etag(request: Request, user_id, collection: str, version: int) -> str:
+    """Collection version + the query string (filters, cursor, limit) that shaped the page"""
+    params = sorted(request.query_params.multi_items())
+    return weak_etag(user_id, collection, version, params)
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/ prefixes are ignored on both sides
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 response when the client already holds `etag`, else None"""
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -7,6 +7,23 @@ class Settings:
     port = int(os.getenv("PORT", 9011))
     app_env = os.getenv("APP_ENV", "dev")
     database_url = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+    db_pool_size = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    db_pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # saniye: pool'dan bağlantı bekleme
+    db_pool_recycle = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    db_connect_timeout = float(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+    db_statement_timeout_ms = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))  # sadece Postgres
+    database_replica_urls = os.getenv("DATABASE_REPLICA_URLS", "")  # virgülle ayrılmış
+    replica_max_lag_seconds = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+    replica_lag_check_seconds = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "2"))
+    read_your_writes_seconds = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+    # Embedded SQLite (tek node kurulumlar): WAL + busy_timeout + tek yazıcı kuyruğu
+    sqlite_embedded = os.getenv("SQLITE_EMBEDDED", "true").lower() == "true"
+    sqlite_busy_timeout_ms = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    sqlite_cache_kb = int(os.getenv("SQLITE_CACHE_KB", "65536"))
+    sqlite_mmap_bytes = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+    audit_log_retention_days = int(os.getenv("AUDIT_LOG_RETENTION_DAYS", "365"))
+    breach_event_retention_days = int(os.getenv("BREACH_EVENT_RETENTION_DAYS", "1825"))  # Art.33(5) kayıtları
     redis_url = os.getenv("REDIS_URL", "redis://localhost:6380/0")
     jwt_secret = os.getenv("JWT_SECRET", "change-me")
     jwt_expire_min = int(os.getenv("JWT_EXPIRE_MIN", "30"))
@@ -19,5 +36,33 @@ class Settings:
     r2_bucket = os.getenv("R2_BUCKET", "")
     r2_access_key_id = os.getenv("R2_ACCESS_KEY_ID", "")
     r2_secret_access_key = os.getenv("R2_SECRET_ACCESS_KEY", "")
+    # Toplu içe aktarma (POST /api/v1/requests/bulk): gövde boyutu ve satır sayısı üst sınırı, aşılırsa 413
+    bulk_max_bytes = int(os.getenv("BULK_MAX_BYTES", str(64 * 1024 * 1024)))
+    bulk_max_rows = int(os.getenv("BULK_MAX_ROWS", "100000"))
+    # Multipart upload (export bundle'ları): part boyutu, paralel part sayısı, yarım kalan upload'ların ömrü
+    upload_part_size_mb = int(os.getenv("UPLOAD_PART_SIZE_MB", "8"))
+    upload_concurrency = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+    upload_stale_hours = int(os.getenv("UPLOAD_STALE_HOURS", "24"))
+    # Process başına tek S3 client'ı: bağlantı havuzu (eşzamanlı part upload + fetch task sayısını karşılamalı) ve timeout'lar
+    s3_max_pool_connections = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "50"))
+    s3_connect_timeout_s = float(os.getenv("S3_CONNECT_TIMEOUT_S", "5"))
+    s3_read_timeout_s = float(os.getenv("S3_READ_TIMEOUT_S", "60"))
+    # Denetçi PDF raporu: render process sayısı (0 = worker içinde) ve varsayılan dil (tr, en)
+    report_render_workers = int(os.getenv("REPORT_RENDER_WORKERS", "2"))
+    report_language = os.getenv("REPORT_LANGUAGE", "tr")
+    report_font_dir = os.getenv("REPORT_FONT_DIR", "/usr/share/fonts/truetype/dejavu")  # fonts-dejavu-core
+    # Export pipeline: veri kaynağı başına eşzamanlı fetch sınırı (tip=limit, config'te max_concurrency ile ezilir),
+    # HTTP timeout, geçici hatalarda retry sayısı ve slot için en fazla bekleme süresi
+    fetch_concurrency = os.getenv("FETCH_CONCURRENCY", "shopify=2,woocommerce=4,custom=2")
+    fetch_timeout_s = float(os.getenv("FETCH_TIMEOUT_S", "30"))
+    fetch_max_retries = int(os.getenv("FETCH_MAX_RETRIES", "3"))
+    fetch_slot_wait_s = int(os.getenv("FETCH_SLOT_WAIT_S", "600"))
+    # Bundle sıkıştırma: kuyrukta bu kadar task bekliyorsa deflate seviyesi 3'e (busy) / 1'e (high) iner;
+    # BUNDLE_ARCHIVE_ZSTD=1 ise her bundle'ın iç arşiv kopyası tar.zst olarak da saklanır
+    compression_backlog_busy = int(os.getenv("COMPRESSION_BACKLOG_BUSY", "20"))
+    compression_backlog_high = int(os.getenv("COMPRESSION_BACKLOG_HIGH", "100"))
+    bundle_archive_zstd = os.getenv("BUNDLE_ARCHIVE_ZSTD", "0") == "1"
+    # Aynı talebin tekrar export'u bu süre içinde mevcut bundle'ı (yeni indirme token'ıyla) döner
+    export_cache_ttl_s = int(os.getenv("EXPORT_CACHE_TTL_S", "900"))
 
 settings = Settings()
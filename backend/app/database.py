@@ -1,20 +1,336 @@
 # Database connection and session management
+import asyncio
+import itertools
+import logging
+import time
+from collections.abc import Generator
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional, Tuple
+import redis.asyncio as aioredis
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlmodel import create_engine, Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 from .config import settings
+from .sqlite_embedded import BEGIN_OPTION, IMMEDIATE, WriteQueue, configure_engine
 
-# Create database engine
+logger = logging.getLogger(__name__)
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _async_url(url: str) -> str:
+    """Map the sync DATABASE_URL onto its async driver."""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql+psycopg:"):
+        return url  # psycopg 3 is async-capable as-is
+    if url.startswith(("postgresql:", "postgresql+psycopg2:", "postgres:")):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+def _pool_kwargs(url: str) -> dict:
+    kwargs = {"pool_pre_ping": True, "pool_recycle": settings.db_pool_recycle}
+    if not _is_sqlite(url):
+        kwargs.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+        )
+    return kwargs
+
+def _connect_args(url: str, is_async: bool) -> dict:
+    if _is_sqlite(url):
+        args = {"timeout": settings.db_connect_timeout}
+        if not is_async:
+            args["check_same_thread"] = False
+        return args
+    if "asyncpg" in url:
+        return {
+            "timeout": settings.db_connect_timeout,
+            "server_settings": {"statement_timeout": str(settings.db_statement_timeout_ms)},
+        }
+    return {
+        "connect_timeout": int(settings.db_connect_timeout),
+        "options": f"-c statement_timeout={settings.db_statement_timeout_ms}",
+    }
+
+# Sync engine: Celery tasks, scripts and sync routes
 engine = create_engine(
     settings.database_url,
     echo=True if settings.app_env == "dev" else False,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
+    connect_args=_connect_args(settings.database_url, is_async=False),
+    **_pool_kwargs(settings.database_url)
+)
+
+# Async engine: async routers (keeps DB I/O off the event loop)
+async_database_url = _async_url(settings.database_url)
+async_engine = create_async_engine(
+    async_database_url,
+    echo=True if settings.app_env == "dev" else False,
+    connect_args=_connect_args(async_database_url, is_async=True),
+    **_pool_kwargs(async_database_url)
+)
+
+# Embedded SQLite: PRAGMAs, explicit BEGIN/BEGIN IMMEDIATE and a single writer queue
+sqlite_embedded = settings.sqlite_embedded and _is_sqlite(settings.database_url)
+if sqlite_embedded:
+    configure_engine(engine)
+    configure_engine(async_engine.sync_engine)
+write_queue = WriteQueue(engine, enabled=sqlite_embedded)
+# Write sessions take the SQLite write lock at BEGIN instead of upgrading mid-transaction
+async_write_engine = async_engine.execution_options(**{BEGIN_OPTION: IMMEDIATE}) if sqlite_embedded else async_engine
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
+# Read replicas (optional): DATABASE_REPLICA_URLS, comma-separated
+replica_engines = [
+    create_async_engine(
+        _async_url(url),
+        connect_args=_connect_args(_async_url(url), is_async=True),
+        **_pool_kwargs(_async_url(url))
+    )
+    for url in (u.strip() for u in settings.database_replica_urls.split(","))
+    if url
+]
+
+PG_REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_is_in_recovery() "
+    "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "ELSE 0 END"
+)
+
+STICKY_PREFIX = "rw:"
+STICKY_CHANNEL = "rw-writes"
+STICKY_RECONNECT_SECONDS = 2.0
+
+class ReplicaRouter:
+    """
+    Picks the engine for read-only sessions.
+
+    Replicas are tried round-robin and skipped while their replay lag is
+    above `max_lag` (checked at most every `check_interval` seconds per
+    replica). A tenant that wrote within the last `sticky_seconds` reads
+    from the primary so it sees its own writes.
+
+    The marker is kept in process and shared with the other API workers
+    without a Redis round-trip per read: `remember_write` sets `rw:<tenant>`
+    and publishes the tenant on STICKY_CHANNEL, and a listener task in every
+    process copies published writes into its local map (loading the live
+    markers whenever it (re)subscribes). Only while that listener is down do
+    reads fall back to checking the Redis marker.
+    """
+
+    def __init__(self, engines, max_lag: float, check_interval: float, sticky_seconds: float):
+        self.engines = list(engines)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self._next = itertools.cycle(range(len(self.engines))) if self.engines else None
+        self._lag: Dict[int, Tuple[float, float]] = {}
+        self._recent_writes: Dict[str, float] = {}
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+        self._listening = False
+
+    def _redis_client(self):
+        if self._redis is None:
+            self._redis = aioredis.from_url(settings.redis_url, socket_timeout=0.2)
+        return self._redis
+
+    async def replica_lag(self, engine: AsyncEngine) -> float:
+        checked_at, lag = self._lag.get(id(engine), (0.0, 0.0))
+        now = time.monotonic()
+        if now - checked_at < self.check_interval:
+            return lag
+        try:
+            if engine.dialect.name == "postgresql":
+                async with engine.connect() as conn:
+                    lag = float((await conn.execute(PG_REPLICA_LAG_SQL)).scalar() or 0)
+            else:
+                lag = 0.0
+        except Exception as e:
+            logger.warning("replica lag check failed: %s", e)
+            lag = float("inf")
+        self._lag[id(engine)] = (now, lag)
+        return lag
+
+    async def remember_write(self, tenant: str):
+        self._recent_writes[tenant] = time.monotonic()
+        if not self.engines:
+            return
+        try:
+            pipe = self._redis_client().pipeline(transaction=False)
+            pipe.set(f"{STICKY_PREFIX}{tenant}", "1", px=int(self.sticky_seconds * 1000))
+            pipe.publish(STICKY_CHANNEL, tenant)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("read-your-writes marker not shared: %s", e)
+
+    def _ensure_listener(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _load_markers(self, client):
+        """Copy the live rw:* markers (writes published while we were not subscribed)."""
+        now = time.monotonic()
+        async for key in client.scan_iter(match=f"{STICKY_PREFIX}*", count=500):
+            ttl_ms = await client.pttl(key)
+            if ttl_ms and ttl_ms > 0:
+                tenant = key.decode()[len(STICKY_PREFIX):]
+                wrote_at = now - self.sticky_seconds + ttl_ms / 1000
+                self._recent_writes[tenant] = max(self._recent_writes.get(tenant, 0.0), wrote_at)
+
+    async def _listen(self):
+        while True:
+            client = pubsub = None
+            try:
+                client = aioredis.from_url(settings.redis_url)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(STICKY_CHANNEL)
+                await self._load_markers(client)
+                self._listening = True
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        tenant = message["data"]
+                        tenant = tenant.decode() if isinstance(tenant, bytes) else tenant
+                        self._recent_writes[tenant] = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("read-your-writes listener lost, reconnecting: %s", e)
+            finally:
+                self._listening = False
+                for closable in (pubsub, client):
+                    if closable is not None:
+                        try:
+                            await closable.aclose()
+                        except Exception:
+                            pass
+            await asyncio.sleep(STICKY_RECONNECT_SECONDS)
+
+    async def is_sticky(self, tenant: Optional[str]) -> bool:
+        if tenant is None:
+            return False
+        wrote_at = self._recent_writes.get(tenant)
+        if wrote_at is not None:
+            if time.monotonic() - wrote_at < self.sticky_seconds:
+                return True
+            self._recent_writes.pop(tenant, None)
+        self._ensure_listener()
+        if self._listening:
+            return False
+        try:
+            return bool(await self._redis_client().exists(f"{STICKY_PREFIX}{tenant}"))
+        except Exception:
+            return False
+
+    async def pick(self, tenant: Optional[str] = None) -> Optional[AsyncEngine]:
+        """Replica engine to read from, or None for the primary."""
+        if not self.engines or await self.is_sticky(tenant):
+            return None
+        for _ in range(len(self.engines)):
+            engine = self.engines[next(self._next)]
+            if await self.replica_lag(engine) <= self.max_lag:
+                return engine
+        return None
+
+replica_router = ReplicaRouter(
+    replica_engines,
+    max_lag=settings.replica_max_lag_seconds,
+    check_interval=settings.replica_lag_check_seconds,
+    sticky_seconds=settings.read_your_writes_seconds,
 )
 
+@event.listens_for(Session, "after_flush")
+def _flag_session_write(session, flush_context):
+    session.info["wrote"] = True
+
+# Collection versions for list ETags and status events (register their session listeners)
+from .services import collection_versions, events  # noqa: E402,F401
+
 # Create all tables
 def create_db_and_tables():
-    from .models import User, Account, DSARRequest, AuditLog, DataSource, Consent, ProcessingActivity, EmailNotification, EmailSuppression, DataBreachReport, BreachEvent, DownloadToken
+    from .models import User, Account, DSARRequest, AuditLog, DataSource, Consent, ProcessingActivity, EmailNotification, EmailSuppression, DataBreachReport, BreachEvent, DownloadToken, RequestStatusCounter, CollectionVersion
+    from .services.search import install_search_index
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        install_search_index(conn)
+
+# Get database session (sync)
+@contextmanager
+def session_scope():
+    """One sync Session per scope (workers, scripts); rolled back on error and closed at exit."""
+    session = Session(engine)
+    try:
+        yield session
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def get_session_dep():
+    """`Depends(get_session_dep)`: a sync Session for the request."""
+    with session_scope() as session:
+        yield session
+
+class get_session(Generator):
+    """
+    A sync Session, as `with get_session() as session:` or as
+    `Depends(get_session)`.
+
+    An instance is a generator over `get_session_dep()`, which is what
+    FastAPI drives for a yield dependency, and a context manager over the
+    same generator. `__call__` is a generator function only so that FastAPI
+    recognises the class as a yield dependency.
+    """
+
+    def __init__(self):
+        self._gen = get_session_dep()
+        self._scope = contextmanager(lambda: self._gen)()
+
+    def __enter__(self) -> Session:
+        return self._scope.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._scope.__exit__(exc_type, exc, tb)
+
+    def send(self, value):
+        return self._gen.send(value)
+
+    def throw(self, typ, val=None, tb=None):
+        return self._gen.throw(typ, val, tb)
+
+    def __call__(self):
+        yield from self
+
+# Get database session (async)
+async def get_async_session():
+    async with AsyncSessionLocal() as session:
+        yield session
+
+@asynccontextmanager
+async def tenant_session(tenant):
+    """Primary session for a tenant; writes make its next reads primary-sticky."""
+    async with AsyncSessionLocal(bind=async_write_engine) as session:
+        # Status events are published here, with the async client, once committed
+        session.info["defer_events"] = True
+        try:
+            yield session
+        finally:
+            if session.info.pop("wrote", False):
+                await replica_router.remember_write(str(tenant))
+            await events.publish_deferred(session)
 
-# Get database session
-def get_session():
-    with Session(engine) as session:
+@asynccontextmanager
+async def read_session(tenant=None):
+    """Read-only session, served by a healthy replica when one is configured."""
+    engine = await replica_router.pick(None if tenant is None else str(tenant))
+    async with (AsyncSessionLocal(bind=engine) if engine else AsyncSessionLocal()) as session:
         yield session
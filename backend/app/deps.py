@@ -1,16 +1,27 @@
 from fastapi import HTTPException, Depends
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from .models import User, Account, DSARRequest
-from .database import get_session
+from .database import get_async_session, read_session, tenant_session
 from .auth import verify_token
 from typing import List
 
+# Primary session for the calling tenant (writes)
+async def get_tenant_session(user_id: str = Depends(verify_token)):
+    async with tenant_session(user_id) as session:
+        yield session
+
+# Read-only session for the calling tenant (replica when healthy)
+async def get_read_session(user_id: str = Depends(verify_token)):
+    async with read_session(user_id) as session:
+        yield session
+
 # Get current user with database
 async def get_current_user_db(
     user_id: str = Depends(verify_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ) -> User:
-    user = session.exec(select(User).where(User.id == int(user_id))).first()
+    user = (await session.exec(select(User).where(User.id == int(user_id)))).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -18,23 +29,23 @@ async def get_current_user_db(
 # Get user account
 async def get_user_account(
     user: User = Depends(get_current_user_db),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ) -> Account:
-    account = session.exec(select(Account).where(Account.user_id == user.id)).first()
+    account = (await session.exec(select(Account).where(Account.user_id == user.id))).first()
     if not account:
         # Create account if doesn't exist
         account = Account(user_id=user.id)
         session.add(account)
-        session.commit()
-        session.refresh(account)
+        await session.commit()
+        await session.refresh(account)
     return account
 
 # Get user DSAR requests
 async def get_user_requests(
     user: User = Depends(get_current_user_db),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ) -> List[DSARRequest]:
-    requests = session.exec(
+    requests = (await session.exec(
         select(DSARRequest).where(DSARRequest.user_id == user.id)
-    ).all()
+    )).all()
     return requests
@@ -0,0 +1,68 @@
+# Native JSON columns (JSONB on Postgres, JSON1 text on SQLite) and key lookups
+import re
+from sqlalchemy import JSON, Boolean, Column, String, literal
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+_KEY_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def json_column(nullable: bool = True) -> Column:
+    return Column(JSONType, nullable=nullable)
+
+class json_text(ColumnElement):
+    """
+    Text value of a top-level key: `col ->> 'key'` / `CAST(json_extract(col, '$.key') AS TEXT)`.
+
+    json_extract returns numbers as SQL numbers (Shopify customer ids are
+    numeric), so SQLite casts to match Postgres' `->>` and compare with a
+    str parameter. The key is rendered as a literal so the same construct used in an
+    `Index(...)` and in a WHERE clause compiles to identical SQL, which is
+    what lets SQLite (and Postgres) match the expression index.
+    """
+    type = String()
+    inherit_cache = True
+    _traverse_internals = [
+        ("column", InternalTraversal.dp_clauseelement),
+        ("key", InternalTraversal.dp_string),
+    ]
+
+    def __init__(self, column, key: str):
+        if not _KEY_RE.match(key):
+            raise ValueError(f"unsupported JSON key: {key!r}")
+        self.column = column
+        self.key = key
+
+@compiles(json_text)
+def _json_text_default(element, compiler, **kw):
+    return "CAST(json_extract(%s, '$.%s') AS TEXT)" % (compiler.process(element.column, **kw), element.key)
+
+@compiles(json_text, "postgresql")
+def _json_text_pg(element, compiler, **kw):
+    return "(%s ->> '%s')" % (compiler.process(element.column, **kw), element.key)
+
+class json_has_key(ColumnElement):
+    """True when the top-level key is present (GIN-indexable `?` on Postgres)."""
+    type = Boolean()
+    inherit_cache = True
+    _traverse_internals = [
+        ("column", InternalTraversal.dp_clauseelement),
+        ("key", InternalTraversal.dp_clauseelement),
+    ]
+
+    def __init__(self, column, key: str):
+        self.column = column
+        self.key = literal(key, String())
+
+@compiles(json_has_key)
+def _json_has_key_default(element, compiler, **kw):
+    return "json_type(%s, '$.\"' || %s || '\"') IS NOT NULL" % (
+        compiler.process(element.column, **kw), compiler.process(element.key, **kw)
+    )
+
+@compiles(json_has_key, "postgresql")
+def _json_has_key_pg(element, compiler, **kw):
+    return "(%s ? %s)" % (compiler.process(element.column, **kw), compiler.process(element.key, **kw))
@@ -15,6 +15,7 @@ from .requests import router as requests_router
 from .routes import admin as admin_router
 from .routes.breach import router as breach_router
 from .routes.downloads import router as downloads_router
+from .routes.events import router as events_router
 from .downloads import router as presigned_downloads_router
 from .webhooks import router as webhooks_router
 from .rate_limit import limiter
@@ -39,6 +40,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Rate limit handler
@@ -125,6 +127,7 @@ async def account_endpoint(user_id: str = Depends(get_current_user)):
 # Include routers
 app.include_router(requests_router)
 app.include_router(breach_router)
+app.include_router(events_router)  # SSE status stream
 # app.include_router(downloads_router)  # UUID endpoint - devre dışı
 app.include_router(presigned_downloads_router)  # JWT endpoint
 app.include_router(webhooks_router)
@@ -1,9 +1,11 @@
 # Database Models
 from sqlmodel import SQLModel, Field, create_engine, Session, select
-from typing import Optional, List
+from sqlalchemy import Index, UniqueConstraint
+from typing import Any, Optional, List
 from datetime import datetime
 import uuid
 import json
+from .json_columns import json_column, json_text
 
 # User Model
 class User(SQLModel, table=True):
@@ -28,6 +30,13 @@ class Account(SQLModel, table=True):
 
 # DSAR Request Model
 class DSARRequest(SQLModel, table=True):
+    __table_args__ = (
+        # Dashboard filters: tenant + status + due date range
+        Index("ix_dsarrequest_user_status_due", "user_id", "status", "due_date"),
+        # Keyset pagination order: (created_at DESC, id DESC) per tenant
+        Index("ix_dsarrequest_user_created_id", "user_id", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     request_id: str = Field(default_factory=lambda: str(uuid.uuid4()), unique=True, index=True)
     user_id: int = Field(foreign_key="user.id")
@@ -36,13 +45,78 @@ class DSARRequest(SQLModel, table=True):
     subject_name: str
     status: str = Field(default="pending")  # pending, processing, completed, rejected
     description: Optional[str] = None
-    additional_info: Optional[str] = None  # JSON string
+    additional_info: Optional[Any] = Field(default=None, sa_column=json_column())  # JSON (shop_domain, customer_id, ...)
     due_date: datetime
     completed_at: Optional[datetime] = None
     source: str = Field(default="manual")  # manual, shopify, woocommerce
+    version: int = Field(default=1)  # row version, bumped on every status transition
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+# Expression indexes for the JSON keys the listing API filters on
+Index("ix_dsarrequest_user_shop_domain", DSARRequest.user_id, json_text(DSARRequest.additional_info, "shop_domain"))
+Index("ix_dsarrequest_user_customer_id", DSARRequest.user_id, json_text(DSARRequest.additional_info, "customer_id"))
+
+# Per-tenant DSAR counters by status (maintained on every status transition)
+class RequestStatusCounter(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint("user_id", "status", name="uq_requeststatuscounter_user_status"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    status: str
+    count: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Per-tenant collection versions (bumped on every write; list ETags)
+class CollectionVersion(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint("user_id", "collection", name="uq_collectionversion_user_collection"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    collection: str  # requests, breaches
+    version: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Per-source snapshot of a subject's exported data (incremental re-exports)
+class SourceSnapshot(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("account_id", "subject_key", "source", "fmt", name="uq_sourcesnapshot_subject_source_fmt"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    account_id: str = Field(index=True)
+    subject_key: str = Field(index=True)  # sha256 of the normalised subject email
+    source: str
+    fmt: str  # json, csv, ndjson, parquet
+    fingerprint: Optional[str] = None  # connector's cheap change marker (e.g. max updated_at)
+    content_hash: str
+    blob_key: str
+    size: int = Field(default=0)
+    record_count: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Content-addressed export artifacts (cas/<sha256>) and their reference counts
+class CasObject(SQLModel, table=True):
+    key: str = Field(primary_key=True)  # cas/<sha256> or cas/bundles/<manifest digest>.zip
+    sha256: str
+    size: int = Field(default=0)
+    refcount: int = Field(default=0)  # manifests + snapshots referencing the object
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+# One per export bundle: which artifacts (and which zip) it is made of
+class ExportManifest(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    account_id: str = Field(index=True)
+    request_id: str = Field(index=True)
+    digest: str  # sha256 of the entry list; names the zip
+    bundle_key: str
+    bundle_sha256: str
+    entries: Any = Field(sa_column=json_column(nullable=False))  # [{"name", "sha256", "size"}]
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    released_at: Optional[datetime] = None  # references dropped (retention)
+
 # Audit Log Model
 class AuditLog(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -50,7 +124,7 @@ class AuditLog(SQLModel, table=True):
     action: str
     resource_type: str
     resource_id: Optional[str] = None
-    details: Optional[str] = None  # JSON string
+    details: Optional[Any] = Field(default=None, sa_column=json_column())
     ip_address: Optional[str] = None
     user_agent: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -61,7 +135,7 @@ class DataSource(SQLModel, table=True):
     user_id: int = Field(foreign_key="user.id")
     name: str
     type: str  # shopify, woocommerce, custom
-    config: str  # JSON string
+    config: Any = Field(sa_column=json_column(nullable=False))
     is_active: bool = Field(default=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -124,7 +198,7 @@ class DataBreachReport(SQLModel, table=True):
     user_id: int = Field(foreign_key="user.id")
     breach_type: str  # unauthorized_access, data_loss, system_breach, misdelivery
     description: str
-    affected_data: str  # JSON string of affected data
+    affected_data: Any = Field(sa_column=json_column(nullable=False))  # affected data categories
     affected_individuals: int
     discovery_date: datetime
     start_date: Optional[datetime] = None  # When breach started
@@ -135,7 +209,7 @@ class DataBreachReport(SQLModel, table=True):
     status: str = Field(default="new")  # new, triage, authority_notified, subjects_notified, remediation, closed
     root_cause: Optional[str] = None
     remediation_measures: Optional[str] = None
-    notes: Optional[str] = None  # JSON string for additional notes
+    notes: Optional[Any] = Field(default=None, sa_column=json_column())  # additional notes
     sla_deadline: Optional[datetime] = None  # 72h deadline for reporting
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -146,7 +220,7 @@ class BreachEvent(SQLModel, table=True):
     breach_id: int = Field(foreign_key="databreachreport.id")
     actor: str  # user, system, authority
     action: str  # created, triaged, authority_notified, subjects_notified, closed
-    payload: Optional[str] = None  # JSON string with event details
+    payload: Optional[Any] = Field(default=None, sa_column=json_column())  # event details
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 # Single-use download token for export bundles
@@ -0,0 +1,32 @@
+# Keyset (cursor) pagination helpers
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor for the last row of a page: base64("<iso ts>|<id>")"""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_after(created_col, id_col, cursor: Optional[str]):
+    """WHERE clause for rows strictly after the cursor in (created_at DESC, id DESC) order"""
+    if not cursor:
+        return None
+    created_at, row_id = decode_cursor(cursor)
+    return or_(
+        created_col < created_at,
+        and_(created_col == created_at, id_col < row_id),
+    )
@@ -1,13 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from typing import List
-from .models import DSARRequest, User
-from .database import get_session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+from .models import DataSource, DSARRequest, User
+from .deps import get_read_session, get_tenant_session
 from .auth import verify_token
+from .conditional import list_etag, not_modified, set_etag, weak_etag
+from .json_columns import json_text
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, keyset_after
+from .services import bulk_ingest, bulk_status, export_cache, export_progress, search, storage
+from .services.cas import CasStore
+from .services.collection_versions import REQUESTS, get_version
+from .services.request_stats import get_request_stats as request_stats, record_status_change, set_request_status
 from .tasks.export import export_dsar_task
+from .tasks.ops import cleanup_cancelled_export, download_token
+from .celery_app import celery_app
 from datetime import datetime, timedelta
+import asyncio
+import logging
 import uuid
 
+logger = logging.getLogger(__name__)
+
+# Running tasks notice the cancel flag within seconds; leftovers are swept after this delay
+EXPORT_CANCEL_CLEANUP_DELAY = 60
+
 router = APIRouter(prefix="/api/v1/requests", tags=["requests"])
 
 # Create DSAR request
@@ -15,7 +34,7 @@ router = APIRouter(prefix="/api/v1/requests", tags=["requests"])
 async def create_request(
     request_data: dict,
     user_id: str = Depends(verify_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_tenant_session)
 ):
     # Calculate due date (30 days from now)
     due_date = datetime.utcnow() + timedelta(days=30)
@@ -32,8 +51,9 @@ async def create_request(
     )
     
     session.add(dsar_request)
-    session.commit()
-    session.refresh(dsar_request)
+    await session.run_sync(record_status_change, dsar_request.user_id, None, dsar_request.status)
+    await session.commit()
+    await session.refresh(dsar_request)
     
     return {
         "id": dsar_request.id,
@@ -42,16 +62,131 @@ async def create_request(
         "due_date": dsar_request.due_date.isoformat()
     }
 
-# Get user's DSAR requests
+# Bulk import DSAR requests (NDJSON or CSV body, streamed NDJSON results)
+@router.post("/bulk")
+async def bulk_create_requests(
+    request: Request,
+    user_id: str = Depends(verify_token)
+):
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        parse = bulk_ingest.iter_csv
+    elif "ndjson" in content_type or "jsonl" in content_type:
+        parse = bulk_ingest.iter_ndjson
+    else:
+        raise HTTPException(status_code=415, detail="Use application/x-ndjson or text/csv")
+
+    # Body limits: BULK_MAX_BYTES / BULK_MAX_ROWS, 413 when exceeded
+    try:
+        bulk_ingest.check_length(request.headers.get("content-length"))
+        body = await bulk_ingest.spool_body(request.stream())
+    except bulk_ingest.BodyTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    records = parse(bulk_ingest.iter_lines(bulk_ingest.iter_chunks(body)))
+
+    return StreamingResponse(
+        bulk_ingest.ingest(records, int(user_id)),
+        media_type="application/x-ndjson"
+    )
+
+class RequestFilter(BaseModel):
+    status: Optional[str] = None
+    request_type: Optional[str] = None
+    source: Optional[str] = None
+    due_after: Optional[datetime] = None
+    due_before: Optional[datetime] = None
+    shop_domain: Optional[str] = None
+    customer_id: Optional[str] = None
+
+class BulkStatusUpdate(BaseModel):
+    status: str
+    request_ids: Optional[List[str]] = Field(None, max_length=bulk_status.MAX_BULK)
+    filter: Optional[RequestFilter] = None
+    from_status: Optional[str] = None  # precondition: only rows currently in this status
+    versions: Optional[Dict[str, int]] = None  # optimistic check: request_id -> version the client saw
+
+# Bulk status transition: one locking SELECT + one set-based UPDATE, per-id outcomes
+@router.post("/bulk-status")
+async def bulk_update_status(
+    data: BulkStatusUpdate,
+    user_id: str = Depends(verify_token),
+    session: AsyncSession = Depends(get_tenant_session)
+):
+    if (data.request_ids is None) == (data.filter is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of request_ids or filter")
+
+    try:
+        result = await session.run_sync(
+            bulk_status.transition_requests,
+            int(user_id),
+            data.status,
+            request_ids=data.request_ids,
+            filters=data.filter.model_dump(exclude_none=True) if data.filter else None,
+            from_status=data.from_status,
+            versions=data.versions,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await session.commit()
+    return result
+
+# Get user's DSAR requests (keyset-paginated, newest first)
 @router.get("/")
 async def get_requests(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    request_type: Optional[str] = None,
+    source: Optional[str] = None,
+    due_after: Optional[datetime] = None,
+    due_before: Optional[datetime] = None,
+    shop_domain: Optional[str] = None,
+    customer_id: Optional[str] = None,
     user_id: str = Depends(verify_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ) -> List[dict]:
-    requests = session.exec(
-        select(DSARRequest).where(DSARRequest.user_id == int(user_id))
-    ).all()
-    
+    # Unchanged collection: answer from the version row without loading requests
+    version = await session.run_sync(get_version, int(user_id), REQUESTS)
+    etag = list_etag(request, user_id, REQUESTS, version)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    set_etag(response, etag)
+
+    query = select(DSARRequest).where(DSARRequest.user_id == int(user_id))
+
+    if status:
+        query = query.where(DSARRequest.status == status)
+    if request_type:
+        query = query.where(DSARRequest.request_type == request_type)
+    if source:
+        query = query.where(DSARRequest.source == source)
+    if due_after:
+        query = query.where(DSARRequest.due_date >= due_after)
+    if due_before:
+        query = query.where(DSARRequest.due_date < due_before)
+    # JSON filters (served by the expression indexes on additional_info)
+    if shop_domain:
+        query = query.where(json_text(DSARRequest.additional_info, "shop_domain") == shop_domain)
+    if customer_id:
+        query = query.where(json_text(DSARRequest.additional_info, "customer_id") == customer_id)
+
+    after = keyset_after(DSARRequest.created_at, DSARRequest.id, cursor)
+    if after is not None:
+        query = query.where(after)
+
+    # Fetch one extra row to know whether another page exists
+    requests = (await session.exec(
+        query.order_by(DSARRequest.created_at.desc(), DSARRequest.id.desc()).limit(limit + 1)
+    )).all()
+
+    if len(requests) > limit:
+        requests = requests[:limit]
+        last = requests[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.id)
+
     return [
         {
             "id": req.id,
@@ -62,24 +197,82 @@ async def get_requests(
             "status": req.status,
             "due_date": req.due_date.isoformat(),
             "source": req.source,
-            "created_at": req.created_at.isoformat()
+            "created_at": req.created_at.isoformat(),
+            "version": req.version
         }
         for req in requests
     ]
 
+# Get request statistics (declared before /{request_id} so it is not shadowed)
+@router.get("/stats")
+async def get_request_stats(
+    user_id: str = Depends(verify_token),
+    session: AsyncSession = Depends(get_read_session)
+):
+    return await session.run_sync(request_stats, int(user_id))
+
+# Full-text subject search (email / name / description fragments), best match first
+@router.get("/search")
+async def search_requests(
+    q: str = Query(..., min_length=search.MIN_TERM_CHARS, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    user_id: str = Depends(verify_token),
+    session: AsyncSession = Depends(get_read_session)
+) -> List[dict]:
+    try:
+        terms = search.parse_terms(q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    dialect = session.get_bind().dialect.name
+    tenant_rows = await session.run_sync(search.tenant_rows, int(user_id)) if dialect == "sqlite" else None
+    rows = (await session.exec(search.search_query(dialect, int(user_id), terms, limit, tenant_rows))).all()
+
+    return [
+        {
+            "id": req.id,
+            "request_id": req.request_id,
+            "request_type": req.request_type,
+            "subject_email": req.subject_email,
+            "subject_name": req.subject_name,
+            "status": req.status,
+            "due_date": req.due_date.isoformat(),
+            "source": req.source,
+            "created_at": req.created_at.isoformat(),
+            "rank": rank
+        }
+        for req, rank in rows
+    ]
+
 # Get specific DSAR request
 @router.get("/{request_id}")
 async def get_request(
     request_id: str,
+    http_request: Request,
+    response: Response,
     user_id: str = Depends(verify_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
-    request = session.exec(
+    # ETag check on the unique request_id index, before loading the row
+    version = (await session.exec(
+        select(DSARRequest.id, DSARRequest.version, DSARRequest.updated_at).where(
+            DSARRequest.request_id == request_id,
+            DSARRequest.user_id == int(user_id)
+        )
+    )).first()
+    if version:
+        etag = weak_etag(REQUESTS, *version)
+        unchanged = not_modified(http_request, etag)
+        if unchanged:
+            return unchanged
+        set_etag(response, etag)
+
+    request = (await session.exec(
         select(DSARRequest).where(
             DSARRequest.request_id == request_id,
             DSARRequest.user_id == int(user_id)
         )
-    ).first()
+    )).first()
     
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -96,7 +289,8 @@ async def get_request(
         "due_date": request.due_date.isoformat(),
         "source": request.source,
         "created_at": request.created_at.isoformat(),
-        "updated_at": request.updated_at.isoformat()
+        "updated_at": request.updated_at.isoformat(),
+        "version": request.version
     }
 
 # Update DSAR request status
@@ -105,76 +299,139 @@ async def update_request(
     request_id: str,
     status: str,
     user_id: str = Depends(verify_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_tenant_session)
 ):
-    request = session.exec(
+    request = (await session.exec(
         select(DSARRequest).where(
             DSARRequest.request_id == request_id,
             DSARRequest.user_id == int(user_id)
         )
-    ).first()
+    )).first()
     
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
     
-    request.status = status
-    request.updated_at = datetime.utcnow()
-    
-    if status == "completed":
-        request.completed_at = datetime.utcnow()
-    
-    session.add(request)
-    session.commit()
-    session.refresh(request)
+    await session.run_sync(set_request_status, request, status)
+    await session.commit()
+    await session.refresh(request)
     
     return {"status": "updated", "new_status": request.status}
 
-# Enqueue export job
+def _bundle_exists(key: str) -> bool:
+    return CasStore(storage.client(), storage.bucket()).exists(key)
+
+# Enqueue export job; a repeat of a finished export returns its bundle, a concurrent one joins the running job
 @router.post("/{request_id}/export")
 async def export_request(
     request_id: str,
+    refresh: bool = Query(False, description="Rebuild even if a cached bundle exists"),
     user_id: str = Depends(verify_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
     # Check if request exists and belongs to user
-    request = session.exec(
-        select(DSARRequest).where(
-            DSARRequest.request_id == request_id,
-            DSARRequest.user_id == int(user_id)
+    request = await _owned_request(session, request_id, user_id)
+    sources = (await session.exec(
+        select(DataSource.id, DataSource.updated_at).where(
+            DataSource.user_id == int(user_id),
+            DataSource.is_active == True  # noqa: E712
         )
-    ).first()
-    
-    if not request:
-        raise HTTPException(status_code=404, detail="Request not found")
-    
-    # Enqueue export task
+    )).all()
+    fingerprint = export_cache.request_fingerprint(
+        request.request_id, request.request_type, request.subject_email, None, sources
+    )
+
+    # Enqueue export task; its id is the export id for progress/cancel
+    task_id = str(uuid.uuid4())
+    claim = await asyncio.to_thread(export_cache.claim, fingerprint, task_id, not refresh)
+    if claim.result and not await asyncio.to_thread(_bundle_exists, claim.result["key"]):
+        # Collected since it was cached: no dead link, build it again
+        await asyncio.to_thread(export_cache.forget, fingerprint)
+        claim = await asyncio.to_thread(export_cache.claim, fingerprint, task_id, False)
+    if claim.result:
+        cached = claim.result
+        return {
+            "status": "completed",
+            "request_id": request_id,
+            "task_id": cached["export_id"],
+            "bundle_key": cached["key"],
+            "sha256": cached["sha256"],
+            "download_token": download_token(cached["key"]),
+            "cached": True,
+        }
+    if claim.export_id != task_id:
+        return {
+            "status": "queued",
+            "request_id": request_id,
+            "task_id": claim.export_id,
+            "coalesced": True,
+            "message": "Export already in progress"
+        }
+    try:
+        await export_progress.start_export(task_id, request_id, user_id, fingerprint)
+    except Exception as e:
+        logger.warning("export progress not initialised: %s", e)
     try:
-        task = export_dsar_task.delay(int(request_id))
+        export_dsar_task.apply_async((request.id,), task_id=task_id)
         return {
             "status": "queued", 
             "request_id": request_id,
-            "task_id": task.id,
+            "task_id": task_id,
             "message": "Export job queued successfully"
         }
     except Exception as e:
+        await asyncio.to_thread(export_cache.release, fingerprint, task_id)
         raise HTTPException(status_code=500, detail=f"Failed to queue export: {str(e)}")
 
-# Get request statistics
-@router.get("/stats")
-async def get_request_stats(
+async def _owned_request(session: AsyncSession, request_id: str, user_id: str) -> DSARRequest:
+    request = (await session.exec(
+        select(DSARRequest).where(
+            DSARRequest.request_id == request_id,
+            DSARRequest.user_id == int(user_id)
+        )
+    )).first()
+    if not request:
+        raise HTTPException(status_code=404, detail="Request not found")
+    return request
+
+async def _export_progress(request_id: str, task_id: str) -> dict:
+    try:
+        raw = await export_progress.read_progress(task_id)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Export progress unavailable")
+    if not raw or raw.get("request_id") != request_id:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return raw
+
+# Export progress: records fetched, bytes written/uploaded, percent and ETA
+@router.get("/{request_id}/export/{task_id}")
+async def get_export_progress(
+    request_id: str,
+    task_id: str,
     user_id: str = Depends(verify_token),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
-    requests = session.exec(
-        select(DSARRequest).where(DSARRequest.user_id == int(user_id))
-    ).all()
-    
-    stats = {
-        "total": len(requests),
-        "pending": len([r for r in requests if r.status == "pending"]),
-        "processing": len([r for r in requests if r.status == "processing"]),
-        "completed": len([r for r in requests if r.status == "completed"]),
-        "rejected": len([r for r in requests if r.status == "rejected"])
-    }
-    
-    return stats
+    await _owned_request(session, request_id, user_id)
+    raw = await _export_progress(request_id, task_id)
+    return {"request_id": request_id, "task_id": task_id, **export_progress.summarize(raw)}
+
+# Cancel export: revoke the pipeline's pending tasks; running ones stop and clean up
+@router.post("/{request_id}/export/{task_id}/cancel", status_code=202)
+async def cancel_export(
+    request_id: str,
+    task_id: str,
+    user_id: str = Depends(verify_token),
+    session: AsyncSession = Depends(get_read_session)
+):
+    await _owned_request(session, request_id, user_id)
+    raw = await _export_progress(request_id, task_id)
+    if raw.get("state") not in export_progress.ACTIVE_STATES:
+        raise HTTPException(status_code=409, detail=f"Export already {raw.get('state')}")
+
+    task_ids = await export_progress.request_cancel(task_id)
+    try:
+        await asyncio.to_thread(celery_app.control.revoke, task_ids)
+        cleanup_cancelled_export.apply_async((task_id,), countdown=EXPORT_CANCEL_CLEANUP_DELAY)
+    except Exception as e:
+        # Revoke olmasa da task'lar iptal bayrağını görüp durur
+        logger.warning("export %s not revoked: %s", task_id, e)
+    return {"status": "cancelling", "request_id": request_id, "task_id": task_id}
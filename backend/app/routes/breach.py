@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response
 from datetime import datetime, timedelta
-import json
 from typing import Optional
 from pydantic import BaseModel
-from ..database import get_session
+from sqlmodel import select
+from ..database import read_session, tenant_session
+from ..json_columns import json_has_key
 from ..models import DataBreachReport, BreachEvent, User
 from ..auth import get_current_user
+from ..conditional import list_etag, not_modified, set_etag
+from ..services.collection_versions import BREACHES, get_version
 from ..tasks.email import queue_email_notification
 
 router = APIRouter(prefix="/api/v1/breaches", tags=["breach"])
@@ -43,29 +46,29 @@ async def create_breach(
 ):
     """Create a new data breach report (GDPR Art.33)"""
     
-    with get_session() as session:
+    async with tenant_session(user_id) as session:
         breach = DataBreachReport(
             user_id=int(user_id),
             breach_type=breach_data.breach_type,
             description=breach_data.description,
-            affected_data=json.dumps(breach_data.affected_data),
+            affected_data=breach_data.affected_data,
             affected_individuals=breach_data.affected_individuals,
             discovery_date=datetime.utcnow(),
             start_date=breach_data.start_date,
             status="new"
         )
         session.add(breach)
-        session.commit()
+        await session.commit()
         
         # Log event
         event = BreachEvent(
             breach_id=breach.id,
             actor="user",
             action="created",
-            payload=json.dumps({"user_id": user_id})
+            payload={"user_id": user_id}
         )
         session.add(event)
-        session.commit()
+        await session.commit()
         
         # Queue notification to DPO
         if background_tasks:
@@ -93,11 +96,11 @@ async def triage_breach(
 ):
     """Triage breach and determine if reportable (GDPR Art.33)"""
     
-    with get_session() as session:
-        breach = session.query(DataBreachReport).filter(
+    async with tenant_session(user_id) as session:
+        breach = (await session.exec(select(DataBreachReport).where(
             DataBreachReport.id == breach_id,
             DataBreachReport.user_id == int(user_id)
-        ).first()
+        ))).first()
         
         if not breach:
             raise HTTPException(status_code=404, detail="Breach not found")
@@ -113,20 +116,20 @@ async def triage_breach(
         if triage_data.reportable:
             breach.sla_deadline = breach.discovery_date + timedelta(hours=72)
         
-        session.commit()
+        await session.commit()
         
         # Log event
         event = BreachEvent(
             breach_id=breach.id,
             actor="user",
             action="triaged",
-            payload=json.dumps({
+            payload={
                 "risk_level": triage_data.risk_level,
                 "reportable": triage_data.reportable
-            })
+            }
         )
         session.add(event)
-        session.commit()
+        await session.commit()
     
     return {
         "status": "triaged",
@@ -143,11 +146,11 @@ async def notify_supervisory_authority(
 ):
     """Notify supervisory authority (GDPR Art.33(3))"""
     
-    with get_session() as session:
-        breach = session.query(DataBreachReport).filter(
+    async with tenant_session(user_id) as session:
+        breach = (await session.exec(select(DataBreachReport).where(
             DataBreachReport.id == breach_id,
             DataBreachReport.user_id == int(user_id)
-        ).first()
+        ))).first()
         
         if not breach:
             raise HTTPException(status_code=404, detail="Breach not found")
@@ -158,28 +161,28 @@ async def notify_supervisory_authority(
         # Check if within 72h deadline
         if breach.sla_deadline and datetime.utcnow() > breach.sla_deadline:
             # Log delay justification
-            breach.notes = json.dumps({
+            breach.notes = {
                 "authority_notification_delayed": True,
                 "delay_reason": "Investigation required more time",
                 "original_deadline": breach.sla_deadline.isoformat()
-            })
+            }
         
         breach.authority_notified_at = datetime.utcnow()
         breach.status = "authority_notified"
-        session.commit()
+        await session.commit()
         
         # Log event
         event = BreachEvent(
             breach_id=breach.id,
             actor="user",
             action="authority_notified",
-            payload=json.dumps({
+            payload={
                 "authority": notice_data.authority_name,
                 "dpo_contact": notice_data.dpo_contact
-            })
+            }
         )
         session.add(event)
-        session.commit()
+        await session.commit()
     
     return {
         "status": "authority_notified",
@@ -195,11 +198,11 @@ async def notify_data_subjects(
 ):
     """Notify data subjects if high risk (GDPR Art.34)"""
     
-    with get_session() as session:
-        breach = session.query(DataBreachReport).filter(
+    async with tenant_session(user_id) as session:
+        breach = (await session.exec(select(DataBreachReport).where(
             DataBreachReport.id == breach_id,
             DataBreachReport.user_id == int(user_id)
-        ).first()
+        ))).first()
         
         if not breach:
             raise HTTPException(status_code=404, detail="Breach not found")
@@ -209,20 +212,20 @@ async def notify_data_subjects(
         
         breach.subjects_notified_at = datetime.utcnow()
         breach.status = "subjects_notified"
-        session.commit()
+        await session.commit()
         
         # Log event
         event = BreachEvent(
             breach_id=breach.id,
             actor="user",
             action="subjects_notified",
-            payload=json.dumps({
+            payload={
                 "template": notice_data.notification_template,
                 "affected_count": breach.affected_individuals
-            })
+            }
         )
         session.add(event)
-        session.commit()
+        await session.commit()
     
     return {
         "status": "subjects_notified",
@@ -234,19 +237,19 @@ async def notify_data_subjects(
 async def breach_report_pdf(breach_id: int, user_id: str = Depends(get_current_user)):
     """Generate auditor-ready PDF report"""
     
-    with get_session() as session:
-        breach = session.query(DataBreachReport).filter(
+    async with read_session(user_id) as session:
+        breach = (await session.exec(select(DataBreachReport).where(
             DataBreachReport.id == breach_id,
             DataBreachReport.user_id == int(user_id)
-        ).first()
+        ))).first()
         
         if not breach:
             raise HTTPException(status_code=404, detail="Breach not found")
         
         # Get all events for timeline
-        events = session.query(BreachEvent).filter(
+        events = (await session.exec(select(BreachEvent).where(
             BreachEvent.breach_id == breach_id
-        ).order_by(BreachEvent.timestamp).all()
+        ).order_by(BreachEvent.timestamp))).all()
     
     # TODO: Generate actual PDF
     # For now, return JSON structure
@@ -267,17 +270,32 @@ async def breach_report_pdf(breach_id: int, user_id: str = Depends(get_current_u
             for event in events
         ],
         "remediation_measures": breach.remediation_measures,
-        "notes": json.loads(breach.notes) if breach.notes else None
+        "notes": breach.notes
     }
 
 @router.get("")
-async def get_breach_reports(user_id: str = Depends(get_current_user)):
-    """Get all breach reports for user"""
+async def get_breach_reports(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(get_current_user),
+    affected_data_key: Optional[str] = None
+):
+    """Get all breach reports for user (optionally only those whose affected_data has a key)"""
     
-    with get_session() as session:
-        breaches = session.query(DataBreachReport).filter(
-            DataBreachReport.user_id == int(user_id)
-        ).order_by(DataBreachReport.created_at.desc()).all()
+    query = select(DataBreachReport).where(DataBreachReport.user_id == int(user_id))
+    if affected_data_key:
+        query = query.where(json_has_key(DataBreachReport.affected_data, affected_data_key))
+
+    async with read_session(user_id) as session:
+        # Unchanged since the client's copy: 304 from the version row alone
+        version = await session.run_sync(get_version, int(user_id), BREACHES)
+        etag = list_etag(request, user_id, BREACHES, version)
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+        set_etag(response, etag)
+
+        breaches = (await session.exec(query.order_by(DataBreachReport.created_at.desc()))).all()
     
     return {
         "breaches": [
@@ -289,6 +307,7 @@ async def get_breach_reports(user_id: str = Depends(get_current_user)):
                 "status": breach.status,
                 "discovery_date": breach.discovery_date.isoformat(),
                 "sla_deadline": breach.sla_deadline.isoformat() if breach.sla_deadline else None,
+                "affected_data": breach.affected_data,
                 "affected_individuals": breach.affected_individuals
             }
             for breach in breaches
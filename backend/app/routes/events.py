@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from typing import Optional
+import asyncio
+from ..auth import verify_token
+from ..services.events import TICKET_TTL, hub, issue_ticket, redeem_ticket
+
+router = APIRouter(prefix="/api/v1/events", tags=["events"])
+
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 3000
+
+optional_bearer = HTTPBearer(auto_error=False)
+
+async def stream_user(
+    ticket: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer)
+) -> str:
+    """Bearer header, or ?ticket= from POST /ticket for EventSource (which cannot send headers)"""
+    if credentials:
+        return verify_token(credentials)
+    if not ticket:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        user_id = await redeem_ticket(ticket)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Event stream unavailable")
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired ticket")
+    return user_id
+
+async def event_stream(request: Request, user_id: str):
+    queue = await hub.subscribe(user_id)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while not await request.is_disconnected():
+            try:
+                data = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": ping\n\n"
+                continue
+            yield f"event: status\ndata: {data}\n\n"
+    finally:
+        await hub.unsubscribe(user_id, queue)
+
+# Single-use, short-lived ticket for opening one event stream (keeps the JWT out of URLs and logs)
+@router.post("/ticket")
+async def create_stream_ticket(user_id: str = Depends(verify_token)):
+    try:
+        ticket = await issue_ticket(user_id)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Event stream unavailable")
+    return {"ticket": ticket, "expires_in": TICKET_TTL}
+
+# Live DSAR / breach status transitions for the tenant (Server-Sent Events)
+@router.get("/stream")
+async def stream_events(request: Request, user_id: str = Depends(stream_user)):
+    return StreamingResponse(
+        event_stream(request, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,220 @@
+"""
+Streaming bulk DSAR ingestion (NDJSON or CSV).
+
+The upload is spooled (memory up to SPOOL_MAX_BYTES, then a temp file)
+before results start streaming: Starlette's StreamingResponse consumes
+`receive()` while it streams, so reading the request body and writing the
+response cannot overlap. Rows are then read back chunk by chunk, validated
+one at a time and inserted with one executemany per batch, so memory stays
+bounded by BATCH_SIZE regardless of upload size. Every input row yields one
+result line: either the assigned `request_id` or the validation error.
+
+Because the body is spooled first, its size is capped: more than
+BULK_MAX_BYTES bytes or BULK_MAX_ROWS lines (CSV: plus the header) raises
+`BodyTooLarge`, answered with 413 before any row is inserted. A declared
+Content-Length above the limit is refused without reading the body.
+"""
+import asyncio
+import csv
+import tempfile
+import json
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Tuple
+from sqlalchemy import insert
+from sqlmodel import Session
+from ..config import settings
+from ..database import replica_router, write_queue
+from ..models import DSARRequest
+from .collection_versions import REQUESTS, bump_version
+from .request_stats import record_inserts
+
+BATCH_SIZE = 1000
+MAX_LINE_BYTES = 64 * 1024
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+REQUEST_TYPES = {"access", "deletion", "erasure", "rectification"}
+STATUSES = {"pending", "processing", "completed", "rejected"}
+
+class RowError(ValueError):
+    pass
+
+class BodyTooLarge(ValueError):
+    pass
+
+def check_length(content_length: Optional[str]):
+    """Refuse a declared body size above BULK_MAX_BYTES up front."""
+    if content_length and content_length.isdigit() and int(content_length) > settings.bulk_max_bytes:
+        raise BodyTooLarge(f"body exceeds {settings.bulk_max_bytes} bytes")
+
+async def spool_body(stream: AsyncIterator[bytes]):
+    """Spool the upload, enforcing BULK_MAX_BYTES and BULK_MAX_ROWS (newline-delimited lines)."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    size = lines = 0
+    max_lines = settings.bulk_max_rows + 1  # a CSV header line
+    try:
+        async for chunk in stream:
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+            if size > settings.bulk_max_bytes:
+                raise BodyTooLarge(f"body exceeds {settings.bulk_max_bytes} bytes")
+            if lines > max_lines:
+                raise BodyTooLarge(f"body exceeds {settings.bulk_max_rows} rows")
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+async def iter_chunks(fileobj) -> AsyncIterator[bytes]:
+    """Read the spool back off the event loop (past SPOOL_MAX_BYTES it is a file on disk)."""
+    try:
+        while True:
+            chunk = await asyncio.to_thread(fileobj.read, READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into decoded lines without buffering the whole body."""
+    buf = b""
+    async for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        if len(buf) > MAX_LINE_BYTES:
+            raise RowError("line too long")
+        for line in lines:
+            yield line.rstrip(b"\r").decode("utf-8")
+    if buf.strip():
+        yield buf.rstrip(b"\r").decode("utf-8")
+
+async def iter_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, object]]:
+    n = 0
+    async for line in lines:
+        n += 1
+        if not line.strip():
+            continue
+        try:
+            yield n, json.loads(line)
+        except ValueError as e:
+            yield n, RowError(f"invalid json: {e}")
+
+async def iter_csv(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, object]]:
+    header: Optional[List[str]] = None
+    n = 0
+    pending = ""
+    async for line in lines:
+        n += 1
+        # A quoted field may span lines: keep joining until quotes balance
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if len(values) != len(header):
+            yield n, RowError(f"expected {len(header)} columns, got {len(values)}")
+            continue
+        yield n, {k: (v if v != "" else None) for k, v in zip(header, values)}
+    if pending:
+        yield n, RowError("unterminated quoted field")
+
+def _parse_dt(value) -> Optional[datetime]:
+    if value in (None, ""):
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        raise RowError(f"invalid datetime: {value}")
+
+def validate_row(data, user_id: int, now: datetime) -> dict:
+    if isinstance(data, Exception):
+        raise data
+    if not isinstance(data, dict):
+        raise RowError("row must be an object")
+    if not data.get("subject_email"):
+        raise RowError("subject_email is required")
+    if not data.get("subject_name"):
+        raise RowError("subject_name is required")
+
+    request_type = data.get("request_type") or "access"
+    if request_type not in REQUEST_TYPES:
+        raise RowError(f"invalid request_type: {request_type}")
+    status = data.get("status") or "pending"
+    if status not in STATUSES:
+        raise RowError(f"invalid status: {status}")
+
+    additional_info = data.get("additional_info")
+    if isinstance(additional_info, str):
+        # CSV cells carry JSON as text
+        try:
+            additional_info = json.loads(additional_info)
+        except ValueError:
+            pass
+
+    created_at = _parse_dt(data.get("created_at")) or now
+    return {
+        "request_id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "request_type": request_type,
+        "subject_email": str(data["subject_email"]),
+        "subject_name": str(data["subject_name"]),
+        "status": status,
+        "description": data.get("description"),
+        "additional_info": additional_info,
+        "due_date": _parse_dt(data.get("due_date")) or created_at + timedelta(days=30),
+        "completed_at": _parse_dt(data.get("completed_at")),
+        "source": data.get("source") or "import",
+        "created_at": created_at,
+        "updated_at": now,
+    }
+
+def insert_batch(session: Session, user_id: int, rows: List[dict]):
+    """One executemany + counter upserts; run through the write queue, which commits."""
+    session.execute(insert(DSARRequest.__table__), rows)
+    record_inserts(session, user_id, Counter(r["status"] for r in rows))
+    bump_version(session, user_id, REQUESTS)
+
+async def _flush(user_id: int, batch: List[Tuple[int, dict]]) -> List[dict]:
+    try:
+        await write_queue.arun(insert_batch, user_id, [row for _, row in batch])
+    except Exception as e:
+        return [{"line": line, "ok": False, "error": f"batch insert failed: {e}"} for line, _ in batch]
+    await replica_router.remember_write(str(user_id))
+    return [{"line": line, "ok": True, "request_id": row["request_id"]} for line, row in batch]
+
+async def ingest(records: AsyncIterator[Tuple[int, object]], user_id: int) -> AsyncIterator[str]:
+    """Validate, insert in batches and yield one NDJSON result line per input row."""
+    batch: List[Tuple[int, dict]] = []
+    totals = Counter()
+    now = datetime.utcnow()
+    try:
+        async for line, data in records:
+            try:
+                batch.append((line, validate_row(data, user_id, now)))
+            except RowError as e:
+                totals["failed"] += 1
+                yield json.dumps({"line": line, "ok": False, "error": str(e)}) + "\n"
+                continue
+            if len(batch) >= BATCH_SIZE:
+                for result in await _flush(user_id, batch):
+                    totals["created" if result["ok"] else "failed"] += 1
+                    yield json.dumps(result) + "\n"
+                batch = []
+    except (RowError, UnicodeDecodeError) as e:
+        yield json.dumps({"ok": False, "error": f"stream aborted: {e}"}) + "\n"
+
+    if batch:
+        for result in await _flush(user_id, batch):
+            totals["created" if result["ok"] else "failed"] += 1
+            yield json.dumps(result) + "\n"
+
+    yield json.dumps({"summary": {"created": totals["created"], "failed": totals["failed"]}}) + "\n"
@@ -0,0 +1,135 @@
+"""
+Bulk DSAR status transitions.
+
+One SELECT (FOR UPDATE on Postgres) reads the targeted rows' id, status and
+version. The per-id preconditions are then checked in memory: existence,
+`from_status`, the client's expected version, and whether the row is
+already in the target status. A single UPDATE moves every eligible row. It
+is guarded by `(id, version) IN (...)`, stamps updated_at and completed_at,
+and bumps the version; RETURNING reports which rows actually changed. An
+eligible row that the guard rejects was changed concurrently, and is
+reported as a conflict instead of being overwritten.
+
+Status counters, the collection version and the status event are written
+once for the whole set, in the same transaction.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import select, tuple_, update
+from sqlmodel import Session
+from ..json_columns import json_text
+from ..models import DSARRequest
+from .collection_versions import REQUESTS, bump_version
+from .events import queue_event
+from .request_stats import TRACKED_STATUSES, record_transitions
+
+MAX_BULK = 5000
+
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+CONFLICT = "conflict"
+NOT_FOUND = "not_found"
+
+def _filter_criteria(table, filters: dict) -> list:
+    criteria = []
+    if filters.get("status"):
+        criteria.append(table.c.status == filters["status"])
+    if filters.get("request_type"):
+        criteria.append(table.c.request_type == filters["request_type"])
+    if filters.get("source"):
+        criteria.append(table.c.source == filters["source"])
+    if filters.get("due_after"):
+        criteria.append(table.c.due_date >= filters["due_after"])
+    if filters.get("due_before"):
+        criteria.append(table.c.due_date < filters["due_before"])
+    if filters.get("shop_domain"):
+        criteria.append(json_text(table.c.additional_info, "shop_domain") == str(filters["shop_domain"]))
+    if filters.get("customer_id"):
+        criteria.append(json_text(table.c.additional_info, "customer_id") == str(filters["customer_id"]))
+    return criteria
+
+def transition_requests(
+    session: Session,
+    user_id: int,
+    status: str,
+    request_ids: Optional[List[str]] = None,
+    filters: Optional[dict] = None,
+    from_status: Optional[str] = None,
+    versions: Optional[Dict[str, int]] = None,
+) -> dict:
+    """Apply `status` to the given request_ids (or to up to MAX_BULK rows matching `filters`); caller commits."""
+    if status not in TRACKED_STATUSES:
+        raise ValueError(f"invalid status: {status}")
+    table = DSARRequest.__table__
+    versions = versions or {}
+
+    query = select(table.c.id, table.c.request_id, table.c.status, table.c.version).where(table.c.user_id == user_id)
+    if request_ids is not None:
+        query = query.where(table.c.request_id.in_(request_ids))
+    else:
+        query = query.where(*_filter_criteria(table, filters or {}))
+        if from_status:
+            query = query.where(table.c.status == from_status)
+        query = query.where(table.c.status != status).order_by(table.c.id).limit(MAX_BULK)
+    if session.get_bind().dialect.name == "postgresql":
+        query = query.with_for_update()
+    rows = session.execute(query).all()
+
+    outcomes = {}
+    eligible = {}
+    for row in rows:
+        if row.status == status:
+            outcomes[row.request_id] = UNCHANGED
+        elif from_status and row.status != from_status:
+            outcomes[row.request_id] = CONFLICT
+        elif row.request_id in versions and versions[row.request_id] != row.version:
+            outcomes[row.request_id] = CONFLICT
+        else:
+            eligible[row.id] = row
+    for request_id in request_ids or ():
+        outcomes.setdefault(request_id, NOT_FOUND)
+
+    updated = {}
+    if eligible:
+        now = datetime.utcnow()
+        values = {"status": status, "updated_at": now, "version": table.c.version + 1}
+        if status == "completed":
+            values["completed_at"] = now
+        result = session.execute(
+            update(table)
+            .where(
+                table.c.user_id == user_id,
+                tuple_(table.c.id, table.c.version).in_([(row.id, row.version) for row in eligible.values()]),
+            )
+            .values(**values)
+            .returning(table.c.id, table.c.version)
+        )
+        updated = {row_id: version for row_id, version in result.all()}
+
+    for row_id, row in eligible.items():
+        outcomes[row.request_id] = UPDATED if row_id in updated else CONFLICT
+
+    if updated:
+        record_transitions(session, user_id, Counter(eligible[row_id].status for row_id in updated), status)
+        bump_version(session, user_id, REQUESTS)
+        queue_event(session, user_id, {
+            "type": "request.bulk_status",
+            "status": status,
+            "request_ids": [eligible[row_id].request_id for row_id in updated],
+        })
+
+    if request_ids is not None:
+        # Report in the caller's order
+        outcomes = {request_id: outcomes[request_id] for request_id in request_ids}
+
+    versions_after = {row.request_id: row.version for row in rows}
+    versions_after.update({eligible[row_id].request_id: version for row_id, version in updated.items()})
+    return {
+        "status": status,
+        "updated": len(updated),
+        "results": [
+            {"request_id": request_id, "outcome": outcome, "version": versions_after.get(request_id)}
+            for request_id, outcome in outcomes.items()
+        ],
+    }
@@ -0,0 +1,480 @@
+"""
+Streaming ZIP bundle writer.
+
+Entries are produced from iterables of bytes/str and deflated straight into
+a pipe. SHA-256 and the byte count are computed as the bytes pass through,
+and an uploader thread reads the other end of the pipe (a resumable
+`MultipartUpload`), so nothing is staged on disk or held whole in memory.
+Peak memory is the pipe (PIPE_CHUNKS x CHUNK_BYTES), plus one deflate
+window, plus the upload's part buffers (part size x (concurrency + 1)),
+whatever the size of the bundle. The CAS layer keeps that property: it
+hashes entries on their way into the ZIP and only spools them for its
+opt-in tar.zst archive (see cas.py).
+
+The ZIP goes to an unseekable stream, so entries use data descriptors, and
+ZIP64 is forced for streamed entries whose size is not known up front.
+Each member is stored or deflated as a `CompressionPolicy` decides from its
+first bytes and size; the per-member sizes, ratio and time come back in
+`BundleResult.members`.
+
+If writing fails (an entry generator or renderer raises), the pipe is
+failed rather than closed: the reader gets `BundleAborted` instead of EOF,
+so the uploader aborts its multipart upload and never completes a
+truncated object under the final key.
+
+Record formats (per source): NDJSON, one record per line, and Parquet, one
+row group per PARQUET_ROW_GROUP records. Both consume the source iterator
+chunk by chunk. Parquet needs pyarrow, which is imported only when that
+format is requested.
+"""
+import csv
+import hashlib
+import io
+import json
+import queue
+import sys
+import threading
+import time
+import zipfile
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from .compression import CompressionPolicy, MemberStats, peek
+from .multipart import MultipartUpload, UploadCancelled
+
+CHUNK_BYTES = 64 * 1024
+PIPE_CHUNKS = 16
+PARQUET_ROW_GROUP = 10_000
+
+RECORD_FORMATS = ("ndjson", "parquet")
+BUNDLE_FORMATS = ("json", "csv") + RECORD_FORMATS
+
+Chunks = Iterable[Union[bytes, str]]
+
+class BundleAborted(UploadCancelled):
+    """Raised to the pipe's reader when the ZIP writer failed: the bytes so far are not a bundle."""
+
+_FAILED = object()  # pipe marker: the writer failed
+
+@dataclass
+class BundleResult:
+    sha256: str
+    size: int
+    upload_error: Optional[Exception] = None
+    members: List[MemberStats] = field(default_factory=list)
+
+    def compression(self) -> dict:
+        """Per-member compression stats and the totals, for the bundle's metadata."""
+        size = sum(m.size for m in self.members)
+        compressed = sum(m.compressed_size for m in self.members)
+        return {
+            "size": size, "compressed_size": compressed,
+            "ratio": round(compressed / size, 4) if size else 1.0,
+            "ms": round(sum(m.seconds for m in self.members) * 1000, 1),
+            "members": [m.as_dict() for m in self.members],
+        }
+
+class _Pipe(io.RawIOBase):
+    """Bounded in-memory pipe: the writer blocks while the reader is PIPE_CHUNKS behind."""
+
+    def __init__(self):
+        self._chunks: "queue.Queue" = queue.Queue(maxsize=PIPE_CHUNKS)
+        self._buf = bytearray()
+        self._eof = False
+        self.broken = False  # reader gave up; writes are dropped
+
+    # reader side (upload)
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while not self._eof and (size < 0 or len(self._buf) < size):
+            chunk = self._chunks.get()
+            if chunk is _FAILED:
+                raise BundleAborted("bundle writer failed")
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buf += chunk
+        if size < 0:
+            size = len(self._buf)
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    # writer side (zip)
+    def put(self, data):
+        while not self.broken:
+            try:
+                self._chunks.put(data, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def fail(self):
+        """Writer side: end the stream as failed instead of at EOF."""
+        self.put(_FAILED)
+
+    def drain(self):
+        """Reader side: swallow whatever is left so a blocked writer can finish."""
+        self.broken = True
+        try:
+            while True:
+                self._chunks.get_nowait()
+        except queue.Empty:
+            pass
+
+class _HashingSink(io.RawIOBase):
+    """Unseekable file object for ZipFile: hashes, counts and forwards every byte."""
+
+    def __init__(self, pipe: Optional[_Pipe]):
+        self._pipe = pipe
+        self._pending = bytearray()
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.sha256.update(data)
+        self.size += len(data)
+        if self._pipe is not None:
+            self._pending += data
+            if len(self._pending) >= CHUNK_BYTES:
+                self._pipe.put(bytes(self._pending))
+                self._pending.clear()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def finish(self):
+        if self._pipe is not None:
+            if self._pending:
+                self._pipe.put(bytes(self._pending))
+                self._pending.clear()
+            self._pipe.put(None)
+
+# Fixed entry timestamp for reproducible bundles: same entries, same ZIP bytes
+FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+def _zip_info(name: str, date_time: Optional[Tuple[int, ...]], method: int, level: Optional[int]):
+    info = zipfile.ZipInfo(name, date_time=date_time or time.localtime(time.time())[:6])
+    info.compress_type = method
+    # ZipFile.open(ZipInfo) takes the member's level from the ZipInfo: public since 3.13,
+    # before that only as the (unchanged since 3.7) private attribute
+    if sys.version_info >= (3, 13):
+        info.compress_level = level
+    else:
+        info._compresslevel = level
+    info.external_attr = 0o600 << 16
+    return info
+
+def write_bundle(entries: Iterable[Tuple[str, Chunks]], sink, date_time: Optional[Tuple[int, ...]] = None,
+                 policy: Optional[CompressionPolicy] = None) -> List[MemberStats]:
+    policy = policy or CompressionPolicy()
+    stats = []
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, chunks in entries:
+            sample, chunks = peek(chunks)
+            choice = policy.choose(name, sample)
+            info = _zip_info(name, date_time, choice.method, choice.level)
+            spent = 0.0
+            with z.open(info, "w", force_zip64=True) as entry:
+                for chunk in chunks:
+                    started = time.perf_counter()
+                    entry.write(chunk)
+                    spent += time.perf_counter() - started
+            stats.append(MemberStats(name, choice.name, choice.level, info.file_size, info.compress_size,
+                                     spent, choice.reason))
+    return stats
+
+def stream_bundle(entries: Iterable[Tuple[str, Chunks]], upload: Optional[Callable[[Any], None]] = None,
+                  date_time: Optional[Tuple[int, ...]] = None, policy: Optional[CompressionPolicy] = None) -> BundleResult:
+    """
+    Zip `entries` ((name, chunks) pairs) into `upload(fileobj)` while hashing.
+
+    `upload` runs in its own thread and reads the ZIP as it is produced. If it
+    fails, the bundle is still written to the end (hash and size stay valid)
+    and the error is returned in `upload_error`. If writing fails, the
+    upload is aborted (it reads `BundleAborted`) before the error is
+    re-raised. With `date_time` (e.g.
+    FIXED_DATE_TIME) every entry gets that timestamp and the output is
+    reproducible for the levels `policy` picks.
+    """
+    pipe = _Pipe() if upload else None
+    sink = _HashingSink(pipe)
+    errors = []
+
+    def _upload():
+        try:
+            upload(pipe)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            pipe.drain()
+
+    uploader = threading.Thread(target=_upload, name="bundle-upload", daemon=True) if upload else None
+    if uploader:
+        uploader.start()
+    try:
+        members = write_bundle(entries, sink, date_time, policy)
+    except BaseException:
+        if uploader:
+            pipe.fail()
+            uploader.join()
+        raise
+    sink.finish()
+    if uploader:
+        uploader.join()
+    return BundleResult(sha256=sink.sha256.hexdigest(), size=sink.size, upload_error=errors[0] if errors else None,
+                        members=members)
+
+def s3_uploader(client, bucket: str, key: str, content_type: str = "application/zip",
+                extra_args: Optional[dict] = None, cancel_event: Optional[threading.Event] = None,
+                progress: Optional[Callable[[int], None]] = None, meta: Optional[Callable[[], dict]] = None):
+    """Upload callable for stream_bundle: resumable multipart upload of the pipe to bucket/key."""
+    args = {"ContentType": content_type, **(extra_args or {})}
+    def upload(fileobj):
+        MultipartUpload(client, bucket, key, extra_args=args, cancel_event=cancel_event, progress=progress,
+                        meta=meta).upload(fileobj)
+    return upload
+
+# --- entry generators --------------------------------------------------------
+
+def _buffered(parts: Iterable[str]) -> Iterator[str]:
+    """Coalesce tiny encoder fragments into ~CHUNK_BYTES writes."""
+    buf, size = [], 0
+    for part in parts:
+        buf.append(part)
+        size += len(part)
+        if size >= CHUNK_BYTES:
+            yield "".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf)
+
+def json_chunks(obj, indent: Optional[int] = 2) -> Iterator[str]:
+    """json.dump(obj) as a stream of chunks (iterencode, never one big string)."""
+    encoder = json.JSONEncoder(ensure_ascii=False, indent=indent, default=str)
+    return _buffered(encoder.iterencode(obj))
+
+def json_array_chunks(items: Iterable[Any]) -> Iterator[str]:
+    """A JSON array from an iterable of any length; one element in memory at a time."""
+    encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+
+    def parts():
+        yield "["
+        for i, item in enumerate(items):
+            yield ",\n" if i else "\n"
+            yield encoder.encode(item)
+        yield "\n]\n"
+    return _buffered(parts())
+
+class _LineBuffer:
+    def __init__(self):
+        self.parts = []
+
+    def write(self, s):
+        self.parts.append(s)
+
+def csv_chunks(header: Optional[Iterable[str]], rows: Iterable[Iterable[Any]]) -> Iterator[str]:
+    """CSV text from an iterable of rows."""
+    out = _LineBuffer()
+    writer = csv.writer(out)
+
+    def parts():
+        if header is not None:
+            writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            yield from out.parts
+            out.parts.clear()
+        yield from out.parts
+        out.parts.clear()
+    return _buffered(parts())
+
+def ndjson_chunks(records: Iterable[Any]) -> Iterator[str]:
+    """Newline-delimited JSON: one record per line, encoded as it is pulled."""
+    encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+    return _buffered(encoder.encode(record) + "\n" for record in records)
+
+class _Spool(io.RawIOBase):
+    """Write-only sink for ParquetWriter; `take()` hands over what was written so far."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buf += data
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def take(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+_JSON = json.JSONEncoder(ensure_ascii=False, default=str)
+
+def _flat(record: Any) -> Dict[str, Any]:
+    """Top-level fields become columns; nested values are kept as JSON text."""
+    if not isinstance(record, dict):
+        record = {"value": record}
+    return {
+        str(k): _JSON.encode(v) if isinstance(v, (dict, list, tuple)) else v
+        for k, v in record.items()
+    }
+
+def _fits(pa, value, typ) -> bool:
+    if value is None:
+        return True
+    if pa.types.is_boolean(typ):
+        return isinstance(value, bool)
+    if pa.types.is_integer(typ):
+        return isinstance(value, int) and not isinstance(value, bool) and -2**63 <= value < 2**63
+    if pa.types.is_floating(typ):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if pa.types.is_string(typ):
+        return isinstance(value, str)
+    if pa.types.is_timestamp(typ):
+        return isinstance(value, datetime)
+    if pa.types.is_date(typ):
+        return isinstance(value, date) and not isinstance(value, datetime)
+    try:
+        pa.scalar(value, type=typ)
+        return True
+    except (pa.ArrowException, TypeError, ValueError):
+        return False
+
+def _infer_schema(pa, rows: List[Dict[str, Any]]):
+    """Column types from the first row group; a column with mixed or no values is a string."""
+    names = list(dict.fromkeys(k for row in rows for k in row if k != "_extra"))
+    fields = []
+    for name in names:
+        try:
+            typ = pa.array([row.get(name) for row in rows]).type
+        except (pa.ArrowException, TypeError, ValueError, OverflowError):
+            typ = pa.string()
+        fields.append(pa.field(name, pa.string() if pa.types.is_null(typ) else typ))
+    fields.append(pa.field("_extra", pa.string()))
+    return pa.schema(fields)
+
+def _conform(pa, rows: List[Dict[str, Any]], schema) -> Dict[str, list]:
+    """Rows as columns of `schema`; unknown keys and values of the wrong type go to `_extra` (JSON)."""
+    types = {f.name: f.type for f in schema if f.name != "_extra"}
+    columns = {name: [] for name in schema.names}
+    for row in rows:
+        extra = {}
+        for name, typ in types.items():
+            value = row.get(name)
+            if _fits(pa, value, typ):
+                columns[name].append(value)
+            else:
+                columns[name].append(None)
+                extra[name] = value
+        extra.update((k, v) for k, v in row.items() if k not in types)
+        columns["_extra"].append(_JSON.encode(extra) if extra else None)
+    return columns
+
+def _row_group(pa, rows: List[Dict[str, Any]], schema):
+    # Fast path: each column inferred by Arrow and taken as is when it already has the
+    # schema's type (or widens int -> float); Arrow's own coercion to a schema would
+    # silently truncate 1.5 into an int64 column, so it is never asked to convert.
+    if all(set(schema.names).issuperset(row) for row in rows):
+        arrays = []
+        for field in schema:
+            try:
+                array = pa.array([row.get(field.name) for row in rows])
+            except (pa.ArrowException, TypeError, ValueError, OverflowError):
+                break
+            if not (array.type == field.type or pa.types.is_null(array.type)
+                    or (pa.types.is_integer(array.type) and pa.types.is_floating(field.type))):
+                break
+            arrays.append(array.cast(field.type))
+        else:
+            return pa.Table.from_arrays(arrays, schema=schema)
+    return pa.table(_conform(pa, rows, schema), schema=schema)
+
+def parquet_chunks(records: Iterable[Any], rows_per_group: int = PARQUET_ROW_GROUP) -> Iterator[bytes]:
+    """
+    Parquet file (zstd) from an iterable of records, one row group at a time.
+
+    The schema comes from the first row group. Later fields that do not fit it
+    are kept, as JSON, in the `_extra` column rather than dropped.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    spool = _Spool()
+    writer = schema = None
+    records = iter(records)
+    try:
+        while True:
+            rows = [_flat(r) for r in islice(records, rows_per_group)]
+            if not rows:
+                break
+            if writer is None:
+                schema = _infer_schema(pa, rows)
+                writer = pq.ParquetWriter(spool, schema, compression="zstd")
+            writer.write_table(_row_group(pa, rows, schema))
+            yield spool.take()
+        if writer is None:
+            writer = pq.ParquetWriter(spool, pa.schema([pa.field("_extra", pa.string())]), compression="zstd")
+    finally:
+        if writer is not None:
+            writer.close()
+    yield spool.take()
+
+def record_csv_chunks(records: Iterable[Any]) -> Iterator[str]:
+    """One source's records as (record, field, value) CSV rows."""
+    def rows():
+        for i, record in enumerate(records):
+            for field, value in _flat(record).items():
+                yield [i, field, "" if value is None else value]
+    return csv_chunks(["record", "field", "value"], rows())
+
+SOURCE_WRITERS = {
+    "json": json_array_chunks,
+    "csv": record_csv_chunks,
+    "ndjson": ndjson_chunks,
+    "parquet": parquet_chunks,
+}
+
+def source_chunks(fmt: str, records: Iterable[Any]) -> Iterator[bytes]:
+    """One source's records in `fmt`, as bytes."""
+    for chunk in SOURCE_WRITERS[fmt](records):
+        yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+
+def record_entries(prefix: str, sources: Dict[str, Iterable[Any]], formats: Sequence[str]) -> Iterator[Tuple[str, Chunks]]:
+    """
+    (name, chunks) entries `<prefix><source>.<format>` for each record format
+    in `formats`. Each source is iterated once per format, so pass lists or
+    other re-iterables when more than one record format is selected.
+    """
+    for fmt in formats:
+        if fmt not in RECORD_FORMATS:
+            continue
+        for source, records in sources.items():
+            yield f"{prefix}{source}.{fmt}", source_chunks(fmt, records)
+
+def check_formats(formats: Sequence[str]) -> List[str]:
+    unknown = [f for f in formats if f not in BUNDLE_FORMATS]
+    if unknown or not formats:
+        raise ValueError(f"export formats must be a non-empty subset of {', '.join(BUNDLE_FORMATS)}")
+    return list(dict.fromkeys(formats))
@@ -0,0 +1,354 @@
+"""
+Content-addressed store for export artifacts.
+
+Artifacts are stored once, as `cas/<sha256>`: staged source records,
+per-source snapshots, archival copies and the bundles themselves. A bundle
+is an ExportManifest listing its entries (name, sha256, size). The ZIP
+handed out for download is written with fixed timestamps, so it is a pure
+function of that list and is stored under
+`cas/bundles/<manifest digest>.zip`.
+
+A bundle is written in one pass: each entry is hashed as it streams into
+the ZIP, and the ZIP streams into a multipart upload under a staging key
+(its final key depends on every entry's hash, known only at the end). The
+staging object is then copied server-side to the bundle's key, or dropped
+when an identical bundle is already stored, so entry bytes are never
+spooled, read back or uploaded on their own. An identical re-run is
+normally answered by the export cache before anything is written. Outside
+a bundle, `put` hashes (spooling past SPOOL_BYTES) before it uploads, and a
+key already registered in CasObject and present in the bucket is never
+uploaded again.
+
+Reference counting: each manifest holds one reference to its ZIP and to
+each entry that is also a stored blob (a stitched snapshot, the archive),
+and each SourceSnapshot holds one to its blob. Retention releases
+manifests (`release_expired_manifests`), and `collect_garbage` deletes
+objects left at refcount 0. Objects are registered, and touched on every
+reuse, before anyone takes a reference. GC only removes objects that have
+stayed unreferenced for `grace`, so it does not race an export that is
+deduplicating against an object at that moment.
+
+Members are compressed per `CompressionPolicy` (stored when already
+compressed, deflate level from size and queue backlog). The levels are part
+of the ZIP's bytes but not of its key, so a bundle is reused whatever levels
+it was written with. They are saved with the staging upload's checkpoint,
+and a retried upload reuses them so its parts match the stored ones. Each
+manifest entry records its member's compression stats. With `archive`, a
+tar.zst of the same entries is also stored as an internal archival copy.
+It is content-addressed, listed in the manifest as ARCHIVE_ENTRY, and
+reference-counted like the other entries. Only then are entries spooled
+(tar writes each member's size before its bytes), and the archive is
+built from those spools.
+
+An ExportProgress, if given, counts the bytes written and uploaded
+(deduplicated bytes are not uploaded), and cancelling it aborts the uploads.
+"""
+import hashlib
+import json
+import logging
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from botocore.exceptions import BotoCoreError, ClientError
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session
+from ..database import write_queue
+from ..models import CasObject, ExportManifest
+from .bundle_writer import CHUNK_BYTES, FIXED_DATE_TIME, BundleResult, Chunks, s3_uploader, stream_bundle
+from .compression import CompressionPolicy, write_archive
+from .export_progress import ExportProgress
+from .multipart import MultipartUpload, checkpoint_meta
+
+logger = logging.getLogger(__name__)
+
+CAS_PREFIX = "cas/"
+BUNDLE_PREFIX = "cas/bundles/"
+STAGING_PREFIX = "cas/staging/"
+SPOOL_BYTES = 8 * 1024 * 1024
+GC_GRACE = timedelta(hours=1)
+ARCHIVE_ENTRY = ".archive.tar.zst"
+
+def blob_key(sha256: str) -> str:
+    return f"{CAS_PREFIX}{sha256}"
+
+def bundle_key(digest: str) -> str:
+    return f"{BUNDLE_PREFIX}{digest}.zip"
+
+def staging_key(account_id: str, request_id: str, export_id: Optional[str] = None) -> str:
+    """Where a bundle is uploaded before its digest is known; stable across retries of one export."""
+    name = hashlib.sha256(f"{account_id}/{request_id}/{export_id or ''}".encode("utf-8")).hexdigest()
+    return f"{STAGING_PREFIX}{name}.zip"
+
+def manifest_digest(entries: List[dict]) -> str:
+    canonical = json.dumps([[e["name"], e["sha256"]] for e in entries], separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class Hashed:
+    """An artifact's bytes hashed and counted as they pass."""
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk) -> bytes:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+class Spooled(Hashed):
+    """An artifact's bytes on a spool file, hashed and counted as they are written."""
+
+    def __init__(self, chunks: Optional[Chunks] = None):
+        super().__init__()
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        for chunk in chunks or ():
+            self.write(chunk)
+
+    def write(self, chunk) -> bytes:
+        chunk = super().write(chunk)
+        self.file.write(chunk)
+        return chunk
+
+    def chunks(self) -> Iterator[bytes]:
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+# --- registry (run on the write queue) -----------------------------------------
+
+def _insert(session: Session):
+    return postgresql.insert if session.get_bind().dialect.name == "postgresql" else sqlite.insert
+
+def _touch(session: Session, key: str) -> bool:
+    result = session.execute(update(CasObject).where(CasObject.key == key).values(updated_at=datetime.utcnow()))
+    return result.rowcount > 0
+
+def _stat(session: Session, key: str) -> Tuple[str, int]:
+    return session.execute(select(CasObject.sha256, CasObject.size).where(CasObject.key == key)).one()
+
+def _register(session: Session, key: str, sha256: str, size: int):
+    now = datetime.utcnow()
+    stmt = _insert(session)(CasObject.__table__).values(
+        key=key, sha256=sha256, size=size, refcount=0, created_at=now, updated_at=now
+    )
+    session.execute(stmt.on_conflict_do_update(index_elements=["key"], set_={"updated_at": now}))
+
+def acquire(session: Session, keys: Iterable[str]):
+    """Take one reference per key (keys must be registered); caller commits."""
+    for key in keys:
+        session.execute(update(CasObject).where(CasObject.key == key).values(refcount=CasObject.refcount + 1))
+
+def release(session: Session, keys: Iterable[str]):
+    now = datetime.utcnow()
+    for key in keys:
+        session.execute(
+            update(CasObject).where(CasObject.key == key)
+            .values(refcount=CasObject.refcount - 1, updated_at=now)
+        )
+
+def _manifest_keys(key: str, entries: List[dict]) -> List[str]:
+    # Manifests written before entries were flagged referenced every entry
+    return [key] + [blob_key(e["sha256"]) for e in entries if e.get("stored", True)]
+
+def _record_manifest(session: Session, account_id: str, request_id: str, digest: str,
+                     key: str, sha256: str, entries: List[dict]):
+    """Record the manifest; it references its ZIP and those entries that are stored blobs."""
+    for entry in entries:
+        entry["stored"] = _touch(session, blob_key(entry["sha256"]))
+    session.add(ExportManifest(
+        account_id=account_id, request_id=request_id, digest=digest,
+        bundle_key=key, bundle_sha256=sha256, entries=entries,
+    ))
+    acquire(session, _manifest_keys(key, entries))
+
+def _release_manifests(session: Session, cutoff: datetime) -> int:
+    manifests = session.execute(
+        select(ExportManifest).where(ExportManifest.created_at < cutoff, ExportManifest.released_at.is_(None))
+    ).scalars().all()
+    for manifest in manifests:
+        release(session, _manifest_keys(manifest.bundle_key, manifest.entries))
+        manifest.released_at = datetime.utcnow()
+        session.add(manifest)
+    return len(manifests)
+
+def _collect(session: Session, cutoff: datetime, keys: Optional[List[str]]) -> List[str]:
+    stmt = delete(CasObject).where(CasObject.refcount <= 0, CasObject.updated_at < cutoff)
+    if keys is not None:
+        stmt = stmt.where(CasObject.key.in_(keys))
+    return list(session.execute(stmt.returning(CasObject.key)).scalars().all())
+
+# --- store ------------------------------------------------------------------
+
+class CasStore:
+    def __init__(self, client, bucket: str, progress: Optional[ExportProgress] = None):
+        self.client = client
+        self.bucket = bucket
+        self.progress = progress or ExportProgress()
+
+    def _upload_progress(self, n: int):
+        self.progress.add(bytes_uploaded=n)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except (ClientError, BotoCoreError):
+            # No object store in dev (no credentials, no endpoint): treated as absent
+            return False
+
+    def read(self, key: str) -> Iterator[bytes]:
+        body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        try:
+            yield from body.iter_chunks(CHUNK_BYTES)
+        finally:
+            body.close()
+
+    def has(self, key: str) -> bool:
+        """Registered and present; touching it keeps GC away while a reference is taken."""
+        return write_queue.run(_touch, key) and self.exists(key)
+
+    def put(self, spooled: Spooled) -> str:
+        """Store an artifact unless the same bytes are already stored; returns its key."""
+        key = blob_key(spooled.sha256)
+        if not self.has(key):
+            spooled.file.seek(0)
+            self.progress.remember("uploads", key)
+            MultipartUpload(
+                self.client, self.bucket, key, cancel_event=self.progress, progress=self._upload_progress
+            ).upload(spooled.file)
+            self.progress.forget("uploads", key)
+            write_queue.run(_register, key, spooled.sha256, spooled.size)
+        return key
+
+    def store_archive(self, manifest: List[dict], spools: Dict[str, Spooled]) -> dict:
+        """tar.zst of the manifest's entries, stored like any artifact; returns its manifest entry."""
+        archive = Spooled()
+        try:
+            seconds = write_archive(((e["name"], e["size"], spools[e["name"]].chunks()) for e in manifest), archive)
+            self.put(archive)
+            return {
+                "name": ARCHIVE_ENTRY, "sha256": archive.sha256, "size": archive.size,
+                "compression": {"method": "zstd", "source_size": sum(e["size"] for e in manifest),
+                                "ms": round(seconds * 1000, 1)},
+            }
+        finally:
+            archive.close()
+
+    def _publish(self, staging: str, key: str, result: BundleResult) -> BundleResult:
+        """Move the uploaded ZIP to its content address; an identical stored bundle wins."""
+        try:
+            if self.has(key):
+                sha256, size = write_queue.run(_stat, key)
+                return BundleResult(sha256=sha256, size=size)
+            # Server-side copy: no bytes go up again
+            self.client.copy({"Bucket": self.bucket, "Key": staging}, self.bucket, key)
+            write_queue.run(_register, key, result.sha256, result.size)
+            return result
+        finally:
+            self.delete([staging])
+
+    def store_bundle(self, account_id: str, request_id: str, entries: Iterable[Tuple[str, Chunks]],
+                     archive: bool = False, backlog: Optional[int] = None) -> Tuple[BundleResult, str]:
+        """
+        Write the reproducible ZIP of `entries` in one pass, store it under
+        its content address, optionally store the tar.zst archival copy, and
+        record the manifest. `backlog` pins the queue backlog the compression
+        levels are chosen for (default: the current one). Returns the bundle
+        result and the ZIP's key.
+
+        If the upload fails (no object store in dev), the ZIP is still
+        written to the end; its error is the result's upload_error and
+        nothing is registered.
+        """
+        manifest: List[dict] = []
+        spools: Dict[str, Spooled] = {}
+
+        def hashed() -> Iterator[Tuple[str, Iterator[bytes]]]:
+            # The ZIP pulls the next entry only once the previous one is written
+            for name, chunks in entries:
+                self.progress.check()
+                sink = spools.setdefault(name, Spooled()) if archive else Hashed()
+                yield name, (sink.write(chunk) for chunk in chunks)
+                manifest.append({"name": name, "sha256": sink.sha256, "size": sink.size})
+                self.progress.add(bytes_written=sink.size, entries_done=1)
+
+        staging = staging_key(account_id, request_id, self.progress.export_id)
+        try:
+            # A retry repeats the choices of the interrupted upload, so its parts match
+            policy = CompressionPolicy.adaptive(backlog=backlog)
+            policy.pinned = checkpoint_meta(self.bucket, staging).get("compression") or {}
+            self.progress.remember("uploads", staging)
+            result = stream_bundle(
+                hashed(),
+                s3_uploader(self.client, self.bucket, staging, cancel_event=self.progress,
+                            progress=self._upload_progress, meta=lambda: {"compression": policy.decisions()}),
+                date_time=FIXED_DATE_TIME,
+                policy=policy,
+            )
+            digest = manifest_digest(manifest)
+            key = bundle_key(digest)
+            if result.upload_error:
+                return result, key
+            self.progress.forget("uploads", staging)
+            try:
+                published = self._publish(staging, key, result)
+            except (ClientError, BotoCoreError) as e:
+                result.upload_error = e
+                return result, key
+            self.progress.add(bytes_written=result.size, entries_done=1)
+            # Not part of the digest: same entries, same bundle, whatever the levels
+            if published is result:
+                stats = {m.name: m.as_dict() for m in result.members}
+                for entry in manifest:
+                    entry["compression"] = {k: v for k, v in stats[entry["name"]].items() if k != "name"}
+            if archive:
+                self.progress.check()
+                manifest.append(self.store_archive(manifest, spools))
+            write_queue.run(_record_manifest, account_id, request_id, digest, key, published.sha256, manifest)
+            return published, key
+        finally:
+            for spooled in spools.values():
+                spooled.close()
+
+    def delete(self, keys: Iterable[str]):
+        keys = list(keys)
+        for i in range(0, len(keys), 1000):
+            batch = [{"Key": key} for key in keys[i:i + 1000]]
+            try:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": batch, "Quiet": True})
+            except ClientError as e:
+                logger.warning("cas objects not deleted: %s", e)
+
+def release_expired_manifests(older_than: timedelta) -> int:
+    return write_queue.run(_release_manifests, datetime.utcnow() - older_than)
+
+def collect_garbage(store: CasStore, grace: timedelta = GC_GRACE, keys: Optional[List[str]] = None) -> int:
+    """Delete objects unreferenced for `grace` (only among `keys`, if given)."""
+    deleted = write_queue.run(_collect, datetime.utcnow() - grace, keys)
+    store.delete(deleted)
+    return len(deleted)
+
+def collect_staging(store: CasStore, older_than: timedelta = GC_GRACE) -> int:
+    """Delete staged bundles left behind by exports that died before publishing them."""
+    cutoff = datetime.now(timezone.utc) - older_than
+    stale = [
+        obj["Key"]
+        for page in store.client.get_paginator("list_objects_v2").paginate(Bucket=store.bucket, Prefix=STAGING_PREFIX)
+        for obj in page.get("Contents", [])
+        if obj["LastModified"] < cutoff
+    ]
+    store.delete(stale)
+    return len(stale)
@@ -0,0 +1,58 @@
+"""
+Per-tenant collection versions behind the list ETags.
+
+Every flush that adds, changes or deletes a DSARRequest or DataBreachReport
+bumps the owning tenant's version for that collection in the same
+transaction (after_flush), so checking whether a list changed is a single
+lookup on (user_id, collection). Core bulk writes skip the unit of work and
+call `bump_version` themselves.
+"""
+from datetime import datetime
+from itertools import chain
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session
+from ..models import CollectionVersion, DataBreachReport, DSARRequest
+
+REQUESTS = "requests"
+BREACHES = "breaches"
+
+TRACKED = {DSARRequest: REQUESTS, DataBreachReport: BREACHES}
+
+def bump_version(executor, user_id: int, collection: str):
+    """Increment (or create) one tenant's collection version; caller commits."""
+    table = CollectionVersion.__table__
+    dialect = executor.get_bind().dialect.name if hasattr(executor, "get_bind") else executor.dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(table).values(
+        user_id=user_id, collection=collection, version=1, updated_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "collection"],
+        set_={"version": table.c.version + 1, "updated_at": stmt.excluded.updated_at},
+    )
+    executor.execute(stmt)
+
+def get_version(session: Session, user_id: int, collection: str) -> int:
+    """Current version, 0 for a tenant that has not written since versions were introduced."""
+    version = session.execute(
+        select(CollectionVersion.version).where(
+            CollectionVersion.user_id == user_id,
+            CollectionVersion.collection == collection,
+        )
+    ).scalar()
+    return version or 0
+
+@event.listens_for(Session, "after_flush")
+def _bump_on_flush(session, flush_context):
+    # new/dirty/deleted still describe what this flush wrote
+    touched = {
+        (obj.user_id, TRACKED[type(obj)])
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if type(obj) in TRACKED and obj.user_id is not None
+    }
+    if not touched:
+        return
+    conn = session.connection()
+    for user_id, collection in sorted(touched):
+        bump_version(conn, user_id, collection)
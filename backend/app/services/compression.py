@@ -0,0 +1,223 @@
+"""
+Compression policy for bundle members.
+
+Deflating bytes that are already compressed costs CPU and saves almost
+nothing. That covers the report PDF (reportlab compresses its pages), zstd
+Parquet, images and archives. `CompressionPolicy.choose` picks each member's
+method and level:
+
+- ZIP_STORED for formats compressed by construction (by extension), and for
+  members whose first SAMPLE_BYTES shrink by less than MIN_SAVING at deflate
+  level 1;
+- otherwise ZIP_DEFLATED at a level set by the member's size: small members
+  get the best ratio, large ones the fastest level. A backlog on the worker
+  queue caps the level further, trading bytes for throughput while exports
+  are waiting.
+
+The backlog is read once per export and pinned by the caller (the export
+task keeps it in the progress hash and passes it to `adaptive`), so a retry
+of the same export decides as the first attempt did. Levels change the
+ZIP's bytes, not its content, so a CAS bundle key (a digest of the entries)
+still identifies the same files. A resumed upload needs the same bytes,
+though: `decisions()` returns the choices made so far, and a policy built
+with them as `pinned` repeats them whatever the backlog.
+
+Internal archival copies can opt in to zstd: `write_archive` writes a
+reproducible tar.zst of members of known size. The zstd codec comes with
+pyarrow, which the Parquet format already needs. Stdlib zipfile cannot write
+zstd members (method 93), so the download ZIP stays deflate.
+"""
+import io
+import logging
+import tarfile
+import time
+import zipfile
+import zlib
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+import redis
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_BYTES = 64 * 1024
+MIN_SAVING = 0.05
+# (size up to, deflate level); larger members get level 1
+SIZE_LEVELS = ((1 << 20, 9), (64 << 20, 6), (512 << 20, 3))
+DEFAULT_LEVEL = 6
+BACKLOG_QUEUE = "celery"
+
+COMPRESSED_EXTENSIONS = (
+    ".pdf", ".parquet", ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".mp4", ".mp3",
+)
+
+_client = None
+
+def _redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _client
+
+def queue_backlog(queue: str = BACKLOG_QUEUE) -> int:
+    """Tasks waiting on the broker queue; 0 when it cannot be read."""
+    try:
+        return int(_redis().llen(queue))
+    except redis.RedisError as e:
+        logger.warning("queue backlog unavailable: %s", e)
+        return 0
+
+@dataclass(frozen=True)
+class Choice:
+    method: int
+    level: Optional[int] = None
+    reason: str = ""
+
+    @property
+    def name(self) -> str:
+        return "stored" if self.method == zipfile.ZIP_STORED else "deflated"
+
+@dataclass
+class MemberStats:
+    """How one member was written: sizes, and seconds spent compressing and writing it."""
+    name: str
+    method: str
+    level: Optional[int]
+    size: int
+    compressed_size: int
+    seconds: float
+    reason: str = ""
+
+    @property
+    def ratio(self) -> float:
+        return round(self.compressed_size / self.size, 4) if self.size else 1.0
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name, "method": self.method, "level": self.level, "reason": self.reason,
+            "size": self.size, "compressed_size": self.compressed_size,
+            "ratio": self.ratio, "ms": round(self.seconds * 1000, 1),
+        }
+
+def sample_ratio(sample: bytes) -> float:
+    """Deflate level 1 ratio of `sample` (compressed / original)."""
+    if not sample:
+        return 1.0
+    compressor = zlib.compressobj(1, zlib.DEFLATED, -15)
+    return len(compressor.compress(sample) + compressor.flush()) / len(sample)
+
+class CompressionPolicy:
+    def __init__(self, sizes: Optional[Dict[str, int]] = None, backlog: int = 0,
+                 pinned: Optional[Dict[str, list]] = None):
+        self.sizes = sizes or {}
+        self.backlog = backlog
+        self.pinned = dict(pinned or {})
+        self.decided: Dict[str, Choice] = {}
+
+    @classmethod
+    def adaptive(cls, sizes: Optional[Dict[str, int]] = None, backlog: Optional[int] = None) -> "CompressionPolicy":
+        """A policy that also weighs the queue backlog (`backlog`, or the current one)."""
+        return cls(sizes, queue_backlog() if backlog is None else backlog)
+
+    def level_for(self, size: Optional[int]) -> int:
+        level = DEFAULT_LEVEL
+        if size is not None:
+            level = next((lvl for limit, lvl in SIZE_LEVELS if size <= limit), 1)
+        if self.backlog >= settings.compression_backlog_high:
+            return 1
+        if self.backlog >= settings.compression_backlog_busy:
+            return min(level, 3)
+        return level
+
+    def decisions(self) -> Dict[str, list]:
+        """Choices made so far, JSON-ready ({name: [method, level, reason]}), for `pinned`."""
+        decided = dict(self.decided)  # read from the upload thread while members are written
+        return {name: [c.method, c.level, c.reason] for name, c in decided.items()}
+
+    def choose(self, name: str, sample: bytes) -> Choice:
+        """Method and level for member `name`, given its first bytes (a pinned choice wins)."""
+        if name in self.pinned:
+            choice = Choice(*self.pinned[name])
+        else:
+            choice = self._choose(name, sample)
+        self.decided[name] = choice
+        return choice
+
+    def _choose(self, name: str, sample: bytes) -> Choice:
+        if name.lower().endswith(COMPRESSED_EXTENSIONS):
+            return Choice(zipfile.ZIP_STORED, reason="compressed format")
+        if not sample:
+            return Choice(zipfile.ZIP_STORED, reason="empty")
+        if sample_ratio(sample[:SAMPLE_BYTES]) > 1 - MIN_SAVING:
+            return Choice(zipfile.ZIP_STORED, reason="incompressible")
+        # A sample shorter than SAMPLE_BYTES is the whole member
+        size = self.sizes.get(name, len(sample) if len(sample) < SAMPLE_BYTES else None)
+        return Choice(zipfile.ZIP_DEFLATED, self.level_for(size))
+
+def _bytes(chunk: Union[bytes, str]) -> bytes:
+    return chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+
+def peek(chunks: Iterable[Union[bytes, str]], size: int = SAMPLE_BYTES) -> Tuple[bytes, Iterator[bytes]]:
+    """The first `size`-odd bytes of a stream, and the whole stream (as bytes) still to be read."""
+    it = iter(chunks)
+    head, n = [], 0
+    for chunk in it:
+        head.append(_bytes(chunk))
+        n += len(head[-1])
+        if n >= size:
+            break
+    return b"".join(head), chain(head, (_bytes(chunk) for chunk in it))
+
+# --- archival copies ------------------------------------------------------------
+
+class _ChunkReader(io.RawIOBase):
+    def __init__(self, chunks: Iterable[Union[bytes, str]]):
+        self._chunks = iter(chunks)
+        self._buf = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buf:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buf = _bytes(chunk)
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+class _Writer(io.RawIOBase):
+    def __init__(self, sink):
+        self._sink = sink
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._sink.write(bytes(data))
+        return len(data)
+
+def write_archive(members: Iterable[Tuple[str, int, Iterable[Union[bytes, str]]]], sink) -> float:
+    """
+    tar.zst of (name, size, chunks) members into `sink` (anything with
+    write(bytes)). Owner, mode and mtime are fixed, so the same members give
+    the same bytes. Returns the seconds spent.
+    """
+    import pyarrow as pa
+
+    started = time.perf_counter()
+    stream = pa.CompressedOutputStream(pa.PythonFile(_Writer(sink), mode="w"), "zstd")
+    try:
+        with tarfile.open(fileobj=stream, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+            for name, size, chunks in members:
+                info = tarfile.TarInfo(name)
+                info.size, info.mode, info.mtime = size, 0o600, 0
+                tar.addfile(info, io.BufferedReader(_ChunkReader(chunks), 64 * 1024))
+    finally:
+        stream.close()
+    return time.perf_counter() - started
@@ -0,0 +1,166 @@
+"""
+Connectors: pull one data subject's records out of a DataSource.
+
+Each connector exposes the same two calls:
+
+- `fingerprint(email)`: a cheap marker of the subject's data (one or two
+  requests), used with `unchanged_sources` to skip a fetch entirely;
+- `fetch(email)`: {collection: records iterator}, paginated lazily.
+
+Errors are split by what a retry can do about them: `SourceThrottled`
+(429, carries Retry-After) and transport errors / 5xx are transient;
+`ConnectorError` (bad config, 4xx) is not.
+"""
+import hashlib
+import json
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+import httpx
+from ..config import settings
+
+class ConnectorError(Exception):
+    """Permanent failure: retrying will not help."""
+
+class SourceThrottled(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+def _digest(parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class Connector:
+    collections: Tuple[str, ...] = ()
+
+    def __init__(self, config: dict, timeout: Optional[float] = None):
+        self.config = config or {}
+        self.client = httpx.Client(timeout=timeout or settings.fetch_timeout_s, **self._client_args())
+
+    def _client_args(self) -> dict:
+        return {}
+
+    def _require(self, *keys: str):
+        missing = [k for k in keys if not self.config.get(k)]
+        if missing:
+            raise ConnectorError(f"data source config missing {', '.join(missing)}")
+        return [self.config[k] for k in keys]
+
+    def _get(self, url: str, **params) -> httpx.Response:
+        response = self.client.get(url, params=params or None)
+        if response.status_code == 429:
+            raise SourceThrottled(float(response.headers.get("Retry-After") or 2))
+        if 400 <= response.status_code < 500:
+            raise ConnectorError(f"{response.status_code} from {response.request.url.host}")
+        response.raise_for_status()
+        return response
+
+    def fingerprint(self, email: str) -> Optional[str]:
+        return None
+
+    def fetch(self, email: str) -> Dict[str, Iterable[dict]]:
+        raise NotImplementedError
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ShopifyConnector(Connector):
+    """Admin REST API: customers matching the email, and all their orders."""
+    collections = ("customers", "orders")
+
+    def _client_args(self) -> dict:
+        shop, token = self._require("shop_domain", "access_token")
+        version = self.config.get("api_version", "2024-07")
+        return {"base_url": f"https://{shop}/admin/api/{version}", "headers": {"X-Shopify-Access-Token": token}}
+
+    def _customers(self, email: str) -> list:
+        if not hasattr(self, "_found"):
+            self._found = self._get("/customers/search.json", query=f"email:{email}", limit=250).json()["customers"]
+        return self._found
+
+    def fingerprint(self, email: str) -> Optional[str]:
+        return _digest([[c["id"], c.get("updated_at"), c.get("orders_count")] for c in self._customers(email)])
+
+    def _orders(self, email: str) -> Iterator[dict]:
+        for customer in self._customers(email):
+            url, params = f"/customers/{customer['id']}/orders.json", {"status": "any", "limit": 250}
+            while url:
+                response = self._get(url, **params)
+                yield from response.json()["orders"]
+                # Cursor pagination: the next page's URL carries every parameter
+                url, params = response.links.get("next", {}).get("url"), {}
+
+    def fetch(self, email: str) -> Dict[str, Iterable[dict]]:
+        return {"customers": list(self._customers(email)), "orders": self._orders(email)}
+
+class WooCommerceConnector(Connector):
+    """WC REST API v3 with consumer key/secret: customers by email, and their orders."""
+    collections = ("customers", "orders")
+    PER_PAGE = 100
+
+    def _client_args(self) -> dict:
+        url, key, secret = self._require("url", "consumer_key", "consumer_secret")
+        return {"base_url": f"{url.rstrip('/')}/wp-json/wc/v3", "auth": (key, secret)}
+
+    def _customers(self, email: str) -> list:
+        if not hasattr(self, "_found"):
+            self._found = self._get("/customers", email=email, role="all").json()
+        return self._found
+
+    def fingerprint(self, email: str) -> Optional[str]:
+        parts = []
+        for customer in self._customers(email):
+            total = self._get("/orders", customer=customer["id"], per_page=1).headers.get("X-WP-Total")
+            parts.append([customer["id"], customer.get("date_modified_gmt"), total])
+        return _digest(parts)
+
+    def _orders(self, email: str) -> Iterator[dict]:
+        for customer in self._customers(email):
+            page, pages = 1, 1
+            while page <= pages:
+                response = self._get("/orders", customer=customer["id"], per_page=self.PER_PAGE, page=page)
+                yield from response.json()
+                pages = int(response.headers.get("X-WP-TotalPages") or 1)
+                page += 1
+
+    def fetch(self, email: str) -> Dict[str, Iterable[dict]]:
+        return {"customers": list(self._customers(email)), "orders": self._orders(email)}
+
+class CustomConnector(Connector):
+    """
+    Any HTTP endpoint: GET `url?email=` returning a list of records or
+    {collection: [records]}. An optional `fingerprint_url` (same query)
+    returns a marker that changes with the subject's data.
+    """
+
+    def _client_args(self) -> dict:
+        self._require("url")
+        return {"headers": self.config.get("headers") or {}}
+
+    def fingerprint(self, email: str) -> Optional[str]:
+        if not self.config.get("fingerprint_url"):
+            return None
+        return _digest(self._get(self.config["fingerprint_url"], email=email).text)
+
+    def fetch(self, email: str) -> Dict[str, Iterable[dict]]:
+        body = self._get(self.config["url"], email=email).json()
+        if isinstance(body, list):
+            return {"records": body}
+        if isinstance(body, dict) and all(isinstance(v, list) for v in body.values()):
+            return body
+        raise ConnectorError("custom source must return a list or {collection: [records]}")
+
+CONNECTORS = {
+    "shopify": ShopifyConnector,
+    "woocommerce": WooCommerceConnector,
+    "custom": CustomConnector,
+}
+
+def connector_for(source_type: str, config: dict) -> Connector:
+    if source_type not in CONNECTORS:
+        raise ConnectorError(f"no connector for source type {source_type!r}")
+    return CONNECTORS[source_type](config)
@@ -0,0 +1,255 @@
+"""
+Status-change events for live dashboards (SSE), fanned out over Redis pub/sub.
+
+Producers: an after_flush listener records every status transition of a
+DSARRequest or DataBreachReport (update_request, the export tasks, the
+breach workflow routes, the SLA sweeps...) in `session.info`. The events are
+published only once the transaction commits, and dropped on rollback.
+Export pipelines are not rows: `ExportProgress` publishes an
+"export.status" event whenever an export's state changes (queued,
+fetching, packaging, done, failed, cancelling, cancelled). Sync sessions (Celery, write queue) publish from the after_commit hook;
+`tenant_session` defers them and publishes with the async client when the
+scope closes, so route handlers never block the event loop on Redis.
+
+Consumers: each API process keeps one `EventHub`, i.e. one Redis
+subscription multiplexed over all of its SSE clients. Any API worker can
+serve any tenant, and N browsers cost N in-process queues, not N Redis
+connections. Subscriber bookkeeping and the reader task's start/stop share
+one lock, so a client that subscribes while the last one leaves always
+ends up with a running reader.
+
+EventSource cannot send an Authorization header, so browsers first trade
+their bearer token for a ticket (`issue_ticket`): a random, single-use id
+valid for TICKET_TTL seconds that only opens a stream. The JWT itself never
+appears in a URL or an access log.
+"""
+import asyncio
+import json
+import logging
+import secrets
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Set
+import redis
+import redis.asyncio as aioredis
+from sqlalchemy import event, inspect
+from sqlmodel import Session
+from ..config import settings
+from ..models import DataBreachReport, DSARRequest
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "events:"
+QUEUE_SIZE = 100
+RECONNECT_SECONDS = 2.0
+TICKET_PREFIX = "sseticket:"
+TICKET_TTL = 30
+
+def channel(tenant) -> str:
+    return f"{CHANNEL_PREFIX}{tenant}"
+
+def _describe(obj, previous: Optional[str]) -> dict:
+    if isinstance(obj, DSARRequest):
+        data = {"type": "request.status", "id": obj.id, "request_id": obj.request_id}
+    else:
+        data = {"type": "breach.status", "id": obj.id}
+    data.update(
+        event_id=uuid.uuid4().hex,
+        status=obj.status,
+        previous=previous,
+        at=datetime.utcnow().isoformat(),
+    )
+    return data
+
+def export_status(export_id: str, request_id: Optional[str], status: str, previous: Optional[str] = None,
+                  error: Optional[str] = None) -> dict:
+    """Event for an export pipeline's state change."""
+    return {
+        "type": "export.status",
+        "export_id": export_id,
+        "request_id": request_id,
+        "event_id": uuid.uuid4().hex,
+        "status": status,
+        "previous": previous,
+        "error": error,
+        "at": datetime.utcnow().isoformat(),
+    }
+
+# --- producers -------------------------------------------------------------
+
+_sync_client = None
+_async_client = None
+
+def _redis():
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(settings.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _sync_client
+
+def _aredis():
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(settings.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _async_client
+
+def publish(tenant, data: dict):
+    """Sync publish; best effort, a Redis outage never fails the write."""
+    try:
+        _redis().publish(channel(tenant), json.dumps(data))
+    except Exception as e:
+        logger.warning("event not published: %s", e)
+
+async def apublish(tenant, data: dict):
+    try:
+        await _aredis().publish(channel(tenant), json.dumps(data))
+    except Exception as e:
+        logger.warning("event not published: %s", e)
+
+def queue_event(session, tenant, data: dict):
+    """Publish `data` once the session's transaction commits (for Core writes the listener can't see)."""
+    data.setdefault("event_id", uuid.uuid4().hex)
+    data.setdefault("at", datetime.utcnow().isoformat())
+    session.info.setdefault("events", []).append((tenant, data))
+
+@event.listens_for(Session, "after_flush")
+def _collect_status_changes(session, flush_context):
+    pending = session.info.setdefault("events", [])
+    for obj in session.new:
+        if isinstance(obj, (DSARRequest, DataBreachReport)) and obj.user_id is not None:
+            pending.append((obj.user_id, _describe(obj, None)))
+    for obj in session.dirty:
+        if not isinstance(obj, (DSARRequest, DataBreachReport)) or obj.user_id is None:
+            continue
+        history = inspect(obj).attrs.status.history
+        if not history.added:
+            continue
+        # deleted is empty when the old value was never loaded (expired instance)
+        previous = history.deleted[0] if history.deleted else None
+        if previous != history.added[0]:
+            pending.append((obj.user_id, _describe(obj, previous)))
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    committed = session.info.pop("events", [])
+    if not committed:
+        return
+    if session.info.get("defer_events"):
+        session.info.setdefault("committed_events", []).extend(committed)
+        return
+    for tenant, data in committed:
+        publish(tenant, data)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session):
+    session.info.pop("events", None)
+
+async def publish_deferred(session):
+    """Publish what an async session committed (called when its scope closes)."""
+    for tenant, data in session.info.pop("committed_events", []):
+        await apublish(tenant, data)
+
+# --- consumers -------------------------------------------------------------
+
+class EventHub:
+    """One Redis subscription per process, dispatched to per-client queues."""
+
+    def __init__(self):
+        self._queues: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, tenant) -> asyncio.Queue:
+        name = channel(tenant)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        async with self._lock:
+            first = not self._queues[name]
+            self._queues[name].add(queue)
+            if first and self._pubsub is not None:
+                try:
+                    await self._pubsub.subscribe(name)
+                except Exception as e:
+                    # The reader is reconnecting; it subscribes every channel again
+                    logger.warning("event subscription for %s deferred: %s", name, e)
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._run())
+        return queue
+
+    async def unsubscribe(self, tenant, queue: asyncio.Queue):
+        name = channel(tenant)
+        async with self._lock:
+            self._queues[name].discard(queue)
+            if self._queues[name]:
+                return
+            del self._queues[name]
+            if self._queues:
+                if self._pubsub is not None:
+                    try:
+                        await self._pubsub.unsubscribe(name)
+                    except Exception:
+                        pass
+                return
+            # Last client gone: stop the reader (it closes the subscription)
+            reader, self._reader = self._reader, None
+            if reader is not None:
+                reader.cancel()
+                try:
+                    await reader
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+    def _dispatch(self, name: str, data: str):
+        for queue in list(self._queues.get(name, ())):
+            if queue.full():
+                # Slow client: drop its oldest event rather than stall the others
+                queue.get_nowait()
+            queue.put_nowait(data)
+
+    async def _run(self):
+        """Runs until `unsubscribe` cancels it; reconnects after errors."""
+        while True:
+            try:
+                pubsub = aioredis.from_url(settings.redis_url).pubsub(ignore_subscribe_messages=True)
+                async with self._lock:
+                    # Channels added from here on are subscribed by `subscribe`
+                    self._pubsub = pubsub
+                    await pubsub.subscribe(*self._queues.keys())
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        name, data = message["channel"], message["data"]
+                        self._dispatch(
+                            name.decode() if isinstance(name, bytes) else name,
+                            data.decode() if isinstance(data, bytes) else data,
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("event subscription lost, reconnecting: %s", e)
+                await asyncio.sleep(RECONNECT_SECONDS)
+            finally:
+                pubsub, self._pubsub = self._pubsub, None
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+hub = EventHub()
+
+# --- stream tickets ----------------------------------------------------------
+
+async def issue_ticket(user_id: str) -> str:
+    """A single-use ticket that opens one event stream for `user_id` within TICKET_TTL seconds."""
+    ticket = secrets.token_urlsafe(24)
+    await _aredis().set(f"{TICKET_PREFIX}{ticket}", str(user_id), ex=TICKET_TTL)
+    return ticket
+
+async def redeem_ticket(ticket: str) -> Optional[str]:
+    """The ticket's user id, consuming the ticket; None if unknown, expired or already used."""
+    async with _aredis().pipeline(transaction=True) as pipe:
+        pipe.get(f"{TICKET_PREFIX}{ticket}")
+        pipe.delete(f"{TICKET_PREFIX}{ticket}")
+        user_id, _ = await pipe.execute()
+    return user_id.decode() if user_id else None
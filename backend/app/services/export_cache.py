@@ -0,0 +1,171 @@
+"""
+Result cache and in-flight lock for exports.
+
+A repeated export (an operator's double click, a redelivered webhook) must
+not build the same bundle twice. Two fingerprints key the cache:
+
+- the request fingerprint: what is asked for. That is the request, its
+  subject and type, the formats, and the active data sources (id and
+  updated_at). The row version is left out on purpose, because completing
+  the export bumps it. This fingerprint keys the in-flight lock and the
+  latest result;
+- the findings fingerprint: what discovery found. That is the request
+  fingerprint plus, per source, the connector fingerprint, or the staged
+  records' CAS key (a content hash) for sources without one. A source that
+  was skipped as unchanged and one that was fetched give the same value. It
+  keys results once the fetch tasks have run.
+
+API side, `claim` returns one of three things: a cached result (at most
+EXPORT_CACHE_TTL_S old; the caller checks that the bundle still exists,
+since CAS GC may have collected it, and mints a fresh download token, or
+drops the entry with `forget` and claims again), the id of
+the export already running for the same request fingerprint, or the lock
+(SET NX) for a new export. Worker side, `package` looks up the findings
+fingerprint before rendering anything. On a hit whose bundle still exists,
+that bundle's key and checksum are reused. A finished export stores its
+result under both fingerprints and releases the lock. Exports with failed
+sources are never cached.
+
+Best effort, like the progress hash: without Redis every export runs.
+"""
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Iterable, List, NamedTuple, Optional, Sequence
+import redis
+from ..config import settings
+from .export_progress import ACTIVE_STATES, KEY_PREFIX as PROGRESS_PREFIX
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = "exportlock:"
+RESULT_PREFIX = "exportresult:"
+LOCK_TTL = 3600  # broker visibility timeout: an export's tasks are redelivered within it
+FINDINGS_TTL = 24 * 3600
+
+class Claim(NamedTuple):
+    export_id: Optional[str]  # the export to follow: ours if we took the lock
+    result: Optional[dict] = None  # cached {"key", "sha256", "export_id", ...}
+
+_client = None
+
+def _redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _client
+
+def _digest(parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def request_fingerprint(request_id: str, request_type: Optional[str], subject_email: Optional[str],
+                        formats: Optional[Sequence[str]], sources: Iterable[Sequence[Any]]) -> str:
+    """`sources`: (id, updated_at) of the account's active data sources."""
+    return _digest([
+        request_id, request_type, (subject_email or "").strip().lower(), sorted(formats or ()),
+        sorted([source_id, updated_at] for source_id, updated_at in sources),
+    ])
+
+def findings_fingerprint(request_fp: str, items: List[dict]) -> Optional[str]:
+    """None when a finding carries records that are not content-addressed (nothing safe to key on)."""
+    parts = []
+    for item in items:
+        marker = item.get("fingerprint") or item.get("records_key")
+        if marker is None and "records" in item:
+            return None
+        parts.append([item.get("source"), marker])
+    return _digest([request_fp, sorted(parts, key=json.dumps)])
+
+def _lock_key(fingerprint: str) -> str:
+    return f"{LOCK_PREFIX}{fingerprint}"
+
+def _result_key(fingerprint: str) -> str:
+    return f"{RESULT_PREFIX}{fingerprint}"
+
+def _running(client, export_id: str) -> bool:
+    state = client.hget(f"{PROGRESS_PREFIX}{export_id}", "state")
+    # No progress hash yet: the holder is between taking the lock and queueing
+    return state is None or state.decode() in ACTIVE_STATES
+
+def claim(fingerprint: str, export_id: str, use_cache: bool = True) -> Claim:
+    """Cached result, or the running export to join, or the lock for `export_id`."""
+    try:
+        client = _redis()
+        if use_cache:
+            cached = client.get(_result_key(fingerprint))
+            if cached:
+                return Claim(None, json.loads(cached))
+        key = _lock_key(fingerprint)
+        for _ in range(3):
+            if client.set(key, export_id, nx=True, ex=LOCK_TTL):
+                return Claim(export_id)
+            holder = client.get(key)
+            if holder is None:
+                continue
+            if _running(client, holder.decode()):
+                return Claim(holder.decode())
+            # The holder ended without releasing (its worker died): take the lock over
+            with client.pipeline() as pipe:
+                try:
+                    pipe.watch(key)
+                    if pipe.get(key) == holder:
+                        pipe.multi()
+                        pipe.set(key, export_id, ex=LOCK_TTL)
+                        pipe.execute()
+                        return Claim(export_id)
+                except redis.WatchError:
+                    pass
+        holder = client.get(key)
+        return Claim(holder.decode() if holder else export_id)
+    except redis.RedisError as e:
+        logger.warning("export cache unavailable: %s", e)
+        return Claim(export_id)
+
+def release(fingerprint: Optional[str], export_id: Optional[str]):
+    """Drop the in-flight lock if `export_id` still holds it."""
+    if not fingerprint or not export_id:
+        return
+    key = _lock_key(fingerprint)
+    try:
+        with _redis().pipeline() as pipe:
+            pipe.watch(key)
+            if pipe.get(key) == export_id.encode():
+                pipe.multi()
+                pipe.delete(key)
+                pipe.execute()
+    except (redis.WatchError, redis.RedisError) as e:
+        logger.warning("export lock %s not released: %s", fingerprint, e)
+
+def forget(fingerprint: Optional[str]):
+    """Drop a cached result whose bundle is gone."""
+    if not fingerprint:
+        return
+    try:
+        _redis().delete(_result_key(fingerprint))
+    except redis.RedisError as e:
+        logger.warning("export result %s not dropped: %s", fingerprint, e)
+
+def lookup(findings_fp: Optional[str]) -> Optional[dict]:
+    if not findings_fp:
+        return None
+    try:
+        cached = _redis().get(_result_key(findings_fp))
+    except redis.RedisError as e:
+        logger.warning("export cache unavailable: %s", e)
+        return None
+    return json.loads(cached) if cached else None
+
+def store(request_fp: Optional[str], findings_fp: Optional[str], key: str, sha256: str, export_id: Optional[str]):
+    """Remember a finished bundle under both fingerprints."""
+    if not request_fp:
+        return
+    value = json.dumps({"key": key, "sha256": sha256, "export_id": export_id, "created_at": time.time()})
+    try:
+        pipe = _redis().pipeline()
+        pipe.set(_result_key(request_fp), value, ex=settings.export_cache_ttl_s)
+        if findings_fp:
+            pipe.set(_result_key(findings_fp), value, ex=FINDINGS_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("export result not cached: %s", e)
@@ -1,13 +1,106 @@
+"""
+Single-use download tokens for export bundles.
+
+Redemption is one conditional UPDATE ... RETURNING: the row is marked used
+only if it is unused, not revoked and not expired, and the object key comes
+back in the same round trip. Of two concurrent clicks exactly one gets the
+key.
+
+Redis sits in front as a fast path for hot links. `SET NX` lets one request
+through to the database while the others are answered at once, and terminal
+states (used, revoked, expired, unknown) are cached, so repeat clicks never
+reach the database. The database stays the source of truth: without Redis,
+redemption is still correct, only slower.
+"""
 import uuid
+import logging
 import datetime as dt
-from sqlmodel import select
-from ..database import get_session
+from typing import Optional
+import redis
+from sqlalchemy import update
+from sqlmodel import Session, select
+from ..config import settings
+from ..database import session_scope, write_queue
 from ..models import DownloadToken
 
+logger = logging.getLogger(__name__)
+
 TTL_HOURS = 24
+KEY_PREFIX = "dltoken:"
+REDEEM_LOCK_SECONDS = 30  # a redeemer that died frees the token after this
+UNKNOWN_TTL = 60
+
+class TokenUnavailable(Exception):
+    """`reason`: not_found, revoked, used, expired, or busy (another click is redeeming it)."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+_client = None
+
+def _redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _client
+
+def _key(token: str) -> str:
+    return f"{KEY_PREFIX}{token}"
+
+def _remember(token: str, state: str):
+    try:
+        _redis().set(_key(token), state, ex=UNKNOWN_TTL if state == "not_found" else TTL_HOURS * 3600)
+    except redis.RedisError as e:
+        logger.warning("download token state not cached: %s", e)
+
+def _forget(token: str):
+    try:
+        _redis().delete(_key(token))
+    except redis.RedisError:
+        pass
+
+def _claim(token: str) -> bool:
+    """False when Redis is unavailable (the database decides alone); raises if the token is known to be unusable."""
+    try:
+        client = _redis()
+        if client.set(_key(token), "busy", nx=True, ex=REDEEM_LOCK_SECONDS):
+            return True
+        state = client.get(_key(token))
+    except redis.RedisError as e:
+        logger.warning("download token fast path unavailable: %s", e)
+        return False
+    if state:
+        raise TokenUnavailable(state.decode())
+    return False  # expired between SET and GET
+
+def _redeem(session: Session, token: str, now: dt.datetime) -> Optional[str]:
+    return session.execute(
+        update(DownloadToken)
+        .where(
+            DownloadToken.token == token,
+            DownloadToken.used_at.is_(None),
+            DownloadToken.revoked == False,  # noqa: E712
+            DownloadToken.expires_at > now,
+        )
+        .values(used_at=now)
+        .returning(DownloadToken.object_key)
+    ).scalar_one_or_none()
+
+def _why(token: str) -> str:
+    """Why a token could not be redeemed (cold path, one read)."""
+    with session_scope() as sess:
+        row = sess.exec(select(DownloadToken).where(DownloadToken.token == token)).first()
+    if not row:
+        return "not_found"
+    if row.revoked:
+        return "revoked"
+    if row.used_at:
+        return "used"
+    return "expired"
 
 def create_download_token(request_id: int, object_key: str) -> str:
-    with get_session() as sess:
+    with session_scope() as sess:
         tok = DownloadToken(
             request_id=request_id,
             token=str(uuid.uuid4()),
@@ -19,20 +112,30 @@ def create_download_token(request_id: int, object_key: str) -> str:
         sess.refresh(tok)
         return str(tok.token)
 
-def mark_used(token: str):
-    with get_session() as sess:
-        row = sess.exec(select(DownloadToken).where(DownloadToken.token == token)).first()
-        if row:
-            row.used_at = dt.datetime.utcnow()
-            sess.add(row)
-            sess.commit()
+def redeem(token: str) -> str:
+    """Mark `token` used and return its object key; raises TokenUnavailable."""
+    claimed = _claim(token)
+    try:
+        object_key = write_queue.run(_redeem, token, dt.datetime.utcnow())
+    except Exception:
+        if claimed:
+            _forget(token)
+        raise
+    if object_key is None:
+        reason = _why(token)
+        _remember(token, reason)
+        raise TokenUnavailable(reason)
+    _remember(token, "used")
+    return object_key
 
-def revoke_token(token: str):
-    with get_session() as sess:
-        row = sess.exec(select(DownloadToken).where(DownloadToken.token == token)).first()
-        if row:
-            row.revoked = True
-            sess.add(row)
-            sess.commit()
+def _revoke(session: Session, token: str) -> bool:
+    result = session.execute(update(DownloadToken).where(DownloadToken.token == token).values(revoked=True))
+    return result.rowcount > 0
+
+def revoke_token(token: str) -> bool:
+    revoked = write_queue.run(_revoke, token)
+    if revoked:
+        _remember(token, "revoked")
+    return revoked
 
 
@@ -0,0 +1,244 @@
+"""
+Progress, ETA and cancellation of export pipelines.
+
+Each export has one Redis hash, `export:<export id>`. The export id is the
+task id that the export API returned. Pipeline tasks add to the hash's
+counters with HINCRBY, so parallel fetch tasks on any worker add up. The API
+reads the hash and derives the percent done and the ETA:
+
+- fetching is the first half, measured as sources_done / sources_total;
+- packaging is the second half, measured as entries_done / entries_total,
+  where the ZIP counts as the last entry;
+- ETA = elapsed * (100 - percent) / percent.
+
+To cancel, the API sets `cancel` on the hash and revokes the pipeline's
+tasks that have not started. Running tasks check the flag at most once a
+second. A fetch stops, a running multipart upload aborts (an ExportProgress
+is its cancel_event), and spool files are closed on the way out. The
+`cleanup_cancelled_export` task then aborts any upload left open by a task
+that died, and deletes the records that the fetch tasks had staged.
+
+Every state change is also published on the tenant's event channel (see
+`events.export_status`), so live dashboards see an export start, finish,
+fail or get cancelled without polling.
+
+Best effort, like the upload checkpoints: without Redis an export runs
+without progress reporting and cannot be cancelled.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+import redis
+import redis.asyncio as aioredis
+from ..config import settings
+from . import events
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "export:"
+PROGRESS_TTL = 7 * 24 * 3600
+ACTIVE_STATES = ("queued", "fetching", "packaging", "cancelling")
+COUNTERS = ("sources_total", "sources_done", "records_fetched", "entries_total", "entries_done",
+            "bytes_written", "bytes_uploaded")
+
+class ExportCancelled(Exception):
+    pass
+
+_sync_client = None
+_async_client = None
+
+def _redis():
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(settings.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _sync_client
+
+def _aredis():
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(settings.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+    return _async_client
+
+def _key(export_id: str, kind: str = "") -> str:
+    return f"{KEY_PREFIX}{export_id}{':' + kind if kind else ''}"
+
+class ExportProgress:
+    """
+    One task's view of an export's progress. Counters are batched and
+    flushed at most every FLUSH_SECONDS; without an export id every call is
+    a no-op.
+    """
+    FLUSH_SECONDS = 0.5
+    CANCEL_CHECK_SECONDS = 1.0
+
+    def __init__(self, export_id: Optional[str] = None, client=None):
+        self.export_id = export_id
+        self._client = client
+        self._pending = Counter()
+        self._flushed_at = time.monotonic()
+        self._checked_at = 0.0
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    def _call(self, fn):
+        if not self.export_id:
+            return None
+        try:
+            return fn(self._client or _redis())
+        except redis.RedisError as e:
+            logger.warning("export progress unavailable: %s", e)
+            return None
+
+    def set(self, **fields):
+        fields["updated_at"] = time.time()
+        key = _key(self.export_id)
+        state = fields.get("state")
+
+        def write(client):
+            pipe = client.pipeline()
+            if state is not None:
+                pipe.hmget(key, "state", "account_id", "request_id")
+            pipe.hset(key, mapping={k: "" if v is None else v for k, v in fields.items()})
+            pipe.expire(key, PROGRESS_TTL)
+            results = pipe.execute()
+            return results[0] if state is not None else None
+        stored = self._call(write)
+        if stored is not None:
+            previous, account_id, request_id = (v.decode() if v else None for v in stored)
+            self._announce(fields.get("account_id") or account_id, fields.get("request_id") or request_id,
+                           state, previous, fields.get("error"))
+
+    def _announce(self, tenant, request_id, state, previous, error=None):
+        if tenant and state != previous:
+            events.publish(tenant, events.export_status(self.export_id, request_id, state, previous, error))
+
+    def start(self, **fields):
+        self.set(started_at=time.time(), **fields)
+
+    def add(self, **counts: int):
+        with self._lock:
+            self._pending.update(counts)
+            due = time.monotonic() - self._flushed_at >= self.FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+        key = _key(self.export_id)
+
+        def write(client):
+            pipe = client.pipeline()
+            for field, n in pending.items():
+                pipe.hincrby(key, field, n)
+            pipe.hset(key, "updated_at", time.time())
+            pipe.execute()
+        self._call(write)
+
+    def remember(self, kind: str, *members: str):
+        """Track task ids, staged keys or in-flight uploads for cancellation."""
+        if members:
+            self._call(lambda c: c.pipeline().sadd(_key(self.export_id, kind), *members)
+                       .expire(_key(self.export_id, kind), PROGRESS_TTL).execute())
+
+    def forget(self, kind: str, *members: str):
+        if members:
+            self._call(lambda c: c.srem(_key(self.export_id, kind), *members))
+
+    def get(self, field: str) -> Optional[str]:
+        value = self._call(lambda c: c.hget(_key(self.export_id), field))
+        return value.decode() if value else None
+
+    def state(self) -> Optional[str]:
+        return self.get("state")
+
+    def members(self, kind: str) -> List[str]:
+        return [m.decode() for m in self._call(lambda c: c.smembers(_key(self.export_id, kind))) or ()]
+
+    def is_set(self) -> bool:
+        """Cancel requested? (named like threading.Event, so it can be an upload's cancel_event)"""
+        if self._cancelled or not self.export_id:
+            return self._cancelled
+        now = time.monotonic()
+        if now - self._checked_at >= self.CANCEL_CHECK_SECONDS:
+            self._checked_at = now
+            self._cancelled = bool(self._call(lambda c: c.hget(_key(self.export_id), "cancel")))
+        return self._cancelled
+
+    cancelled = is_set
+
+    def check(self):
+        if self.is_set():
+            raise ExportCancelled(self.export_id)
+
+# --- API side ---------------------------------------------------------------
+
+def summarize(raw: Dict[str, str], now: Optional[float] = None) -> dict:
+    """Counters plus percent done and ETA (seconds) from a progress hash."""
+    counters = {field: int(raw.get(field) or 0) for field in COUNTERS}
+    state = raw.get("state") or "queued"
+    if state == "done":
+        percent = 100.0
+    elif state in ("fetching", "packaging", "cancelling", "cancelled", "failed"):
+        if counters["entries_total"]:
+            percent = 50 + 50 * counters["entries_done"] / counters["entries_total"]
+        elif counters["sources_total"]:
+            percent = 50 * counters["sources_done"] / counters["sources_total"]
+        else:
+            percent = 0.0
+    else:
+        percent = 0.0
+    percent = round(min(percent, 99.9 if state != "done" else 100.0), 1)
+
+    started = float(raw.get("started_at") or 0) or None
+    elapsed = (now or time.time()) - started if started else None
+    eta = None
+    if state == "done":
+        eta = 0
+    elif state in ACTIVE_STATES and elapsed and percent > 0:
+        eta = round(elapsed * (100 - percent) / percent)
+    return {
+        "state": state,
+        "percent": percent,
+        "eta_seconds": eta,
+        "elapsed_seconds": round(elapsed) if elapsed is not None else None,
+        **counters,
+        "bundle_key": raw.get("bundle_key") or None,
+        "error": raw.get("error") or None,
+    }
+
+async def read_progress(export_id: str) -> Optional[Dict[str, str]]:
+    raw = await _aredis().hgetall(_key(export_id))
+    return {k.decode(): v.decode() for k, v in raw.items()} if raw else None
+
+async def start_export(export_id: str, request_id: str, account_id: str, fingerprint: Optional[str] = None):
+    """
+    Create the progress hash before the pipeline is queued, so it can be read
+    (and cancelled) at once. `fingerprint` is the export cache's request
+    fingerprint; the pipeline caches its result and releases its lock under it.
+    """
+    key = _key(export_id)
+    now = time.time()
+    await _aredis().hset(key, mapping={
+        "request_id": request_id, "account_id": account_id, "state": "queued",
+        "started_at": now, "updated_at": now, "fingerprint": fingerprint or "",
+    })
+    await _aredis().expire(key, PROGRESS_TTL)
+    await _aredis().sadd(_key(export_id, "tasks"), export_id)
+    await events.apublish(account_id, events.export_status(export_id, request_id, "queued"))
+
+async def request_cancel(export_id: str) -> List[str]:
+    """Flag the export as cancelled; returns the pipeline's task ids to revoke."""
+    async with _aredis().pipeline(transaction=True) as pipe:
+        pipe.hmget(_key(export_id), "state", "account_id", "request_id")
+        pipe.hset(_key(export_id), mapping={"cancel": 1, "state": "cancelling", "updated_at": time.time()})
+        stored, _ = await pipe.execute()
+    previous, account_id, request_id = (v.decode() if v else None for v in stored)
+    if account_id and previous != "cancelling":
+        await events.apublish(account_id, events.export_status(export_id, request_id, "cancelling", previous))
+    return [m.decode() for m in await _aredis().smembers(_key(export_id, "tasks"))]
@@ -1,13 +1,13 @@
-import zipfile
+import asyncio
 import json
-import csv
-import io
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
-import hashlib
+from typing import List, Dict, Any, Sequence
 from app.models.request import Request
 from app.models.export_bundle import ExportBundle, ExportFormat
 from app.core.config import settings
+from app.services.bundle_writer import (
+    check_formats, csv_chunks, json_chunks, record_entries, s3_uploader, stream_bundle,
+)
 import boto3
 import logging
 
@@ -24,46 +24,42 @@ class ExportService:
             aws_secret_access_key=settings.R2_SECRET_ACCESS_KEY
         )
     
-    async def create_export_bundle(self, request: Request, data: Dict[str, Any]) -> ExportBundle:
-        """DSAR talebi için export bundle oluştur"""
+    async def create_export_bundle(
+        self, request: Request, data: Dict[str, Any], formats: Sequence[str] = ("json", "csv")
+    ) -> ExportBundle:
+        """DSAR talebi için export bundle oluştur (formats: json, csv, ndjson, parquet)"""
+        formats = check_formats(formats)
         
-        # ZIP dosyası oluştur
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            # JSON export
-            json_data = self._format_json_export(request, data)
-            zip_file.writestr('data.json', json.dumps(json_data, indent=2, default=str))
-            
-            # CSV export
-            csv_data = self._format_csv_export(request, data)
-            zip_file.writestr('data.csv', csv_data)
-            
-            # PDF rapor
-            pdf_content = self._generate_pdf_report(request, data)
-            zip_file.writestr('report.pdf', pdf_content)
-            
-            # Metadata
-            metadata = {
-                'request_id': request.id,
-                'created_at': datetime.utcnow().isoformat(),
-                'subject_email': request.subject_email,
-                'request_type': request.request_type.value,
-                'data_sources': list(data.keys()),
-                'total_records': sum(len(v) if isinstance(v, list) else 1 for v in data.values())
-            }
-            zip_file.writestr('metadata.json', json.dumps(metadata, indent=2))
-        
-        # S3'e yükle
-        zip_buffer.seek(0)
+        metadata = {
+            'request_id': request.id,
+            'created_at': datetime.utcnow().isoformat(),
+            'subject_email': request.subject_email,
+            'request_type': request.request_type.value,
+            'data_sources': list(data.keys()),
+            'total_records': sum(len(v) if isinstance(v, list) else 1 for v in data.values()),
+            'formats': formats,
+        }
+
+        # ZIP'i bellekte kurmadan üret: entry'ler akarken hash'lenir ve S3'e yüklenir
+        entries = []
+        if 'json' in formats:
+            entries.append(('data.json', json_chunks(self._format_json_export(request, data))))
+        if 'csv' in formats:
+            entries.append(('data.csv', csv_chunks(['Source', 'Field', 'Value'], self._iter_csv_rows(data))))
+        # NDJSON / Parquet: kaynak başına bir dosya, kayıt kayıt yazılır
+        entries.extend(record_entries('data/', {
+            source: self._records(source_data) for source, source_data in data.items()
+        }, formats))
+        entries += [
+            ('report.pdf', [self._generate_pdf_report(request, data)]),
+            ('metadata.json', json_chunks(metadata)),
+        ]
         file_key = f"exports/request_{request.id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.zip"
-        
-        self.s3_client.upload_fileobj(
-            zip_buffer,
+        uploader = s3_uploader(
+            self.s3_client,
             settings.R2_BUCKET_NAME,
             file_key,
-            ExtraArgs={
-                'ContentType': 'application/zip',
+            extra_args={
                 'Metadata': {
                     'request_id': str(request.id),
                     'subject_email': request.subject_email,
@@ -71,17 +67,17 @@ class ExportService:
                 }
             }
         )
-        
-        # Checksum hesapla
-        zip_buffer.seek(0)
-        checksum = hashlib.sha256(zip_buffer.read()).hexdigest()
+        bundle = await asyncio.to_thread(stream_bundle, entries, uploader)
+        if bundle.upload_error:
+            raise bundle.upload_error
+        checksum = bundle.sha256
         
         # Export bundle kaydet
         export_bundle = ExportBundle(
             request_id=request.id,
             format=ExportFormat.ZIP,
             file_path=file_key,
-            file_size=zip_buffer.tell(),
+            file_size=bundle.size,
             checksum=checksum,
             meta_data=json.dumps(metadata),
             expires_at=datetime.utcnow() + timedelta(days=30)
@@ -109,30 +105,25 @@ class ExportService:
             }
         }
     
-    def _format_csv_export(self, request: Request, data: Dict[str, Any]) -> str:
-        """CSV formatında export hazırla"""
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Header
-        writer.writerow(['Source', 'Field', 'Value'])
-        
-        # Data
+    def _iter_csv_rows(self, data: Dict[str, Any]):
+        """CSV satırları (Source, Field, Value) - tek tek üretilir"""
         for source, source_data in data.items():
             if isinstance(source_data, list):
                 for item in source_data:
                     if isinstance(item, dict):
                         for field, value in item.items():
-                            writer.writerow([source, field, str(value)])
+                            yield [source, field, str(value)]
                     else:
-                        writer.writerow([source, 'data', str(item)])
+                        yield [source, 'data', str(item)]
             elif isinstance(source_data, dict):
                 for field, value in source_data.items():
-                    writer.writerow([source, field, str(value)])
+                    yield [source, field, str(value)]
             else:
-                writer.writerow([source, 'data', str(source_data)])
-        
-        return output.getvalue()
+                yield [source, 'data', str(source_data)]
+    
+    def _records(self, source_data: Any) -> List[Any]:
+        """Kaynak verisini kayıt listesine çevir (liste olduğu gibi, tek kayıt listeye sarılır)"""
+        return source_data if isinstance(source_data, list) else [source_data]
     
     def _generate_pdf_report(self, request: Request, data: Dict[str, Any]) -> str:
         """PDF rapor oluştur"""
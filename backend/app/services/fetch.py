@@ -0,0 +1,224 @@
+"""
+Per-source fetch step of the export pipeline.
+
+`discover` fans out one fetch task per active DataSource (a chord), and
+`package_sources` bundles whatever came back. This module holds the parts
+those tasks share:
+
+- `SourceSlots`: a per-DataSource cap on concurrent fetches, across all
+  workers, so parallel exports for one shop stay inside its API rate limit;
+- `fetch_source`: fingerprint, skip when unchanged, else fetch and stage
+  each collection's records in the CAS as NDJSON. Chord results then carry
+  keys, not records;
+- `StagedRecords`: the staged records, re-iterable, for `package`.
+
+A fetch that fails for good yields `{"source", "error"}` instead of raising,
+so one broken source never fails the others' export.
+"""
+import json
+import logging
+import re
+import time
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+import redis
+from sqlmodel import select
+from ..config import settings
+from ..database import session_scope
+from ..json_columns import json_text
+from ..models import DataSource, DSARRequest
+from .bundle_writer import ndjson_chunks
+from .cas import CasStore, Spooled
+from .connectors import connector_for
+from .export_progress import ExportProgress
+from .snapshots import unchanged_sources
+
+logger = logging.getLogger(__name__)
+
+# --- sources ----------------------------------------------------------------
+
+def source_name(source: DataSource) -> str:
+    """Stable file-name prefix of a source's entries (`data/sources/<name>.<collection>.<fmt>`)."""
+    return re.sub(r"[^A-Za-z0-9_-]+", "-", source.name).strip("-").lower() or f"source-{source.id}"
+
+def active_sources(request_id: str, shop_domain: Optional[str] = None) -> Tuple[Optional[str], List[int]]:
+    """(account id, active DataSource ids) for a request, or via the shop for webhook requests."""
+    with session_scope() as session:
+        user_id = session.exec(select(DSARRequest.user_id).where(DSARRequest.request_id == request_id)).first()
+        if user_id is None and shop_domain:
+            user_id = session.exec(
+                select(DataSource.user_id).where(
+                    DataSource.type == "shopify",
+                    json_text(DataSource.config, "shop_domain") == shop_domain,
+                )
+            ).first()
+        if user_id is None:
+            return None, []
+        ids = session.exec(
+            select(DataSource.id).where(DataSource.user_id == user_id, DataSource.is_active == True)  # noqa: E712
+            .order_by(DataSource.id)
+        ).all()
+    return str(user_id), list(ids)
+
+def source_stamps(source_ids: Sequence[int]) -> List[Tuple[int, Any]]:
+    """(id, updated_at) per source, for the export cache's request fingerprint."""
+    if not source_ids:
+        return []
+    with session_scope() as session:
+        rows = session.exec(select(DataSource.id, DataSource.updated_at).where(DataSource.id.in_(source_ids))).all()
+    return [(source_id, updated_at) for source_id, updated_at in rows]
+
+def load_source(source_id: int) -> Optional[DataSource]:
+    with session_scope() as session:
+        return session.get(DataSource, source_id)
+
+def concurrency_limit(source: DataSource) -> int:
+    limits = dict(pair.split("=", 1) for pair in settings.fetch_concurrency.split(",") if "=" in pair)
+    return max(int((source.config or {}).get("max_concurrency") or limits.get(source.type) or 1), 1)
+
+# --- concurrency cap ------------------------------------------------------------
+
+class SourceSlots:
+    """
+    Counting semaphore per DataSource in Redis: a sorted set of holders
+    scored by acquire time. Holders older than `ttl` (a worker that died
+    mid-fetch) are dropped. Best effort: without Redis, fetches run uncapped.
+    """
+
+    def __init__(self, url: Optional[str] = None, ttl: int = 30 * 60):
+        self._url = url or settings.redis_url
+        self._client = None
+        self.ttl = ttl
+
+    def _redis(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(self._url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    @staticmethod
+    def _key(source_id: int) -> str:
+        return f"fetchslots:{source_id}"
+
+    def acquire(self, source_id: int, limit: int, holder: str) -> bool:
+        key, now = self._key(source_id), time.time()
+
+        def claim(pipe):
+            held = pipe.zscore(key, holder) is not None
+            if not held and pipe.zcard(key) >= limit:
+                return False
+            pipe.multi()
+            pipe.zadd(key, {holder: now})
+            pipe.expire(key, self.ttl)
+            return True
+
+        try:
+            client = self._redis()
+            client.zremrangebyscore(key, "-inf", now - self.ttl)
+            return client.transaction(claim, key, value_from_callable=True)
+        except redis.RedisError as e:
+            logger.warning("fetch slots unavailable, fetching uncapped: %s", e)
+            return True
+
+    def release(self, source_id: int, holder: str):
+        try:
+            self._redis().zrem(self._key(source_id), holder)
+        except redis.RedisError:
+            pass
+
+# --- staging ----------------------------------------------------------------
+
+class _Counted:
+    """Counts records as they are pulled, reporting them (and checking for cancellation) in batches."""
+    BATCH = 500
+
+    def __init__(self, records: Iterable[Any], progress: ExportProgress):
+        self.records = records
+        self.progress = progress
+        self.count = 0
+
+    def __iter__(self):
+        for record in self.records:
+            self.count += 1
+            if self.count % self.BATCH == 0:
+                self.progress.add(records_fetched=self.BATCH)
+                self.progress.check()
+            yield record
+        self.progress.add(records_fetched=self.count % self.BATCH)
+
+def stage_records(cas: CasStore, records: Iterable[Any], progress: Optional[ExportProgress] = None) -> Tuple[str, int]:
+    """Store records as NDJSON in the CAS; returns (key, record count)."""
+    counted = _Counted(records, progress or ExportProgress())
+    spooled = Spooled(ndjson_chunks(counted))
+    try:
+        return cas.put(spooled), counted.count
+    finally:
+        spooled.close()
+
+class StagedRecords:
+    """Records staged by a fetch task, read back from the CAS on each iteration."""
+
+    def __init__(self, cas: CasStore, key: str, count: int):
+        self.cas = cas
+        self.key = key
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Any]:
+        tail = b""
+        for chunk in self.cas.read(self.key):
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                yield json.loads(line)
+        if tail.strip():
+            yield json.loads(tail)
+
+def failed(source: Any, error: Any) -> List[dict]:
+    name = source_name(source) if isinstance(source, DataSource) else str(source)
+    message = str(error).splitlines()[0] if str(error) else type(error).__name__
+    return [{"source": name, "error": message}]
+
+def fetch_source(cas: CasStore, source: DataSource, account_id: str, subject_email: str,
+                 formats: Sequence[str], progress: Optional[ExportProgress] = None) -> List[dict]:
+    """
+    One finding per collection of `source`: {"source", "fingerprint",
+    "records_key", "objects"}, or just {"source", "fingerprint"} when every
+    collection is unchanged since its snapshot.
+    """
+    name = source_name(source)
+    with connector_for(source.type, source.config) as connector:
+        fingerprint = connector.fingerprint(subject_email)
+        names = [f"{name}.{collection}" for collection in connector.collections]
+        if fingerprint and names:
+            unchanged = unchanged_sources(account_id, subject_email, dict.fromkeys(names, fingerprint), formats)
+            if len(unchanged) == len(names):
+                return [{"source": n, "fingerprint": fingerprint} for n in names]
+
+        findings = []
+        progress = progress or ExportProgress()
+        for collection, records in connector.fetch(subject_email).items():
+            key, count = stage_records(cas, records, progress)
+            progress.remember("staged", key)
+            findings.append({
+                "source": f"{name}.{collection}", "fingerprint": fingerprint,
+                "records_key": key, "objects": count,
+            })
+        return findings
+
+def merge_findings(cas: CasStore, results: Iterable[List[dict]]) -> Tuple[List[dict], List[dict]]:
+    """Chord results to (findings with staged records attached, failed sources)."""
+    findings, failures = [], []
+    for result in results:
+        for item in result or ():
+            if "error" in item:
+                failures.append(item)
+            elif "records_key" in item:
+                key = item["records_key"]
+                if not cas.has(key):
+                    failures.append({"source": item["source"], "error": "staged records expired"})
+                    continue
+                findings.append(dict(item, records=StagedRecords(cas, key, item.get("objects", 0))))
+            else:
+                findings.append(item)
+    return findings, failures
@@ -0,0 +1,274 @@
+"""
+Resumable, parallel multipart uploads to S3 / R2.
+
+`MultipartUpload.upload(fileobj)` reads the source sequentially, one part
+at a time, and keeps up to `concurrency` parts in flight, so memory stays at
+about part_size x (concurrency + 1) for any object size. Sources smaller than
+one part go out as a single PutObject.
+
+Checkpoints: the UploadId and the completed parts (number, ETag, MD5, size)
+are kept in Redis under `mpu:<bucket>:<key>`. If Redis has nothing, an
+in-progress upload for the same key is discovered with
+ListMultipartUploads. A retried task validates the checkpoint with
+ListParts. A part is skipped when the stored part has the same size and
+MD5 as the part just read, so a deterministic source resumes where it
+stopped; from the first differing part onwards, parts are uploaded again.
+
+The caller can save its own data with the checkpoint (`meta`, a callable
+evaluated at each checkpoint) and read it back before a retry with
+`checkpoint_meta`. Bundle writers keep the compression choices made for
+each member there, so the retry rebuilds the same bytes and the parts match.
+
+Failures leave the upload (and its checkpoint) in place for the retry.
+Cancellation (`cancel_event` set, or UploadCancelled raised) aborts the
+multipart upload. `progress(n)` is called with the size of each part as it
+is stored. Anything else orphaned is removed by
+`abort_stale_uploads`.
+"""
+import base64
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+import redis
+from botocore.exceptions import ClientError
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+CHECKPOINT_TTL = 7 * 24 * 3600
+
+class UploadCancelled(Exception):
+    pass
+
+class CheckpointStore:
+    """Upload state per (bucket, key) in Redis; best effort, never fails the upload."""
+
+    def __init__(self, url: Optional[str] = None):
+        self._url = url or settings.redis_url
+        self._client = None
+
+    def _redis(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(self._url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._client
+
+    @staticmethod
+    def _key(bucket: str, key: str) -> str:
+        return f"mpu:{bucket}:{key}"
+
+    def load(self, bucket: str, key: str) -> Optional[dict]:
+        try:
+            raw = self._redis().get(self._key(bucket, key))
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning("multipart checkpoint unavailable: %s", e)
+            return None
+
+    def save(self, bucket: str, key: str, state: dict):
+        try:
+            self._redis().set(self._key(bucket, key), json.dumps(state), ex=CHECKPOINT_TTL)
+        except Exception as e:
+            logger.warning("multipart checkpoint not saved: %s", e)
+
+    def clear(self, bucket: str, key: str):
+        try:
+            self._redis().delete(self._key(bucket, key))
+        except Exception:
+            pass
+
+def checkpoint_meta(bucket: str, key: str, checkpoints: Optional[CheckpointStore] = None) -> dict:
+    """The `meta` saved with an unfinished upload of bucket/key; {} if none."""
+    state = (checkpoints if checkpoints is not None else CheckpointStore()).load(bucket, key) or {}
+    return state.get("meta") or {}
+
+def _read_part(fileobj, size: int) -> bytes:
+    chunks, remaining = [], size
+    while remaining > 0:
+        chunk = fileobj.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+class MultipartUpload:
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        key: str,
+        part_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        extra_args: Optional[dict] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+        cancel_event: Optional[threading.Event] = None,
+        progress: Optional[Callable[[int], None]] = None,
+        meta: Optional[Callable[[], dict]] = None,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size or settings.upload_part_size_mb * 1024 * 1024, MIN_PART_SIZE)
+        self.concurrency = max(concurrency or settings.upload_concurrency, 1)
+        self.extra_args = extra_args or {}
+        self.checkpoints = checkpoints if checkpoints is not None else CheckpointStore()
+        self.cancel_event = cancel_event or threading.Event()
+        self.progress = progress or (lambda n: None)
+        self.meta = meta
+        self.upload_id: Optional[str] = None
+        self.parts: Dict[int, dict] = {}
+        self.resumed_parts = 0
+        self._lock = threading.Lock()
+
+    # --- resume ---------------------------------------------------------------
+
+    def _remote_parts(self, upload_id: str) -> Optional[Dict[int, dict]]:
+        """Parts S3 holds for `upload_id`, or None if the upload no longer exists."""
+        parts, marker = {}, 0
+        try:
+            while True:
+                page = self.client.list_parts(
+                    Bucket=self.bucket, Key=self.key, UploadId=upload_id, PartNumberMarker=marker
+                )
+                for p in page.get("Parts", []):
+                    parts[p["PartNumber"]] = {"etag": p["ETag"], "size": p["Size"]}
+                if not page.get("IsTruncated"):
+                    return parts
+                marker = page["NextPartNumberMarker"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchUpload", "404"):
+                return None
+            raise
+
+    def _discover_upload_id(self) -> Optional[str]:
+        try:
+            page = self.client.list_multipart_uploads(Bucket=self.bucket, Prefix=self.key)
+        except ClientError:
+            return None
+        uploads = [u for u in page.get("Uploads", []) if u["Key"] == self.key]
+        if not uploads:
+            return None
+        return max(uploads, key=lambda u: u["Initiated"])["UploadId"]
+
+    def _resume(self) -> Dict[int, dict]:
+        state = self.checkpoints.load(self.bucket, self.key) or {}
+        upload_id = state.get("upload_id") or self._discover_upload_id()
+        if not upload_id:
+            return {}
+        remote = self._remote_parts(upload_id)
+        if remote is None:
+            self.checkpoints.clear(self.bucket, self.key)
+            return {}
+        self.upload_id = upload_id
+        saved = {int(n): p for n, p in state.get("parts", {}).items()}
+        for n, part in remote.items():
+            part["md5"] = saved.get(n, {}).get("md5") or part["etag"].strip('"')
+        logger.info("resuming multipart upload %s for %s (%d parts stored)", upload_id, self.key, len(remote))
+        return remote
+
+    def _checkpoint(self):
+        state = {"upload_id": self.upload_id, "parts": {str(n): p for n, p in self.parts.items()}}
+        if self.meta is not None:
+            state["meta"] = self.meta()
+        self.checkpoints.save(self.bucket, self.key, state)
+
+    # --- upload ---------------------------------------------------------------
+
+    def _upload_part(self, number: int, data: bytes, md5: str) -> dict:
+        if self.cancel_event.is_set():
+            raise UploadCancelled(self.key)
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=data,
+            ContentMD5=base64.b64encode(bytes.fromhex(md5)).decode(),
+        )
+        part = {"etag": response["ETag"], "md5": md5, "size": len(data)}
+        with self._lock:
+            self.parts[number] = part
+            self._checkpoint()
+        self.progress(len(data))
+        return part
+
+    def upload(self, fileobj) -> dict:
+        """Upload everything `fileobj` yields; returns {"etag", "parts", "resumed_parts"}."""
+        try:
+            return self._upload(fileobj)
+        except UploadCancelled:
+            self.abort()
+            raise
+
+    def _upload(self, fileobj) -> dict:
+        first = _read_part(fileobj, self.part_size)
+        remote = self._resume()
+        if len(first) < self.part_size and not remote:
+            # Fits in one part: plain PutObject
+            response = self.client.put_object(Bucket=self.bucket, Key=self.key, Body=first, **self.extra_args)
+            self.progress(len(first))
+            return {"etag": response.get("ETag"), "parts": 1, "resumed_parts": 0}
+
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, **self.extra_args
+            )["UploadId"]
+            self._checkpoint()
+
+        number, data = 1, first
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="mpu") as pool:
+            in_flight = set()
+            while data:
+                if self.cancel_event.is_set():
+                    raise UploadCancelled(self.key)
+                md5 = hashlib.md5(data).hexdigest()
+                stored = remote.get(number)
+                if stored and stored["size"] == len(data) and stored["md5"] == md5:
+                    with self._lock:
+                        self.parts[number] = stored
+                    self.resumed_parts += 1
+                    self.progress(len(data))
+                else:
+                    if len(in_flight) >= self.concurrency:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    in_flight.add(pool.submit(self._upload_part, number, data, md5))
+                number += 1
+                data = _read_part(fileobj, self.part_size)
+            for future in in_flight:
+                future.result()
+
+        parts = [{"PartNumber": n, "ETag": self.parts[n]["etag"]} for n in sorted(self.parts) if n < number]
+        response = self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": parts}
+        )
+        self.checkpoints.clear(self.bucket, self.key)
+        return {"etag": response.get("ETag"), "parts": len(parts), "resumed_parts": self.resumed_parts}
+
+    def abort(self):
+        if self.upload_id:
+            try:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            except ClientError as e:
+                logger.warning("abort of %s failed: %s", self.upload_id, e)
+        self.checkpoints.clear(self.bucket, self.key)
+
+def abort_stale_uploads(client, bucket: str, prefix: str = "", older_than: timedelta = timedelta(hours=24),
+                        checkpoints: Optional[CheckpointStore] = None) -> int:
+    """Abort multipart uploads under `prefix` started more than `older_than` ago."""
+    checkpoints = checkpoints if checkpoints is not None else CheckpointStore()
+    cutoff = datetime.now(timezone.utc) - older_than
+    aborted = 0
+    kwargs = {"Bucket": bucket, "Prefix": prefix}
+    while True:
+        page = client.list_multipart_uploads(**kwargs)
+        for upload in page.get("Uploads", []):
+            if upload["Initiated"] < cutoff:
+                client.abort_multipart_upload(Bucket=bucket, Key=upload["Key"], UploadId=upload["UploadId"])
+                checkpoints.clear(bucket, upload["Key"])
+                aborted += 1
+        if not page.get("IsTruncated"):
+            return aborted
+        kwargs.update(KeyMarker=page["NextKeyMarker"], UploadIdMarker=page["NextUploadIdMarker"])
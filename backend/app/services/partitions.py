@@ -0,0 +1,136 @@
+"""
+Monthly range partitions for append-only audit tables.
+
+On Postgres `auditlog` and `breachevent` are declared `PARTITION BY RANGE`
+on their timestamp column (see the Alembic migration). This module keeps
+a few months of partitions ahead of time and enforces retention by
+detaching and dropping whole partitions, so old rows never go through a
+row-by-row DELETE and time-range queries are pruned to the months they
+touch. Other dialects (SQLite) have no partitioning: retention there is a
+single set-based DELETE.
+
+Each table also has a DEFAULT partition, so inserts for a month whose
+partition is missing still succeed. Postgres refuses to create a month's
+partition while the default holds rows for it, so `ensure_partitions`
+moves such rows into the new partition (the default is detached meanwhile),
+and retention deletes the default's expired rows.
+"""
+import logging
+import re
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+# table -> partition key column
+PARTITIONED_TABLES: Dict[str, str] = {
+    "auditlog": "created_at",
+    "breachevent": "timestamp",
+}
+
+MONTHS_AHEAD = 3
+
+_NAME_RE = re.compile(r"_y(\d{4})m(\d{2})$")
+
+def month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+def add_months(dt: datetime, months: int) -> datetime:
+    index = dt.year * 12 + dt.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(table: str, start: datetime) -> str:
+    return f"{table}_y{start.year:04d}m{start.month:02d}"
+
+def default_partition(table: str) -> str:
+    return f"{table}_default"
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :t"),
+        {"t": table},
+    ).scalar())
+
+def list_partitions(conn: Connection, table: str) -> List[str]:
+    rows = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :t ORDER BY c.relname"
+        ),
+        {"t": table},
+    ).all()
+    return [r[0] for r in rows]
+
+def _create_partition(conn: Connection, table: str, name: str, lo: datetime, hi: datetime):
+    bounds = f"FOR VALUES FROM ('{lo:%Y-%m-%d}') TO ('{hi:%Y-%m-%d}')"
+    default, column = default_partition(table), PARTITIONED_TABLES[table]
+    in_default = default in list_partitions(conn, table) and conn.execute(
+        text(f"SELECT 1 FROM {default} WHERE {column} >= :lo AND {column} < :hi LIMIT 1"),
+        {"lo": lo, "hi": hi},
+    ).scalar()
+    if not in_default:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} {bounds}"))
+        return
+    # Rows for this month landed in the default partition: move them into the new one
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} {bounds}"))
+    moved = conn.execute(
+        text(f"WITH moved AS (DELETE FROM {default} WHERE {column} >= :lo AND {column} < :hi RETURNING *) "
+             f"INSERT INTO {name} SELECT * FROM moved"),
+        {"lo": lo, "hi": hi},
+    ).rowcount
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+    logger.info("moved %s rows of %s from %s", moved, name, default)
+
+def ensure_partitions(conn: Connection, table: str, now: datetime, months_ahead: int = MONTHS_AHEAD) -> List[str]:
+    """Create the current month's partition and `months_ahead` more."""
+    if not is_partitioned(conn, table):
+        return []
+    existing = set(list_partitions(conn, table))
+    created = []
+    start = month_start(now)
+    for i in range(months_ahead + 1):
+        lo, hi = add_months(start, i), add_months(start, i + 1)
+        name = partition_name(table, lo)
+        if name not in existing:
+            _create_partition(conn, table, name, lo, hi)
+        created.append(name)
+    return created
+
+def drop_expired_partitions(conn: Connection, table: str, cutoff: datetime) -> int:
+    """
+    Retire everything older than `cutoff`.
+
+    Partitioned: detach + drop every partition whose whole month ends on or
+    before the cutoff (the month containing the cutoff is kept until it has
+    fully aged out), and delete the expired rows that sit in the default
+    partition. Otherwise: one DELETE for the range.
+    """
+    if not is_partitioned(conn, table):
+        column = PARTITIONED_TABLES[table]
+        result = conn.execute(text(f"DELETE FROM {table} WHERE {column} < :cutoff"), {"cutoff": cutoff})
+        return result.rowcount or 0
+
+    dropped = 0
+    names = list_partitions(conn, table)
+    default = default_partition(table)
+    if default in names:
+        column = PARTITIONED_TABLES[table]
+        conn.execute(text(f"DELETE FROM {default} WHERE {column} < :cutoff"), {"cutoff": cutoff})
+    for name in names:
+        match = _NAME_RE.search(name)
+        if not match:
+            continue
+        upper = add_months(datetime(int(match.group(1)), int(match.group(2)), 1), 1)
+        if upper <= cutoff:
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+            logger.info("dropped partition %s (ends %s, cutoff %s)", name, upper.date(), cutoff.date())
+            dropped += 1
+    return dropped
@@ -0,0 +1,377 @@
+"""
+Auditor PDF report for an export bundle.
+
+Page 1 is the letterhead plus the request details, then the static pages
+(SLA timeline, data subject rights), then the findings: a summary table of
+the sources, and one table per source listing every record.
+
+Static parts are laid out once per (TEMPLATE_VERSION, language) and cached
+in the process. For each static page, that means the already-wrapped lines
+and their positions, replayed with plain drawString calls. The letterhead
+is a form XObject, drawn once per document and referenced from every page.
+Only the tables are dynamic. Rows are pulled from the findings iterators
+and a page is emitted each time one fills, with fixed row heights and cell
+text clipped to the column width. Platypus layout is never run over
+thousands of rows.
+
+`render_report` runs the rendering in a process pool (REPORT_RENDER_WORKERS,
+0 = inline), so a large report does not hold the Celery worker's GIL.
+"""
+import atexit
+import io
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_VERSION = "2"
+
+PAGE_W, PAGE_H = A4
+MARGIN = 50
+TOP = PAGE_H - 110  # below the letterhead
+BOTTOM = 60
+ROW_H = 14
+
+def _register_fonts() -> Tuple[str, str]:
+    """DejaVu Sans when available (Helvetica's WinAnsi has no ş, ğ, ı, İ); Helvetica otherwise."""
+    regular = os.path.join(settings.report_font_dir, "DejaVuSans.ttf")
+    bold = os.path.join(settings.report_font_dir, "DejaVuSans-Bold.ttf")
+    if not (os.path.exists(regular) and os.path.exists(bold)):
+        logger.warning("report fonts not found in %s, using Helvetica", settings.report_font_dir)
+        return "Helvetica", "Helvetica-Bold"
+    pdfmetrics.registerFont(TTFont("ReportSans", regular))
+    pdfmetrics.registerFont(TTFont("ReportSans-Bold", bold))
+    return "ReportSans", "ReportSans-Bold"
+
+FONT, BOLD = _register_fonts()
+TEXT_SIZE, TABLE_SIZE = 10, 8
+MAX_COLUMNS = 6
+CELL_PAD = 3
+
+TEXTS = {
+    "tr": {
+        "title": "GDPR Hub Lite – Denetçi Raporu",
+        "request": "Request ID",
+        "generated": "Oluşturulma (UTC)",
+        "summary": "Bulgular – Kaynak Özeti",
+        "source": "Kaynak",
+        "objects": "Kayıt",
+        "failed": "Erişilemeyen Kaynaklar",
+        "error": "Hata",
+        "records": "Kayıtlar",
+        "other": "Diğer alanlar",
+        "page": "Sayfa",
+        "static": [
+            ("SLA Takvimi", [
+                "T+0: Talep alındı, kimlik doğrulama ve kapsam belirleme başlatıldı.",
+                "T+7: Ara bilgilendirme; bağlı veri kaynaklarında arama tamamlandı.",
+                "T+14: Tam veri paketi hazırlandı ve kontrol edildi.",
+                "T+28: Talep kapatıldı; paket güvenli bağlantı ile teslim edildi.",
+            ]),
+            ("İlgili Kişinin Hakları (GDPR md. 15-22)", [
+                "Erişim hakkı: işlenen kişisel verilerin bir kopyasını alma.",
+                "Düzeltme hakkı: yanlış veya eksik verilerin düzeltilmesini isteme.",
+                "Silme hakkı: belirli koşullarda verilerin silinmesini isteme.",
+                "İşlemeyi kısıtlama ve itiraz hakkı.",
+                "Veri taşınabilirliği hakkı: verileri yapılandırılmış, yaygın kullanılan ve "
+                "makine tarafından okunabilir bir formatta alma.",
+                "Bu rapor, talebe ait dışa aktarma paketinin içeriğini ve kaynaklarını özetler. "
+                "Paketteki veri dosyaları bu raporda listelenen kayıtların tam halini içerir.",
+            ]),
+        ],
+    },
+    "en": {
+        "title": "GDPR Hub Lite – Auditor Report",
+        "request": "Request ID",
+        "generated": "Generated (UTC)",
+        "summary": "Findings – Source Summary",
+        "source": "Source",
+        "objects": "Records",
+        "failed": "Unreachable Sources",
+        "error": "Error",
+        "records": "Records",
+        "other": "Other fields",
+        "page": "Page",
+        "static": [
+            ("SLA Timeline", [
+                "T+0: Request received; identity verification and scoping started.",
+                "T+7: Interim update; search of connected data sources completed.",
+                "T+14: Full data package prepared and reviewed.",
+                "T+28: Request closed; package delivered over a secure link.",
+            ]),
+            ("Data Subject Rights (GDPR Art. 15-22)", [
+                "Right of access: obtain a copy of the personal data being processed.",
+                "Right to rectification: have inaccurate or incomplete data corrected.",
+                "Right to erasure: have data deleted under certain conditions.",
+                "Right to restriction of processing and to object.",
+                "Right to data portability: receive the data in a structured, commonly used and "
+                "machine-readable format.",
+                "This report summarises the contents and sources of the export package for the "
+                "request. The data files in the package contain the listed records in full.",
+            ]),
+        ],
+    },
+}
+
+# Cached static layout: pages of (font, size, x, y, text) draw operations
+DrawOp = Tuple[str, float, float, float, str]
+
+@lru_cache(maxsize=None)
+def static_pages(version: str, language: str) -> Tuple[Tuple[DrawOp, ...], ...]:
+    """Wrapped and positioned static sections, computed once per template version and language."""
+    texts = TEXTS[language]
+    width = PAGE_W - 2 * MARGIN
+    pages, ops, y = [], [], TOP
+    for heading, paragraphs in texts["static"]:
+        if y - 3 * ROW_H < BOTTOM:
+            pages.append(tuple(ops))
+            ops, y = [], TOP
+        ops.append((BOLD, 13, MARGIN, y, heading))
+        y -= 22
+        for paragraph in paragraphs:
+            lines = simpleSplit(paragraph, FONT, TEXT_SIZE, width)
+            if y - len(lines) * ROW_H < BOTTOM:
+                pages.append(tuple(ops))
+                ops, y = [], TOP
+            for line in lines:
+                ops.append((FONT, TEXT_SIZE, MARGIN, y, line))
+                y -= ROW_H
+            y -= 6
+        y -= 16
+    if ops:
+        pages.append(tuple(ops))
+    return tuple(pages)
+
+@lru_cache(maxsize=None)
+def _char_width(ch: str, font: str) -> float:
+    return stringWidth(ch, font, 1000)
+
+@lru_cache(maxsize=None)
+def _min_char_width(font: str) -> float:
+    return min(_char_width(ch, font) for ch in "il.,;:'|! ")
+
+def clip(text: str, width: float, font: str = FONT, size: float = TABLE_SIZE) -> str:
+    """`text` cut (with an ellipsis) to fit `width` points; per-character widths are cached."""
+    limit = width * 1000 / size
+    text = text[:int(limit / _min_char_width(font)) + 1]  # more never fits
+    total = 0.0
+    for i, ch in enumerate(text):
+        total += _char_width(ch, font)
+        if total > limit:
+            break
+    else:
+        return text
+    room = limit - _char_width("…", font)
+    total = 0.0
+    for i, ch in enumerate(text):
+        total += _char_width(ch, font)
+        if total > room:
+            return text[:i] + "…"
+    return text
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value).replace("\n", " ")
+
+class _Report:
+    def __init__(self, out, language: str, request_id: str):
+        self.texts = TEXTS[language]
+        self.language = language
+        self.request_id = request_id
+        self.c = canvas.Canvas(out, pagesize=A4, pageCompression=1)
+        self.page = 0
+        self.y = TOP
+        self._letterhead()
+
+    def _letterhead(self):
+        c = self.c
+        c.beginForm("letterhead")
+        c.setFillColorRGB(0.13, 0.2, 0.33)
+        c.rect(0, PAGE_H - 70, PAGE_W, 70, stroke=0, fill=1)
+        c.setFillColorRGB(1, 1, 1)
+        c.setFont(BOLD, 16)
+        c.drawString(MARGIN, PAGE_H - 44, self.texts["title"])
+        c.setStrokeColorRGB(0.8, 0.8, 0.8)
+        c.line(MARGIN, BOTTOM - 20, PAGE_W - MARGIN, BOTTOM - 20)
+        c.endForm()
+
+    def _start_page(self):
+        self.page += 1
+        self.c.doForm("letterhead")
+        self.c.setFillColorRGB(0, 0, 0)
+        self.c.setFont(FONT, 8)
+        self.c.drawRightString(PAGE_W - MARGIN, BOTTOM - 34, f"{self.texts['page']} {self.page}")
+        self.c.drawString(MARGIN, BOTTOM - 34, f"{self.texts['request']}: {self.request_id}")
+        self.y = TOP
+
+    def new_page(self):
+        if self.page:
+            self.c.showPage()
+        self._start_page()
+
+    def replay(self, ops: Sequence[DrawOp]):
+        c = self.c
+        for font, size, x, y, text in ops:
+            c.setFont(font, size)
+            c.drawString(x, y, text)
+
+    def line(self, text: str, font: str = FONT, size: float = TEXT_SIZE, gap: float = ROW_H):
+        if self.y - gap < BOTTOM:
+            self.new_page()
+        self.c.setFont(font, size)
+        self.c.drawString(MARGIN, self.y, text)
+        self.y -= gap
+
+    def table(self, title: str, header: List[str], rows: Iterable[Sequence[Any]], widths: List[float]):
+        """Fixed-height rows from an iterator; a new page (with the header repeated) whenever one fills."""
+        c = self.c
+        clipped = [w - 2 * CELL_PAD for w in widths]
+
+        def draw_header():
+            c.setFillColorRGB(0.92, 0.93, 0.95)
+            c.rect(MARGIN, self.y - 4, sum(widths), ROW_H, stroke=0, fill=1)
+            c.setFillColorRGB(0, 0, 0)
+            c.setFont(BOLD, TABLE_SIZE)
+            x = MARGIN
+            for text, w, cw in zip(header, widths, clipped):
+                c.drawString(x + CELL_PAD, self.y, clip(text, cw, BOLD))
+                x += w
+            self.y -= ROW_H
+            c.setFont(FONT, TABLE_SIZE)
+
+        self.line(title, BOLD, 12, 20)
+        if self.y - 2 * ROW_H < BOTTOM:
+            self.new_page()
+        draw_header()
+        # One text object per page for all cells (a drawString per cell costs a text object each)
+        text = c.beginText()
+        text.setFont(FONT, TABLE_SIZE)
+        for row in rows:
+            if self.y < BOTTOM:
+                c.drawText(text)
+                self.new_page()
+                draw_header()
+                text = c.beginText()
+                text.setFont(FONT, TABLE_SIZE)
+            x = MARGIN
+            for value, w, cw in zip(row, widths, clipped):
+                if value is not None:
+                    text.setTextOrigin(x + CELL_PAD, self.y)
+                    text.textOut(clip(_cell(value), cw))
+                x += w
+            self.y -= ROW_H
+        c.drawText(text)
+        self.y -= 12
+
+    def save(self):
+        self.c.showPage()
+        self.c.save()
+
+def _record_table(records: Iterable[Any], other: str) -> Tuple[List[str], Iterator[List[Any]]]:
+    """Columns from the first records' keys (up to MAX_COLUMNS); the rest go to one overflow column."""
+    records = iter(records)
+    head = list(islice(records, 50))
+    keys: List[str] = []
+    for record in head:
+        if isinstance(record, dict):
+            keys.extend(k for k in record if k not in keys)
+    overflow = len(keys) > MAX_COLUMNS
+    columns = keys[:MAX_COLUMNS - 1] if overflow else keys or ["value"]
+
+    def rows():
+        for i, record in enumerate(chain(head, records), 1):
+            if not isinstance(record, dict):
+                record = {"value": record}
+            row = [i] + [record.get(k) for k in columns]
+            if overflow:
+                row.append({k: v for k, v in record.items() if k not in columns})
+            yield row
+    return ["#"] + columns + ([other] if overflow else []), rows()
+
+def _widths(n_columns: int) -> List[float]:
+    first = 34
+    rest = (PAGE_W - 2 * MARGIN - first) / max(n_columns - 1, 1)
+    return [first] + [rest] * (n_columns - 1)
+
+def render_pdf(request_id: str, findings: dict, language: str = "tr", generated_at: Optional[str] = None) -> bytes:
+    """The full report, rendered in this process."""
+    language = language if language in TEXTS else "tr"
+    texts = TEXTS[language]
+    out = io.BytesIO()
+    report = _Report(out, language, request_id)
+    items = findings.get("findings", [])
+
+    report.new_page()
+    report.line(f"{texts['request']}: {request_id}")
+    report.line(f"{texts['generated']}: {generated_at or datetime.utcnow().isoformat() + 'Z'}", gap=24)
+    report.table(
+        texts["summary"], ["#", texts["source"], texts["objects"]],
+        ((i, item.get("source"), item.get("objects", len(item.get("records") or []))) for i, item in enumerate(items, 1)),
+        [34, 300, PAGE_W - 2 * MARGIN - 334],
+    )
+    failed = findings.get("failed_sources") or []
+    if failed:
+        report.table(
+            texts["failed"], ["#", texts["source"], texts["error"]],
+            ((i, item.get("source"), item.get("error")) for i, item in enumerate(failed, 1)),
+            [34, 166, PAGE_W - 2 * MARGIN - 200],
+        )
+    for ops in static_pages(TEMPLATE_VERSION, language):
+        report.new_page()
+        report.replay(ops)
+
+    for item in items:
+        if not item.get("records"):
+            continue
+        header, rows = _record_table(item["records"], texts["other"])
+        report.new_page()
+        report.table(f"{texts['records']}: {item.get('source')}", header, rows, _widths(len(header)))
+    report.save()
+    return out.getvalue()
+
+# --- process pool ------------------------------------------------------------
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def _warm():
+    for language in TEXTS:
+        static_pages(TEMPLATE_VERSION, language)
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if _pool is None and settings.report_render_workers > 0:
+        _pool = ProcessPoolExecutor(max_workers=settings.report_render_workers, initializer=_warm)
+        atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+def render_report(request_id: str, findings: dict, language: Optional[str] = None) -> bytes:
+    """Render in the process pool; inline if the pool is disabled or cannot be used here."""
+    language = language or settings.report_language
+    global _pool
+    generated_at = datetime.utcnow().isoformat() + "Z"
+    try:
+        pool = _get_pool()
+        if pool is not None:
+            return pool.submit(render_pdf, request_id, findings, language, generated_at).result()
+    except (BrokenProcessPool, OSError, AssertionError) as e:
+        # A dead pool is rebuilt next time; daemonic worker processes may not fork at all
+        logger.warning("report pool unavailable, rendering inline: %s", e)
+        _pool = None
+    return render_pdf(request_id, findings, language, generated_at)
@@ -3,7 +3,6 @@ from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from typing import List, Optional
 from datetime import datetime, timedelta
-import json
 import logging
 
 # Legacy service file referenced non-existent modules in this codebase.
@@ -42,7 +41,7 @@ class RequestService:
             subject_phone=request_data.subject_phone,
             subject_address=request_data.subject_address,
             description=request_data.description,
-            additional_info=json.dumps(request_data.additional_info) if request_data.additional_info else None,
+            additional_info=request_data.additional_info or None,
             due_date=datetime.utcnow() + timedelta(days=30)  # GDPR 30 gün kuralı
         )
         
@@ -102,10 +101,7 @@ class RequestService:
         
         # Güncelleme
         for field, value in request_data.dict(exclude_unset=True).items():
-            if field == "additional_info" and value:
-                setattr(request, field, json.dumps(value))
-            else:
-                setattr(request, field, value)
+            setattr(request, field, value)
         
         await self.db.commit()
         await self.db.refresh(request)
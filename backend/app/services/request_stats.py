@@ -0,0 +1,140 @@
+"""
+Per-tenant DSAR status counters.
+
+Counters live in `RequestStatusCounter` and are adjusted inside the same
+transaction as the status change, so `/api/v1/requests/stats` is a single
+indexed read. Tenants without counters are answered with a read-only
+GROUP BY; `rebuild_request_stats` persists that result when counters need
+repairing.
+
+A rebuild must not interleave with counter writes: on Postgres, writers
+hold a shared per-tenant advisory lock and the rebuild (like a first-write
+seed) takes it exclusively. SQLite serializes writers already; the rebuild
+deletes before it counts, so the count runs under the database write lock.
+"""
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import delete, func, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from ..models import DSARRequest, RequestStatusCounter
+
+TRACKED_STATUSES = ("pending", "processing", "completed", "rejected")
+LOCK_NAMESPACE = 0x5354  # first key of the (namespace, user_id) advisory lock
+
+def _lock_tenant(session: Session, user_id: int, shared: bool = False):
+    """Transaction-scoped advisory lock on a tenant's counters (Postgres only)."""
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    fn = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+    session.exec(text(f"SELECT {fn}(:ns, :uid)").bindparams(ns=LOCK_NAMESPACE, uid=user_id))
+
+def adjust_status_count(session: Session, user_id: int, status: str, delta: int):
+    """Atomically add `delta` to one counter, creating it if needed; caller commits."""
+    table = RequestStatusCounter.__table__
+    dialect = session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(table).values(
+        user_id=user_id, status=status, count=delta, updated_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "status"],
+        set_={"count": table.c.count + delta, "updated_at": stmt.excluded.updated_at},
+    )
+    session.exec(stmt)
+
+def _has_counters(session: Session, user_id: int) -> bool:
+    return session.exec(
+        select(RequestStatusCounter.id).where(RequestStatusCounter.user_id == user_id).limit(1)
+    ).first() is not None
+
+def _ensure_seeded(session: Session, user_id: int) -> bool:
+    """
+    Lock the tenant's counters for this write, seeding them from DSARRequest
+    on its first tracked write.
+
+    Returns True when it seeded: the GROUP BY runs after a flush, so it
+    already includes the caller's pending change and no delta is applied.
+    Seeding takes the tenant lock exclusively and checks again under it, so
+    of two concurrent first writes only one seeds. The other waits, sees the
+    committed counters and applies its delta; its change was uncommitted
+    during the seed's GROUP BY and is not counted twice.
+    """
+    if _has_counters(session, user_id):
+        _lock_tenant(session, user_id, shared=True)
+        return False
+    _lock_tenant(session, user_id)
+    if _has_counters(session, user_id):
+        return False
+    session.flush()
+    for status, count in count_by_status(session, user_id).items():
+        adjust_status_count(session, user_id, status, count)
+    return True
+
+def record_status_change(session: Session, user_id: int, old_status: Optional[str], new_status: Optional[str]):
+    """Move one request between status buckets; caller commits."""
+    if old_status == new_status or _ensure_seeded(session, user_id):
+        return
+    if old_status:
+        adjust_status_count(session, user_id, old_status, -1)
+    if new_status:
+        adjust_status_count(session, user_id, new_status, 1)
+
+def record_inserts(session: Session, user_id: int, status_counts: dict):
+    """Count freshly inserted requests ({status: n}); caller commits."""
+    if _ensure_seeded(session, user_id):
+        return
+    for status, count in status_counts.items():
+        adjust_status_count(session, user_id, status, count)
+
+def record_transitions(session: Session, user_id: int, from_counts: dict, new_status: str):
+    """Move many requests into `new_status` ({old_status: n}); caller commits."""
+    if _ensure_seeded(session, user_id):
+        return
+    for status, count in from_counts.items():
+        adjust_status_count(session, user_id, status, -count)
+    adjust_status_count(session, user_id, new_status, sum(from_counts.values()))
+
+def set_request_status(session: Session, request: DSARRequest, status: str):
+    """Apply a status transition and its counter update in the caller's transaction."""
+    old_status = request.status
+    now = datetime.utcnow()
+    request.status = status
+    request.updated_at = now
+    request.version = (request.version or 0) + 1
+    if status == "completed":
+        request.completed_at = now
+    session.add(request)
+    record_status_change(session, request.user_id, old_status, status)
+
+def count_by_status(session: Session, user_id: int) -> dict:
+    """GROUP BY over DSARRequest; read-only, safe on a replica."""
+    rows = session.exec(
+        select(DSARRequest.status, func.count())
+        .where(DSARRequest.user_id == user_id)
+        .group_by(DSARRequest.status)
+    ).all()
+    return {status: count for status, count in rows}
+
+def rebuild_request_stats(session: Session, user_id: int) -> dict:
+    """Recompute a tenant's counters from DSARRequest with one GROUP BY, excluding concurrent writers."""
+    _lock_tenant(session, user_id)
+    session.exec(delete(RequestStatusCounter).where(RequestStatusCounter.user_id == user_id))
+    counts = count_by_status(session, user_id)
+    for status, count in counts.items():
+        session.add(RequestStatusCounter(user_id=user_id, status=status, count=count))
+    session.commit()
+    return counts
+
+def get_request_stats(session: Session, user_id: int) -> dict:
+    rows = session.exec(
+        select(RequestStatusCounter.status, RequestStatusCounter.count)
+        .where(RequestStatusCounter.user_id == user_id)
+    ).all()
+    # No counters yet (tenant predates them): fall back to GROUP BY without writing
+    counts = {status: count for status, count in rows} if rows else count_by_status(session, user_id)
+
+    stats = {"total": sum(counts.values())}
+    for status in TRACKED_STATUSES:
+        stats[status] = counts.get(status, 0)
+    return stats
@@ -0,0 +1,142 @@
+"""
+Subject search over DSAR requests (subject_email, subject_name, description).
+
+SQLite: FTS5 external-content table `dsarrequest_fts` with the trigram
+tokenizer, so any 3+ character fragment of an email or name matches. It is
+kept in sync by triggers on insert, delete and on updates that touch one of
+the three columns (status changes do not rewrite the index). Ranked by
+bm25().
+
+Postgres: pg_trgm GIN index on the concatenated subject document; each term
+is an ILIKE '%term%' the index answers, ranked by word_similarity().
+
+Both are trigram indexes, so every search term needs at least
+MIN_TERM_CHARS characters.
+
+The FTS5 index spans every tenant: a MATCH on a common fragment ("gmail")
+walks all tenants' postings before the user_id filter applies. So on SQLite
+a tenant with at most SCAN_MAX_ROWS requests (per its status counters) is
+searched by scanning only its own rows through the user_id index, with a
+case-insensitive substring test per term (ranked by match position, lower
+first like bm25). Larger tenants, and tenants without counters, use FTS5.
+"""
+from typing import List, Optional
+from sqlalchemy import column, func, literal, literal_column, table, text
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select
+from ..models import DSARRequest, RequestStatusCounter
+
+MIN_TERM_CHARS = 3
+MAX_TERMS = 8
+SCAN_MAX_ROWS = 10_000
+
+SQLITE_COLUMNS = "subject_email, subject_name, description"
+
+SQLITE_INSTALL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS dsarrequest_fts USING fts5(
+        {SQLITE_COLUMNS}, content='dsarrequest', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS dsarrequest_fts_ai AFTER INSERT ON dsarrequest BEGIN
+        INSERT INTO dsarrequest_fts(rowid, {SQLITE_COLUMNS})
+        VALUES (new.id, new.subject_email, new.subject_name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS dsarrequest_fts_ad AFTER DELETE ON dsarrequest BEGIN
+        INSERT INTO dsarrequest_fts(dsarrequest_fts, rowid, {SQLITE_COLUMNS})
+        VALUES ('delete', old.id, old.subject_email, old.subject_name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS dsarrequest_fts_au
+        AFTER UPDATE OF {SQLITE_COLUMNS} ON dsarrequest BEGIN
+        INSERT INTO dsarrequest_fts(dsarrequest_fts, rowid, {SQLITE_COLUMNS})
+        VALUES ('delete', old.id, old.subject_email, old.subject_name, old.description);
+        INSERT INTO dsarrequest_fts(rowid, {SQLITE_COLUMNS})
+        VALUES (new.id, new.subject_email, new.subject_name, new.description);
+    END""",
+]
+
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS dsarrequest_fts_au",
+    "DROP TRIGGER IF EXISTS dsarrequest_fts_ad",
+    "DROP TRIGGER IF EXISTS dsarrequest_fts_ai",
+    "DROP TABLE IF EXISTS dsarrequest_fts",
+]
+
+# Same expression in the index and the query, literals inline, or the planner won't match them
+# (the SQLite tenant scan uses it too)
+PG_DOCUMENT = "(subject_email || ' ' || subject_name || ' ' || coalesce(description, ''))"
+
+PG_INSTALL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_dsarrequest_subject_trgm ON dsarrequest USING GIN ({PG_DOCUMENT} gin_trgm_ops)",
+]
+
+PG_UNINSTALL = ["DROP INDEX IF EXISTS ix_dsarrequest_subject_trgm"]
+
+fts = table("dsarrequest_fts", column("rowid"))
+fts_match = literal_column("dsarrequest_fts")
+
+def install_search_index(conn: Connection):
+    """Create the index (idempotent); a new SQLite FTS table is filled from existing rows."""
+    if conn.dialect.name == "postgresql":
+        for ddl in PG_INSTALL:
+            conn.execute(text(ddl))
+        return
+    if conn.dialect.name != "sqlite":
+        return
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'dsarrequest_fts'")
+    ).scalar()
+    for ddl in SQLITE_INSTALL:
+        conn.execute(text(ddl))
+    if not exists:
+        conn.execute(text("INSERT INTO dsarrequest_fts(dsarrequest_fts) VALUES ('rebuild')"))
+
+def drop_search_index(conn: Connection):
+    statements = {"postgresql": PG_UNINSTALL, "sqlite": SQLITE_UNINSTALL}.get(conn.dialect.name, [])
+    for ddl in statements:
+        conn.execute(text(ddl))
+
+def parse_terms(q: str) -> List[str]:
+    """Whitespace-separated terms, all of which must match; ValueError if unusable."""
+    terms = q.split()[:MAX_TERMS]
+    if not terms:
+        raise ValueError("empty search")
+    if any(len(term) < MIN_TERM_CHARS for term in terms):
+        raise ValueError(f"search terms need at least {MIN_TERM_CHARS} characters")
+    return terms
+
+def tenant_rows(session: Session, user_id: int) -> Optional[int]:
+    """The tenant's request count from its status counters; None without counters."""
+    return session.exec(
+        select(func.sum(RequestStatusCounter.count)).where(RequestStatusCounter.user_id == user_id)
+    ).one()
+
+def search_query(dialect: str, user_id: int, terms: List[str], limit: int, rows: Optional[int] = None):
+    """SELECT (DSARRequest, rank) for one tenant, best match first; `rows` is `tenant_rows`."""
+    if dialect == "postgresql":
+        document = literal_column(PG_DOCUMENT)
+        rank = func.word_similarity(" ".join(terms), document)
+        query = select(DSARRequest, rank.label("rank")).where(DSARRequest.user_id == user_id)
+        for term in terms:
+            escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = query.where(document.ilike(literal(f"%{escaped}%")))
+        return query.order_by(rank.desc(), DSARRequest.id.desc()).limit(limit)
+
+    if rows is not None and rows <= SCAN_MAX_ROWS:
+        document = func.lower(literal_column(PG_DOCUMENT))
+        positions = [func.instr(document, literal(term.lower())) for term in terms]
+        rank = sum(positions[1:], positions[0])
+        query = select(DSARRequest, rank.label("rank")).where(DSARRequest.user_id == user_id)
+        for position in positions:
+            query = query.where(position > 0)
+        return query.order_by(rank, DSARRequest.id.desc()).limit(limit)
+
+    # FTS5: each term is a quoted trigram string (substring match), implicit AND
+    match = " ".join('"%s"' % term.replace('"', '""') for term in terms)
+    rank = func.bm25(fts_match)
+    return (
+        select(DSARRequest, rank.label("rank"))
+        .join(fts, fts.c.rowid == DSARRequest.id)
+        .where(fts_match.op("MATCH")(match), DSARRequest.user_id == user_id)
+        .order_by(rank, DSARRequest.id.desc())
+        .limit(limit)
+    )
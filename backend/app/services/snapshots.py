@@ -0,0 +1,207 @@
+"""
+Per-source snapshots for incremental re-exports.
+
+For every (account, subject, source, format), the entry written by the last
+export is kept in the content-addressed store (`cas/<sha256>`, one
+reference per snapshot). A SourceSnapshot row records the content hash of
+the source's records and the connector's fingerprint.
+A repeat request (Shopify re-sends customers/data_request) then plans each
+source as follows:
+
+- no records, and a fingerprint equal to the snapshot's: the source was not
+  re-fetched and its blob is stitched into the bundle;
+- records whose content hash equals the snapshot's: the blob is stitched in
+  and the records are not serialised again;
+- otherwise: the records are serialised into the bundle, and that same
+  stream is stored as the new snapshot.
+
+Fetch side: `unchanged_sources` tells a connector which sources it can skip.
+
+Subjects are keyed by a hash of their email. Snapshots are personal data, so
+they are dropped on erasure (`forget_subject`) and expire with the export
+retention (`expire_snapshots`).
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from ..database import session_scope, write_queue
+from ..models import SourceSnapshot
+from .bundle_writer import Chunks, source_chunks
+from .cas import CasStore, Spooled, acquire, collect_garbage, release
+
+logger = logging.getLogger(__name__)
+
+_CANONICAL = json.JSONEncoder(ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+def subject_key(email: str) -> str:
+    return hashlib.sha256(email.strip().lower().encode("utf-8")).hexdigest()
+
+def content_hash(records: Iterable[Any]) -> str:
+    """Order-sensitive hash of a source's records, independent of key order and format."""
+    digest = hashlib.sha256()
+    for record in records:
+        digest.update(_CANONICAL.encode(record).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+class SnapshotStore:
+    """Snapshot blobs, kept in the content-addressed store."""
+
+    def __init__(self, client, bucket: str):
+        self.cas = CasStore(client, bucket)
+
+    def exists(self, key: str) -> bool:
+        return self.cas.exists(key)
+
+    def read(self, key: str) -> Iterator[bytes]:
+        return self.cas.read(key)
+
+    def tee(self, chunks: Iterable[bytes], on_stored) -> Iterator[bytes]:
+        """Yield `chunks` and store the same bytes; `on_stored(key, size)` once they are saved."""
+        spooled = Spooled()
+        try:
+            for chunk in chunks:
+                yield spooled.write(chunk)
+            try:
+                key = self.cas.put(spooled)
+            except Exception as e:
+                # The bundle is unaffected; the next export just rebuilds this source
+                logger.warning("snapshot not stored: %s", e)
+                return
+        finally:
+            spooled.close()
+        on_stored(key, spooled.size)
+
+def _load(account_id: str, subject: str) -> Dict[Tuple[str, str], SourceSnapshot]:
+    with session_scope() as session:
+        rows = session.exec(
+            select(SourceSnapshot).where(
+                SourceSnapshot.account_id == account_id,
+                SourceSnapshot.subject_key == subject,
+            )
+        ).all()
+    return {(row.source, row.fmt): row for row in rows}
+
+def unchanged_sources(account_id: str, subject_email: str, fingerprints: Dict[str, str], formats: Sequence[str]) -> Set[str]:
+    """Sources whose fingerprint matches the snapshot in every format, i.e. need no fetch."""
+    snapshots = _load(account_id, subject_key(subject_email))
+    return {
+        source for source, fingerprint in fingerprints.items()
+        if fingerprint and all(
+            (source, fmt) in snapshots and snapshots[(source, fmt)].fingerprint == fingerprint
+            for fmt in formats
+        )
+    }
+
+class IncrementalExport:
+    """
+    Plans one bundle's per-source entries against the subject's snapshots.
+
+    `entries()` builds the (name, chunks) list. `save()` runs after the bundle
+    has been written: it records the snapshots that were stored and moves
+    their references off the blobs they replaced.
+    """
+
+    def __init__(self, store: SnapshotStore, account_id: str, subject_email: str, formats: Sequence[str]):
+        self.store = store
+        self.account_id = account_id
+        self.subject = subject_key(subject_email)
+        self.formats = list(formats)
+        self.reused: List[str] = []
+        self.rebuilt: List[str] = []
+        self._stored: List[dict] = []
+        self._touched: List[Tuple[int, Optional[str]]] = []
+
+    def _stitch(self, snapshot: SourceSnapshot, fingerprint: Optional[str]) -> Chunks:
+        self._touched.append((snapshot.id, fingerprint or snapshot.fingerprint))
+        return self.store.read(snapshot.blob_key)
+
+    def _rebuild(self, source: str, fmt: str, records: list, digest: str, fingerprint: Optional[str]) -> Chunks:
+        row = {
+            "account_id": self.account_id, "subject_key": self.subject, "source": source, "fmt": fmt,
+            "fingerprint": fingerprint, "content_hash": digest, "record_count": len(records),
+        }
+        return self.store.tee(
+            source_chunks(fmt, records),
+            lambda key, size: self._stored.append(dict(row, blob_key=key, size=size)),
+        )
+
+    def entries(self, prefix: str, sources: Iterable[dict]) -> List[Tuple[str, Chunks]]:
+        """
+        Entries `<prefix><source>.<fmt>` for `sources`, given as
+        {"source", "records"?, "fingerprint"?} dicts. A source without
+        records must be unchanged since its snapshot (see unchanged_sources).
+        """
+        snapshots = _load(self.account_id, self.subject)
+        entries = []
+        for item in sources:
+            source, records, fingerprint = item["source"], item.get("records"), item.get("fingerprint")
+            digest = content_hash(records) if records is not None else None
+            for fmt in self.formats:
+                snapshot = snapshots.get((source, fmt))
+                name = f"{prefix}{source}.{fmt}"
+                fresh = snapshot is not None and (
+                    snapshot.content_hash == digest if digest is not None
+                    else fingerprint is not None and snapshot.fingerprint == fingerprint
+                )
+                if fresh and self.store.exists(snapshot.blob_key):
+                    entries.append((name, self._stitch(snapshot, fingerprint)))
+                    self.reused.append(name)
+                elif records is None:
+                    raise ValueError(f"source {source} changed since its snapshot but was not fetched")
+                else:
+                    entries.append((name, self._rebuild(source, fmt, records, digest, fingerprint)))
+                    self.rebuilt.append(name)
+        return entries
+
+    def save(self):
+        if self._stored or self._touched:
+            write_queue.run(_save_snapshots, self._stored, self._touched)
+
+def _save_snapshots(session: Session, stored: List[dict], touched: List[Tuple[int, Optional[str]]]):
+    """Upsert stored snapshots (moving their blob references), keep reused ones alive."""
+    now = datetime.utcnow()
+    table = SourceSnapshot.__table__
+    insert = postgresql.insert if session.get_bind().dialect.name == "postgresql" else sqlite.insert
+    for row in stored:
+        previous = session.exec(
+            select(SourceSnapshot.blob_key).where(
+                SourceSnapshot.account_id == row["account_id"],
+                SourceSnapshot.subject_key == row["subject_key"],
+                SourceSnapshot.source == row["source"],
+                SourceSnapshot.fmt == row["fmt"],
+            )
+        ).first()
+        acquire(session, [row["blob_key"]])
+        if previous:
+            release(session, [previous])
+        stmt = insert(table).values(**row, created_at=now, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["account_id", "subject_key", "source", "fmt"],
+            set_={k: stmt.excluded[k] for k in ("fingerprint", "content_hash", "blob_key", "size", "record_count", "updated_at")},
+        )
+        session.execute(stmt)
+    # Reused: same content, possibly under a new fingerprint
+    for snapshot_id, fingerprint in touched:
+        session.execute(table.update().where(table.c.id == snapshot_id).values(fingerprint=fingerprint, updated_at=now))
+
+def _delete_rows(session: Session, where) -> List[str]:
+    keys = list(session.exec(select(SourceSnapshot.blob_key).where(where)).all())
+    session.execute(delete(SourceSnapshot).where(where))
+    release(session, keys)
+    return keys
+
+def forget_subject(store: SnapshotStore, subject_email: str) -> int:
+    """Erasure: drop every snapshot of the subject, in all accounts, and their unshared blobs now."""
+    keys = write_queue.run(_delete_rows, SourceSnapshot.subject_key == subject_key(subject_email))
+    collect_garbage(store.cas, grace=timedelta(0), keys=keys)
+    return len(keys)
+
+def expire_snapshots(older_than: timedelta) -> int:
+    """Drop snapshots not used by any export for `older_than`; their blobs go with the next GC."""
+    return len(write_queue.run(_delete_rows, SourceSnapshot.updated_at < datetime.utcnow() - older_than))
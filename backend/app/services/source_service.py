@@ -1,7 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List, Optional
-import json
 import logging
 
 from app.models.source import Source, SourceStatus
@@ -29,7 +28,7 @@ class SourceService:
             account_id=source_data.account_id,
             name=source_data.name,
             source_type=source_data.source_type,
-            connection_data=json.dumps(source_data.connection_data) if source_data.connection_data else None,
+            connection_data=source_data.connection_data or None,
             status=SourceStatus.ACTIVE,
             is_enabled=True
         )
@@ -79,10 +78,7 @@ class SourceService:
         
         # Güncelleme
         for field, value in source_data.dict(exclude_unset=True).items():
-            if field == "connection_data" and value:
-                setattr(source, field, json.dumps(value))
-            else:
-                setattr(source, field, value)
+            setattr(source, field, value)
         
         await self.db.commit()
         await self.db.refresh(source)
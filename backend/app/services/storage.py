@@ -0,0 +1,119 @@
+"""
+Process-wide object-store clients.
+
+Building a boto3 client costs tens of milliseconds (it loads the service
+model) and starts a new connection pool. Calling `client()` once per
+operation paid that cost every time and never reused a connection. Here
+every store has one client per process, shared by all threads (boto3
+clients are thread-safe). Its connection pool is sized by
+S3_MAX_POOL_CONNECTIONS, so parallel multipart parts and fetch tasks each
+get a connection, and TCP keepalive is on.
+
+Fork-safe: a Celery prefork child must not share its parent's sockets, so
+clients are dropped in the child after fork, and also whenever the pid
+changes. The next call builds fresh ones.
+
+`presigned_get` caches presigned GET URLs per key and expiry. A URL is
+handed out again only while more than half of its validity is left, so a
+cached link is never much shorter-lived than the caller asked for, and hot
+links skip re-signing.
+
+Stores: "s3" (S3_* / AWS_* env; exports, CAS) and "r2" (R2_* env).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import boto3
+import botocore.config
+from ..config import settings
+
+S3_BUCKET = os.environ.get("S3_BUCKET", "gdpr-hub-lite")
+AWS_KEY = os.environ.get("AWS_ACCESS_KEY_ID")
+
+PRESIGN_CACHE_SIZE = 10_000
+
+def _stores() -> Dict[str, dict]:
+    return {
+        "s3": {
+            "bucket": S3_BUCKET,
+            "client": {
+                "region_name": os.environ.get("S3_REGION", "eu-central-1"),
+                "endpoint_url": os.environ.get("S3_ENDPOINT_URL"),
+                "aws_access_key_id": AWS_KEY,
+                "aws_secret_access_key": os.environ.get("AWS_SECRET_ACCESS_KEY"),
+            },
+        },
+        "r2": {
+            "bucket": os.getenv("R2_BUCKET"),
+            "client": {
+                "region_name": os.getenv("R2_REGION", "auto"),
+                "endpoint_url": os.getenv("R2_ENDPOINT_URL"),
+                "aws_access_key_id": os.getenv("R2_ACCESS_KEY_ID"),
+                "aws_secret_access_key": os.getenv("R2_SECRET_ACCESS_KEY"),
+            },
+        },
+    }
+
+_lock = threading.Lock()
+_clients: Dict[str, object] = {}
+_pid = os.getpid()
+_presigned: OrderedDict[Tuple[str, str, int], Tuple[str, float]] = OrderedDict()
+
+def _reset():
+    global _pid, _lock
+    _lock = threading.Lock()  # another thread may have held it at fork time
+    _clients.clear()
+    _pid = os.getpid()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset)
+
+def _config() -> botocore.config.Config:
+    return botocore.config.Config(
+        s3={"addressing_style": "path"},
+        signature_version="s3v4",
+        retries={"max_attempts": 5, "mode": "standard"},
+        max_pool_connections=settings.s3_max_pool_connections,
+        connect_timeout=settings.s3_connect_timeout_s,
+        read_timeout=settings.s3_read_timeout_s,
+        tcp_keepalive=True,
+    )
+
+def client(store: str = "s3"):
+    """The process's shared client for `store`."""
+    if os.getpid() != _pid:
+        _reset()
+    found = _clients.get(store)
+    if found is not None:
+        return found
+    with _lock:
+        if store not in _clients:
+            _clients[store] = boto3.session.Session().client("s3", config=_config(), **_stores()[store]["client"])
+        return _clients[store]
+
+def bucket(store: str = "s3") -> Optional[str]:
+    return _stores()[store]["bucket"]
+
+def presigned_get(key: str, expires_in: int, store: str = "s3") -> str:
+    """
+    Presigned GET URL for `key`, valid for `expires_in` seconds. A cached URL
+    is reused while more than half of that is left, so the caller always
+    gets at least `expires_in / 2` seconds.
+    """
+    cache_key, now = (store, key, expires_in), time.time()
+    with _lock:
+        cached = _presigned.get(cache_key)
+        if cached and cached[1] - now > expires_in / 2:
+            _presigned.move_to_end(cache_key)
+            return cached[0]
+    url = client(store).generate_presigned_url(
+        ClientMethod="get_object", Params={"Bucket": bucket(store), "Key": key}, ExpiresIn=expires_in,
+    )
+    with _lock:
+        _presigned[cache_key] = (url, now + expires_in)
+        _presigned.move_to_end(cache_key)
+        while len(_presigned) > PRESIGN_CACHE_SIZE:
+            _presigned.popitem(last=False)
+    return url
@@ -0,0 +1,122 @@
+"""
+Embedded SQLite mode for single-node installs.
+
+The API and the Celery workers share one database file, so concurrent
+writers used to surface as "database is locked". In embedded mode every
+connection gets WAL, busy_timeout, synchronous=NORMAL, mmap and a sized page
+cache, and pysqlite's implicit transaction handling is replaced by explicit
+BEGIN statements:
+
+- read sessions use a deferred BEGIN; under WAL they never block writers
+- write sessions use BEGIN IMMEDIATE and take the write lock up front, so a
+  transaction never has to upgrade from reader to writer (the upgrade is the
+  case busy_timeout cannot resolve: it fails straight away with SQLITE_BUSY)
+
+Each thread checks out its own pooled connection; `check_same_thread=False`
+only lets the pool hand a connection over between threads. Sync writes go
+through a `WriteQueue`: one writer thread drains a queue of write jobs, so
+the threads of a process never compete for the lock and only the processes
+(API vs workers) have to wait on busy_timeout.
+"""
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+from .config import settings
+
+BEGIN_OPTION = "sqlite_begin"
+IMMEDIATE = "IMMEDIATE"
+
+def pragmas() -> dict:
+    return {
+        "journal_mode": "WAL",
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "synchronous": "NORMAL",
+        "mmap_size": settings.sqlite_mmap_bytes,
+        "cache_size": -settings.sqlite_cache_kb,  # negative = KiB
+        "temp_store": "MEMORY",
+    }
+
+def configure_engine(engine: Engine):
+    """Install the PRAGMAs and explicit BEGIN handling on a (sync) SQLite engine."""
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        # Let SQLAlchemy emit BEGIN itself (see _on_begin)
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        mode = conn.get_execution_options().get(BEGIN_OPTION)
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if mode == IMMEDIATE else "BEGIN")
+
+class WriteQueue:
+    """
+    Single writer for sync code paths.
+
+    `run(fn, *args)` executes `fn(session, *args)` on the writer thread in a
+    BEGIN IMMEDIATE transaction, commits it and returns fn's result (errors
+    are re-raised in the caller). Without embedded mode, or on another
+    database, the job runs inline in the caller's thread with the same
+    contract.
+    """
+
+    def __init__(self, engine: Engine, enabled: bool):
+        self.enabled = enabled
+        self.engine = engine.execution_options(**{BEGIN_OPTION: IMMEDIATE}) if enabled else engine
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _execute(self, fn: Callable, args, kwargs):
+        with Session(self.engine) as session:
+            result = fn(session, *args, **kwargs)
+            session.commit()
+            return result
+
+    def _worker(self):
+        while True:
+            future, fn, args, kwargs = self._jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._execute(fn, args, kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="sqlite-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        future: Future = Future()
+        if not self.enabled or threading.current_thread() is self._thread:
+            # Inline: other databases, or a job that writes again from the writer thread
+            try:
+                future.set_result(self._execute(fn, args, kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        self._ensure_started()
+        self._jobs.put((future, fn, args, kwargs))
+        return future
+
+    def run(self, fn: Callable, *args, **kwargs):
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def arun(self, fn: Callable, *args, **kwargs):
+        if not self.enabled:
+            return await asyncio.to_thread(self.run, fn, *args, **kwargs)
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
@@ -1,8 +1,10 @@
 # Tasks package aggregator
-from .ops import discover, package, erase  # noqa: F401
+from .ops import discover, fetch_source, package, package_sources, erase  # noqa: F401
 
 __all__ = [
     "discover",
+    "fetch_source",
     "package",
+    "package_sources",
     "erase",
 ]
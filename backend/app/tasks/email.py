@@ -3,7 +3,7 @@ from datetime import datetime, timedelta
 import uuid
 import json
 from typing import Optional
-from ..database import get_session
+from ..database import session_scope
 from ..models import EmailNotification, EmailSuppression
 
 class TransientError(Exception):
@@ -16,7 +16,7 @@ class PermanentError(Exception):
 
 def is_suppressed(email: str) -> bool:
     """Check if email is in suppression list"""
-    with get_session() as session:
+    with session_scope() as session:
         suppression = session.query(EmailSuppression).filter(
             EmailSuppression.email == email,
             (EmailSuppression.expires_at.is_(None) | (EmailSuppression.expires_at > datetime.utcnow()))
@@ -27,7 +27,7 @@ def acquire_idempotency(key: str) -> bool:
     """Try to acquire idempotency lock"""
     # In production, use Redis for distributed locking
     # For now, simple database check
-    with get_session() as session:
+    with session_scope() as session:
         existing = session.query(EmailNotification).filter(
             EmailNotification.idempotency_key == key,
             EmailNotification.status.in_(["sent", "failed"])
@@ -36,7 +36,7 @@ def acquire_idempotency(key: str) -> bool:
 
 def mark_sent(outbox_id: int, sent_at: datetime):
     """Mark email as sent"""
-    with get_session() as session:
+    with session_scope() as session:
         notification = session.query(EmailNotification).filter(
             EmailNotification.id == outbox_id
         ).first()
@@ -47,7 +47,7 @@ def mark_sent(outbox_id: int, sent_at: datetime):
 
 def mark_failed(outbox_id: int, error: str):
     """Mark email as failed"""
-    with get_session() as session:
+    with session_scope() as session:
         notification = session.query(EmailNotification).filter(
             EmailNotification.id == outbox_id
         ).first()
@@ -68,7 +68,7 @@ def send_email_task(self, outbox_id: int):
     """Production-grade email sending task with idempotency and retry"""
     
     # 1) Load notification
-    with get_session() as session:
+    with session_scope() as session:
         notification = session.query(EmailNotification).filter(
             EmailNotification.id == outbox_id
         ).first()
@@ -130,7 +130,7 @@ def queue_email_notification(
     
     idempotency_key = f"{user_id}_{email_type}_{recipient_email}_{datetime.utcnow().strftime('%Y%m%d')}"
     
-    with get_session() as session:
+    with session_scope() as session:
         notification = EmailNotification(
             user_id=user_id,
             type=email_type,
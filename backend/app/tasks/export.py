@@ -1,9 +1,33 @@
 from app.celery_app import celery_app
+from app.database import session_scope
+from app.models import DSARRequest
 
 
-@celery_app.task(name="app.tasks.export_dsar")
-def export_dsar_task(request_id: int) -> dict:
-    # Basit mock: gerçek implementasyon R2/local export üretir
-    return {"ok": True, "bundle_key": f"exports/request_{request_id}.zip"}
+@celery_app.task(name="app.tasks.export_dsar", bind=True)
+def export_dsar_task(self, request_id: int, formats: list = None) -> dict:
+    # Kaynaklar paralel çekilir (chord), package sonuçları birleştirir.
+    # Bu task'ın id'si export id'sidir: ilerleme ve iptal onun üzerinden izlenir
+    from app.services.export_progress import ExportProgress
+    from app.services.fetch import active_sources
+    from app.tasks.ops import release_export, export_pipeline
 
+    progress = ExportProgress(self.request.id)
+    if progress.cancelled():
+        progress.set(state="cancelled")
+        release_export(progress)
+        return {"ok": False, "cancelled": True}
+    with session_scope() as session:
+        request = session.get(DSARRequest, request_id)
+        if request is None:
+            progress.set(state="failed", error="request not found")
+            release_export(progress)
+            return {"ok": False, "error": "request not found"}
+        public_id, subject_email = request.request_id, request.subject_email
+
+    account_id, source_ids = active_sources(public_id)
+    pipeline = export_pipeline(
+        public_id, account_id, subject_email, source_ids, formats,
+        export_id=self.request.id,
+    ).apply_async()
+    return {"ok": True, "pipeline_id": pipeline.id, "sources": len(source_ids)}
 
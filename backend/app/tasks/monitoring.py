@@ -1,6 +1,8 @@
 from celery import shared_task
 from datetime import datetime, timedelta
-from ..database import get_session
+from ..config import settings
+from ..database import engine, session_scope
+from ..services import partitions
 from ..models import DataBreachReport, EmailNotification
 from ..tasks.email import queue_email_notification
 
@@ -8,7 +10,7 @@ from ..tasks.email import queue_email_notification
 def check_breach_sla_deadlines():
     """Check for breaches approaching or past 72h deadline"""
     
-    with get_session() as session:
+    with session_scope() as session:
         # Find breaches that are reportable but not yet reported
         overdue_breaches = session.query(DataBreachReport).filter(
             DataBreachReport.reportable == True,
@@ -54,7 +56,7 @@ def check_breach_sla_deadlines():
 def check_dsar_sla_deadlines():
     """Check for DSAR requests approaching deadlines (7/14/28 days)"""
     
-    with get_session() as session:
+    with session_scope() as session:
         from ..models import DSARRequest
         
         # DSAR deadlines: 7 days for access, 14 days for rectification, 28 days for erasure
@@ -101,7 +103,7 @@ def check_dsar_sla_deadlines():
 def cleanup_old_data():
     """Clean up old data according to retention policies"""
     
-    with get_session() as session:
+    with session_scope() as session:
         # Delete old email notifications (90 days)
         cutoff_date = datetime.utcnow() - timedelta(days=90)
         deleted_emails = session.query(EmailNotification).filter(
@@ -109,19 +111,43 @@ def cleanup_old_data():
             EmailNotification.status.in_(["sent", "failed"])
         ).delete()
         
-        # Archive old audit logs (1 year)
-        audit_cutoff = datetime.utcnow() - timedelta(days=365)
-        from ..models import AuditLog
-        old_audit_logs = session.query(AuditLog).filter(
-            AuditLog.created_at < audit_cutoff
-        ).all()
-        
-        # TODO: Move to archive storage instead of deletion
-        for log in old_audit_logs:
-            # Archive logic here
-            pass
-    
+        session.commit()
+
+    # Audit log / breach event retention: whole partitions, no row-by-row deletes
+    retention = enforce_log_retention()
+
     return {
         "deleted_emails": deleted_emails,
-        "archived_audit_logs": len(old_audit_logs)
+        **retention
     }
+
+def enforce_log_retention(now: datetime = None) -> dict:
+    now = now or datetime.utcnow()
+    cutoffs = {
+        "auditlog": now - timedelta(days=settings.audit_log_retention_days),
+        "breachevent": now - timedelta(days=settings.breach_event_retention_days),
+    }
+    with engine.begin() as conn:
+        return {
+            f"{table}_retired": partitions.drop_expired_partitions(conn, table, cutoff)
+            for table, cutoff in cutoffs.items()
+        }
+
+@shared_task(name="app.tasks.maintain_partitions")
+def maintain_partitions():
+    """Create upcoming monthly partitions and retire expired ones"""
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        created = {
+            table: partitions.ensure_partitions(conn, table, now)
+            for table in partitions.PARTITIONED_TABLES
+        }
+    return {"created": created, **enforce_log_retention(now)}
+
+@shared_task(name="app.tasks.abort_stale_uploads")
+def abort_stale_uploads():
+    """Abort export multipart uploads left open by crashed or cancelled tasks"""
+    from ..services.multipart import abort_stale_uploads as abort_uploads
+    from .ops import S3_BUCKET, s3
+    aborted = abort_uploads(s3(), S3_BUCKET, prefix="exports/", older_than=timedelta(hours=settings.upload_stale_hours))
+    return {"aborted": aborted}
@@ -1,84 +1,246 @@
-import os, json, csv, tempfile, zipfile, hashlib, time
+import os, time, random
+import logging
 from datetime import datetime
-import boto3, jwt
-import botocore.config as _bc
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
+import jwt
+import httpx
+from celery import chord
 from app.celery_app import celery_app
+from app.config import settings
+from app.services import storage
+from app.services.bundle_writer import check_formats, csv_chunks, json_chunks, record_entries
+from app.services.multipart import UploadCancelled
+from app.services.report_pdf import render_report
+from app.services.storage import AWS_KEY, S3_BUCKET
 
-S3_BUCKET   = os.environ.get("S3_BUCKET", "gdpr-hub-lite")
-S3_REGION   = os.environ.get("S3_REGION", "eu-central-1")
-S3_ENDPOINT = os.environ.get("S3_ENDPOINT_URL")
-AWS_KEY     = os.environ.get("AWS_ACCESS_KEY_ID")
-AWS_SEC     = os.environ.get("AWS_SECRET_ACCESS_KEY")
 DL_SECRET   = os.environ.get("DOWNLOAD_TOKEN_SECRET", "dev_download_secret")
 EXPORT_RETENTION_DAYS = int(os.environ.get("EXPORT_RETENTION_DAYS", "30"))
+EXPORT_FORMATS = os.environ.get("EXPORT_FORMATS", "json,csv").split(",")
+
+logger = logging.getLogger(__name__)
 
 def s3():
-	_cfg = _bc.Config(
-		s3={"addressing_style": "path"}, 
-		signature_version="s3v4", 
-		retries={"max_attempts": 5, "mode": "standard"}
-	)
-	return boto3.client(
-		"s3",
-		region_name=S3_REGION,
-		aws_access_key_id=AWS_KEY,
-		aws_secret_access_key=AWS_SEC,
-		endpoint_url=S3_ENDPOINT,
-		config=_cfg
-	)
-
-@celery_app.task(name="app.tasks.discover")
-def discover(request_id: str, shop_domain: str, subject_email: str = None, payload: dict = None):
-	return {"request_id": request_id, "findings": [{"source": "shopify", "objects": 3}]}
-
-@celery_app.task(name="app.tasks.package")
-def package(request_id: str, account_id: str, findings: dict):
-	with tempfile.TemporaryDirectory() as tmp:
-		report_pdf = f"{tmp}/report.pdf"
-		data_json  = f"{tmp}/data.json"
-		data_csv   = f"{tmp}/data.csv"
-		bundle_zip = f"{tmp}/{request_id}.zip"
-
-		c = canvas.Canvas(report_pdf, pagesize=A4)
-		c.drawString(50, 800, "GDPR Hub Lite – Denetçi Raporu")
-		c.drawString(50, 780, f"Request ID: {request_id}")
-		c.drawString(50, 760, f"UTC: {datetime.utcnow().isoformat()}Z")
-		c.drawString(50, 740, f"Bulgular: {json.dumps(findings)[:90]}...")
-		c.drawString(50, 720, f"SLA: T+0 (başlangıç), T+7 (ara), T+14 (tam), T+28 (kapanış)")
-		c.showPage(); c.save()
-
-		with open(data_json, "w", encoding="utf-8") as f:
-			json.dump(findings, f, ensure_ascii=False, indent=2)
-
-		with open(data_csv, "w", newline="", encoding="utf-8") as f:
-			w = csv.writer(f); w.writerow(["source","objects"])
-			for item in findings.get("findings", []):
-				w.writerow([item["source"], item["objects"]])
-
-		with zipfile.ZipFile(bundle_zip, "w", zipfile.ZIP_DEFLATED) as z:
-			z.write(report_pdf, "report.pdf")
-			z.write(data_json,  "data/data.json")
-			z.write(data_csv,   "data/data.csv")
-
-		sha256 = hashlib.sha256(open(bundle_zip, "rb").read()).hexdigest()
-		key = f"exports/{account_id}/{request_id}.zip"
-		
-		# Mock S3 upload (gerçek S3/R2 env'leri yoksa)
-		try:
-			s3().upload_file(bundle_zip, S3_BUCKET, key, ExtraArgs={"ContentType": "application/zip"})
-		except Exception as e:
-			print(f"Mock S3 upload: {key} (error: {e})")
-
-	token = jwt.encode({"k": key, "exp": int(time.time()) + 600}, DL_SECRET, algorithm="HS256")
-	result = {"key": key, "sha256": sha256, "download_token": token}
+	# Process başına paylaşılan, havuzlu client (fork'ta yeniden kurulur)
+	return storage.client()
+
+def download_token(key: str) -> str:
+	return jwt.encode({"k": key, "exp": int(time.time()) + 600}, DL_SECRET, algorithm="HS256")
+
+def release_export(progress):
+	"""Export bitti (done/failed/cancelled): aynı istek için yeni export'lar artık bu işe bağlanmaz"""
+	from app.services import export_cache
+	export_cache.release(progress.get("fingerprint"), progress.export_id)
+
+def _task_ids(signature) -> list:
+	if hasattr(signature, "tasks"):
+		return [i for task in signature.tasks for i in _task_ids(task)]
+	return [signature.freeze().id]
+
+def export_pipeline(request_id: str, account_id: str, subject_email: str, source_ids: list, formats: list = None,
+		then=None, export_id: str = None):
+	"""Kaynak başına bir fetch task'ı (paralel), sonuçları package_sources birleştirir; `then` package sonucunu alır"""
+	formats = check_formats(formats or EXPORT_FORMATS)
+	options = {"export_id": export_id}
+	header = [fetch_source.s(request_id, account_id, source_id, subject_email, formats, **options) for source_id in source_ids]
+	if header:
+		body = package_sources.s(request_id, account_id, formats, subject_email, **options)
+	else:
+		body = package_sources.si([], request_id, account_id, formats, subject_email, **options)
+	if then is not None:
+		body = body | then
+
+	# İlerleme ve iptal: task id'leri önceden atanır, iptalde henüz başlamamış olanlar revoke edilir
+	if export_id:
+		from app.services.export_progress import ExportProgress
+		progress = ExportProgress(export_id)
+		progress.remember("tasks", *[i for sig in header for i in _task_ids(sig)], *_task_ids(body))
+		progress.set(state="fetching" if header else "packaging", sources_total=len(header))
+	return chord(header, body) if header else body
+
+@celery_app.task(name="app.tasks.discover", bind=True)
+def discover(self, request_id: str, shop_domain: str, subject_email: str = None, payload: dict = None, formats: list = None):
+	from app.services import export_cache
+	from app.services.export_progress import ExportProgress
+	from app.services.fetch import active_sources, source_stamps
+	account_id, source_ids = active_sources(request_id, shop_domain)
+	if account_id is None or not subject_email:
+		return {"request_id": request_id, "findings": [], "error": "no account or subject for request"}
+	# Tekrar gelen webhook: aynı istek için biten export'un sonucu ya da çalışan export döner
+	fingerprint = export_cache.request_fingerprint(request_id, None, subject_email, formats, source_stamps(source_ids))
+	claim = export_cache.claim(fingerprint, self.request.id)
+	if claim.result:
+		return {"request_id": request_id, "export_id": claim.result["export_id"], "key": claim.result["key"], "cached": True}
+	if claim.export_id != self.request.id:
+		return {"request_id": request_id, "export_id": claim.export_id, "coalesced": True}
+	ExportProgress(self.request.id).start(request_id=request_id, account_id=account_id, state="queued", fingerprint=fingerprint)
+	pipeline = export_pipeline(request_id, account_id, subject_email, source_ids, formats, export_id=self.request.id)
+	pipeline.apply_async()
+	return {"request_id": request_id, "sources": len(source_ids), "export_id": self.request.id}
+
+@celery_app.task(name="app.tasks.fetch_source", bind=True, max_retries=None, acks_late=True)
+def fetch_source(self, request_id: str, account_id: str, source_id: int, subject_email: str, formats: list,
+		attempt: int = 0, queued_at: float = None, export_id: str = None):
+	from app.services import fetch
+	from app.services.cas import CasStore
+	from app.services.connectors import SourceThrottled
+	from app.services.export_progress import ExportCancelled, ExportProgress
+	queued_at = queued_at or time.time()
+	progress = ExportProgress(export_id)
+	retry_kwargs = {"attempt": attempt, "queued_at": queued_at, "export_id": export_id}
+
+	def done(result):
+		progress.add(sources_done=1)
+		progress.flush()
+		return result
+
+	source = fetch.load_source(source_id)
+	if progress.cancelled():
+		return done([])
+	if source is None:
+		return done(fetch.failed(f"source-{source_id}", "data source not found"))
+
+	# Kaynak başına eşzamanlı fetch sınırı (tüm worker'larda): slot yoksa kısa bir süre sonra tekrar dene
+	slots, holder = fetch.SourceSlots(), self.request.id or f"{request_id}:{source_id}"
+	if not slots.acquire(source_id, fetch.concurrency_limit(source), holder):
+		if time.time() - queued_at > settings.fetch_slot_wait_s:
+			return done(fetch.failed(source, "no fetch slot within FETCH_SLOT_WAIT_S"))
+		raise self.retry(countdown=random.uniform(2, 6), kwargs=retry_kwargs)
+	try:
+		result = fetch.fetch_source(CasStore(s3(), S3_BUCKET), source, account_id, subject_email, formats, progress)
+	except ExportCancelled:
+		result = []
+	except (SourceThrottled, httpx.TransportError, httpx.HTTPStatusError) as e:
+		# Geçici hata: backoff ile retry; hakkı bitince kaynak hatalı raporlanır, diğer kaynaklar etkilenmez
+		if attempt < settings.fetch_max_retries:
+			countdown = e.retry_after if isinstance(e, SourceThrottled) else 10 * 2 ** attempt
+			raise self.retry(countdown=countdown, kwargs=dict(retry_kwargs, attempt=attempt + 1))
+		result = fetch.failed(source, e)
+	except Exception as e:
+		logger.warning("fetch failed for request %s, source %s: %s", request_id, source_id, e, exc_info=True)
+		result = fetch.failed(source, e)
+	finally:
+		slots.release(source_id, holder)
+	return done(result)
+
+@celery_app.task(name="app.tasks.package_sources", bind=True, max_retries=3)
+def package_sources(self, results: list, request_id: str, account_id: str, formats: list = None,
+		subject_email: str = None, export_id: str = None):
+	from app.services.cas import CasStore
+	from app.services.export_progress import ExportProgress
+	from app.services.fetch import merge_findings
+	progress = ExportProgress(export_id)
+	if progress.cancelled():
+		progress.set(state="cancelled")
+		release_export(progress)
+		return {"cancelled": True}
+	items, failed = merge_findings(CasStore(s3(), S3_BUCKET), results)
+	findings = {"request_id": request_id, "subject_email": subject_email, "findings": items, "failed_sources": failed}
+	return _package(self, request_id, account_id, findings, formats, subject_email, progress)
+
+@celery_app.task(name="app.tasks.package", bind=True, max_retries=3)
+def package(self, request_id: str, account_id: str, findings: dict, formats: list = None, subject_email: str = None):
+	return _package(self, request_id, account_id, findings, formats, subject_email)
+
+def _package(task, request_id: str, account_id: str, findings: dict, formats: list = None, subject_email: str = None,
+		progress=None):
+	from celery.exceptions import Retry
+	from app.services.export_progress import ExportCancelled, ExportProgress
+	progress = progress or ExportProgress()
+	try:
+		result = _package_bundle(task, request_id, account_id, findings, formats, subject_email, progress)
+	except (ExportCancelled, UploadCancelled):
+		# Spool dosyaları store_bundle'da kapanır, yarım multipart upload abort edilir
+		progress.set(state="cancelled")
+		result = {"cancelled": True}
+	except Retry:
+		raise
+	except Exception as e:
+		progress.set(state="failed", error=str(e))
+		release_export(progress)
+		raise
+	release_export(progress)
+	return result
+
+def _package_bundle(task, request_id, account_id, findings, formats, subject_email, progress):
+	from app.services import export_cache
+	from app.services.cas import CasStore
+	from app.services.compression import queue_backlog
+	formats = check_formats(formats or EXPORT_FORMATS)
+	subject_email = subject_email or findings.get("subject_email")
+	items = findings.get("findings", [])
+
+	# Aynı istek + aynı bulgular (kaynak fingerprint'leri, stage edilmiş kayıtların içerik hash'i):
+	# bundle hâlâ duruyorsa render/paketleme atlanır, yalnızca yeni indirme token'ı verilir
+	request_fp, findings_fp = progress.get("fingerprint"), None
+	if request_fp and not findings.get("failed_sources"):
+		findings_fp = export_cache.findings_fingerprint(request_fp, items)
+		cached = export_cache.lookup(findings_fp)
+		if cached and CasStore(s3(), S3_BUCKET).has(cached["key"]):
+			export_cache.store(request_fp, findings_fp, cached["key"], cached["sha256"], progress.export_id)
+			progress.set(state="done", bundle_key=cached["key"])
+			return {"key": cached["key"], "sha256": cached["sha256"], "download_token": download_token(cached["key"]), "cached": True}
+
+	# Kaynak bazında kayıtlar/fingerprint geldiyse: artımlı export, değişmeyen kaynaklar snapshot'tan eklenir
+	incremental = None
+	if subject_email and any("records" in item or "fingerprint" in item for item in items):
+		from app.services.snapshots import IncrementalExport, SnapshotStore
+		incremental = IncrementalExport(SnapshotStore(s3(), S3_BUCKET), account_id, subject_email, formats)
+		summary = [{k: v for k, v in item.items() if k not in ("records", "records_key")} for item in items]
+		findings = dict(findings, findings=summary)
+
+	# Zip tek geçişte yazılır ve yüklenir; içerik adresine (cas/bundles/<digest>.zip) sunucu tarafında kopyalanır
+	entries = [("report.pdf", [render_report(request_id, findings)])]
+	if "json" in formats:
+		entries.append(("data/data.json", json_chunks(findings)))
+	if "csv" in formats:
+		entries.append(("data/data.csv", csv_chunks(["source", "objects"], (
+			(item["source"], item.get("objects", len(item.get("records") or []))) for item in items
+		))))
+	if incremental:
+		entries.extend(incremental.entries("data/sources/", items))
+	else:
+		entries.extend(record_entries("data/", {"findings": items}, formats))
+	# İlerleme: entry başına bir adım, zip son adım (retry'da sayaçlar sıfırlanır)
+	progress.set(state="packaging", entries_total=len(entries) + 1, entries_done=0, bytes_written=0, bytes_uploaded=0)
+	# Sıkıştırma seviyeleri kuyruk birikimine göre seçilir: birikim export başına bir kez okunur ve
+	# progress hash'inde saklanır, retry aynı seviyelerle aynı byte'ları üretir
+	backlog = progress.get("compression_backlog")
+	if backlog is None:
+		backlog = queue_backlog()
+		progress.set(compression_backlog=backlog)
+	bundle, key = CasStore(s3(), S3_BUCKET, progress).store_bundle(
+		account_id, request_id, entries, archive=settings.bundle_archive_zstd, backlog=int(backlog))
+	progress.flush()
+	sha256 = bundle.sha256
+	if isinstance(bundle.upload_error, UploadCancelled):
+		raise bundle.upload_error
+	if incremental:
+		incremental.save()
+
+	# Upload yarıda kaldıysa retry: tamamlanan part'lar checkpoint'ten devam eder
+	if bundle.upload_error and AWS_KEY:
+		raise task.retry(exc=bundle.upload_error, countdown=30 * (task.request.retries + 1))
+
+	# Mock S3 upload (gerçek S3/R2 env'leri yoksa)
+	if bundle.upload_error:
+		print(f"Mock S3 upload: {key} (error: {bundle.upload_error})")
+
+	result = {"key": key, "sha256": sha256, "download_token": download_token(key)}
+	if incremental:
+		result.update(reused=incremental.reused, rebuilt=incremental.rebuilt)
+	# Üye başına sıkıştırma oranı/süresi (mevcut bundle yeniden kullanıldıysa boş)
+	if bundle.members:
+		result["compression"] = bundle.compression()
+	if findings.get("failed_sources"):
+		result["failed_sources"] = findings["failed_sources"]
+	elif not bundle.upload_error:
+		export_cache.store(request_fp, findings_fp, key, sha256, progress.export_id)
+	progress.set(state="done", bundle_key=key)
 	
 	# Audit event kaydet
 	try:
 		from app.models import AuditEvent
-		from app.database import get_session
-		with get_session() as sess:
+		from app.database import session_scope
+		with session_scope() as sess:
 			audit = AuditEvent(
 				request_id=request_id,
 				account_id=account_id,
@@ -93,8 +255,30 @@ def package(request_id: str, account_id: str, findings: dict):
 	
 	return result
 
+@celery_app.task(name="app.tasks.cleanup_cancelled_export")
+def cleanup_cancelled_export(export_id: str):
+	"""İptal edilen export'un artıkları: ölen task'lardan kalan multipart upload'lar ve stage edilmiş kayıtlar"""
+	from datetime import timedelta
+	from app.services.cas import CasStore, collect_garbage
+	from app.services.export_progress import ExportProgress
+	from app.services.multipart import abort_stale_uploads
+	progress = ExportProgress(export_id)
+	client = s3()
+	aborted = sum(abort_stale_uploads(client, S3_BUCKET, prefix=key, older_than=timedelta(0)) for key in progress.members("uploads"))
+	# Stage edilmiş kayıtlar kişisel veri: referans almamış olanlar hemen silinir
+	deleted = collect_garbage(CasStore(client, S3_BUCKET), grace=timedelta(0), keys=progress.members("staged"))
+	if progress.state() == "cancelling":
+		progress.set(state="cancelled")
+	release_export(progress)
+	return {"export_id": export_id, "aborted_uploads": aborted, "deleted_objects": deleted}
+
 @celery_app.task(name="app.tasks.erase")
 def erase(request_id: str, shop_domain: str, payload: dict):
+	# Artımlı export snapshot'ları da kişisel veri: silme talebinde hepsi gider
+	email = (payload.get("customer") or {}).get("email") or payload.get("email")
+	if email:
+		from app.services.snapshots import SnapshotStore, forget_subject
+		forget_subject(SnapshotStore(s3(), S3_BUCKET), email)
 	return {"request_id": request_id, "erased": True}
 
 @celery_app.task(name="app.tasks.cleanup_exports")
@@ -104,17 +288,20 @@ def cleanup_exports():
 	cutoff_date = datetime.utcnow() - timedelta(days=EXPORT_RETENTION_DAYS)
 	
 	try:
-		# S3'ten eski dosyaları sil
-		response = s3().list_objects_v2(Bucket=S3_BUCKET, Prefix="exports/")
-		for obj in response.get('Contents', []):
-			if obj['LastModified'].replace(tzinfo=None) < cutoff_date:
-				s3().delete_object(Bucket=S3_BUCKET, Key=obj['Key'])
-				print(f"Deleted old export: {obj['Key']}")
+		# Süresi dolan manifest'ler ve snapshot'lar referanslarını bırakır; refcount'u 0 kalan CAS nesneleri silinir
+		from app.services.cas import CasStore, collect_garbage, collect_staging, release_expired_manifests
+		from app.services.snapshots import expire_snapshots
+		released = release_expired_manifests(timedelta(days=EXPORT_RETENTION_DAYS))
+		expired = expire_snapshots(timedelta(days=EXPORT_RETENTION_DAYS))
+		collected = collect_garbage(CasStore(s3(), S3_BUCKET))
+		# Ölen export'ların yayınlanmamış zip'leri de kişisel veri
+		staged = collect_staging(CasStore(s3(), S3_BUCKET))
+		print(f"Released {released} manifests, expired {expired} source snapshots, deleted {collected} CAS objects and {staged} staged bundles")
 		
 		# Database'den eski audit event'leri temizle
 		from app.models import AuditEvent
-		from app.database import get_session
-		with get_session() as sess:
+		from app.database import session_scope
+		with session_scope() as sess:
 			deleted = sess.query(AuditEvent).filter(
 				AuditEvent.created_at < cutoff_date,
 				AuditEvent.event_type == "package_created"
@@ -0,0 +1,135 @@
+"""
+Shared fixtures: a temporary SQLite database (set up before `app` is
+imported, since the engines are built at import time), an in-memory Redis
+for every test, an in-memory Celery broker, a moto S3 bucket for the tests
+that ask for one, and API clients for the routers under test.
+"""
+import os
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix="gdpr-hub-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/test.db"
+os.environ["APP_ENV"] = "test"
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from datetime import datetime, timedelta
+import fakeredis
+import httpx
+import pytest
+import redis
+import redis.asyncio as aioredis
+from fastapi import FastAPI
+from moto import mock_aws
+from sqlalchemy import delete
+from sqlmodel import SQLModel, Session
+
+from app import database
+from app.celery_app import celery_app
+from app.auth import get_current_user, verify_token
+from app.database import create_db_and_tables, engine
+from app.models import DSARRequest, User
+from app.services import compression, events, export_cache, export_links, export_progress, storage
+from app.services.request_stats import record_status_change
+
+# Queued tasks stay in memory; tests call task bodies directly when they need them
+celery_app.conf.update(broker_url="memory://", result_backend="cache+memory://")
+celery_app.set_default()  # shared_task resolves the app per thread (background tasks run in a pool)
+
+REDIS_CLIENTS = [
+    (compression, "_client"), (export_cache, "_client"), (export_links, "_client"),
+    (export_progress, "_sync_client"), (export_progress, "_async_client"),
+    (events, "_sync_client"), (events, "_async_client"),
+]
+
+@pytest.fixture(scope="session", autouse=True)
+def _schema():
+    create_db_and_tables()
+    yield
+
+@pytest.fixture(autouse=True)
+def _clean_tables():
+    yield
+    with Session(engine) as session:
+        for table in reversed(SQLModel.metadata.sorted_tables):
+            session.execute(delete(table))
+        session.commit()
+
+@pytest.fixture(autouse=True)
+def redis_server(monkeypatch):
+    """Every Redis client the app builds talks to one in-memory server per test."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url",
+                        classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server)))
+    monkeypatch.setattr(aioredis, "from_url", lambda url, **kwargs: fakeredis.FakeAsyncRedis(server=server))
+    for module, name in REDIS_CLIENTS:
+        monkeypatch.setattr(module, name, None)
+    monkeypatch.setattr(database.replica_router, "_redis", None)
+    return server
+
+@pytest.fixture
+def redis_client(redis_server):
+    return fakeredis.FakeRedis(server=redis_server)
+
+@pytest.fixture
+def s3():
+    """The app's shared S3 client, talking to moto; the export bucket exists and is empty."""
+    with mock_aws():
+        storage._reset()
+        client = storage.client()
+        client.create_bucket(
+            Bucket=storage.bucket(),
+            CreateBucketConfiguration={"LocationConstraint": client.meta.region_name},
+        )
+        yield client
+    storage._reset()
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def user():
+    with Session(engine) as session:
+        row = User(email="owner@example.com", full_name="Owner", company_name="Acme")
+        session.add(row)
+        session.commit()
+        return row.id
+
+@pytest.fixture
+def other_user():
+    with Session(engine) as session:
+        row = User(email="other@example.com", full_name="Other", company_name="Other Co")
+        session.add(row)
+        session.commit()
+        return row.id
+
+@pytest.fixture
+def make_request():
+    """Insert a DSARRequest (counted in the tenant's status counters); returns the row."""
+    def make(user_id: int, **fields) -> DSARRequest:
+        fields.setdefault("request_type", "access")
+        fields.setdefault("subject_email", "subject@example.com")
+        fields.setdefault("subject_name", "Subject")
+        fields.setdefault("due_date", datetime.utcnow() + timedelta(days=30))
+        with Session(engine) as session:
+            row = DSARRequest(user_id=user_id, **fields)
+            session.add(row)
+            record_status_change(session, user_id, None, row.status)
+            session.commit()
+            session.refresh(row)
+            return row
+    return make
+
+@pytest.fixture
+def api(user):
+    """httpx client for an app with the given routers, authenticated as `user`."""
+    def build(*routers, user_id=user) -> httpx.AsyncClient:
+        app = FastAPI()
+        for router in routers:
+            app.include_router(router)
+        app.dependency_overrides[verify_token] = lambda: str(user_id)
+        app.dependency_overrides[get_current_user] = lambda: str(user_id)
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    return build
@@ -0,0 +1,78 @@
+import io
+import json
+import threading
+import pytest
+from sqlmodel import Session, select
+from app.config import settings
+from app.database import engine
+from app.models import DSARRequest
+from app.requests import router
+from app.services import bulk_ingest
+
+pytestmark = pytest.mark.anyio
+
+NDJSON = {"content-type": "application/x-ndjson"}
+
+def _results(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+async def test_ndjson_rows_are_inserted_or_reported(api, user):
+    body = "\n".join([
+        json.dumps({"subject_email": "a@example.com", "subject_name": "A", "additional_info": {"shop_domain": "a.shop"}}),
+        json.dumps({"subject_email": "b@example.com"}),
+        "{not json",
+        json.dumps({"subject_email": "c@example.com", "subject_name": "C", "request_type": "deletion"}),
+    ])
+    response = await api(router).post("/api/v1/requests/bulk", content=body, headers=NDJSON)
+    assert response.status_code == 200
+
+    results = _results(response)
+    assert results[-1] == {"summary": {"created": 2, "failed": 2}}
+    errors = {r["line"]: r["error"] for r in results[:-1] if not r["ok"]}
+    assert errors[2] == "subject_name is required"
+    assert errors[3].startswith("invalid json")
+
+    with Session(engine) as session:
+        rows = session.exec(select(DSARRequest).where(DSARRequest.user_id == user)).all()
+    assert sorted(r.subject_email for r in rows) == ["a@example.com", "c@example.com"]
+    assert {r.source for r in rows} == {"import"}
+    stats = (await api(router).get("/api/v1/requests/stats")).json()
+    assert stats["pending"] == 2
+
+async def test_csv_with_quoted_multiline_field(api):
+    body = 'subject_email,subject_name,description\na@example.com,A,"two\nlines"\nb@example.com,B\n'
+    response = await api(router).post("/api/v1/requests/bulk", content=body, headers={"content-type": "text/csv"})
+    results = _results(response)
+    assert results[-1] == {"summary": {"created": 1, "failed": 1}}
+    by_line = {r["line"]: r for r in results[:-1]}
+    assert by_line[3]["ok"]
+    assert by_line[4]["error"] == "expected 3 columns, got 2"
+
+async def test_too_many_rows_is_413_before_any_insert(api, user, monkeypatch):
+    monkeypatch.setattr(settings, "bulk_max_rows", 2)
+    body = "".join(json.dumps({"subject_email": f"{i}@example.com", "subject_name": "S"}) + "\n" for i in range(5))
+    response = await api(router).post("/api/v1/requests/bulk", content=body, headers=NDJSON)
+    assert response.status_code == 413
+    with Session(engine) as session:
+        assert session.exec(select(DSARRequest).where(DSARRequest.user_id == user)).all() == []
+
+async def test_declared_length_over_limit_is_413(api, monkeypatch):
+    monkeypatch.setattr(settings, "bulk_max_bytes", 10)
+    response = await api(router).post("/api/v1/requests/bulk", content=b"x" * 64, headers=NDJSON)
+    assert response.status_code == 413
+
+async def test_unknown_content_type_is_415(api):
+    response = await api(router).post("/api/v1/requests/bulk", content=b"{}", headers={"content-type": "text/plain"})
+    assert response.status_code == 415
+
+async def test_spooled_body_is_read_off_the_event_loop():
+    class Spool(io.BytesIO):
+        readers = set()
+
+        def read(self, size=-1):
+            self.readers.add(threading.get_ident())
+            return super().read(size)
+    spool = Spool(b"x" * (bulk_ingest.READ_CHUNK_BYTES + 1))
+    chunks = [chunk async for chunk in bulk_ingest.iter_chunks(spool)]
+    assert [len(c) for c in chunks] == [bulk_ingest.READ_CHUNK_BYTES, 1] and spool.closed
+    assert threading.get_ident() not in Spool.readers
@@ -0,0 +1,107 @@
+import pytest
+from sqlmodel import Session, select
+from app.database import engine
+from app.models import DSARRequest, RequestStatusCounter
+from app.requests import router
+from app.services import bulk_status
+from app.services.collection_versions import REQUESTS, get_version
+
+pytestmark = pytest.mark.anyio
+
+def _counters(user_id):
+    with Session(engine) as session:
+        rows = session.exec(
+            select(RequestStatusCounter.status, RequestStatusCounter.count)
+            .where(RequestStatusCounter.user_id == user_id)
+        ).all()
+    return {status: count for status, count in rows if count}
+
+def _outcomes(result):
+    return {r["request_id"]: r["outcome"] for r in result["results"]}
+
+def test_per_id_outcomes(user, other_user, make_request):
+    pending = make_request(user)
+    done = make_request(user, status="completed")
+    foreign = make_request(other_user)
+    ids = [pending.request_id, done.request_id, foreign.request_id, "missing"]
+    with Session(engine) as session:
+        result = bulk_status.transition_requests(session, user, "completed", request_ids=ids)
+        session.commit()
+
+    assert result["updated"] == 1
+    # Caller's order; another tenant's row is indistinguishable from a missing one
+    assert list(_outcomes(result).items()) == [
+        (pending.request_id, "updated"), (done.request_id, "unchanged"),
+        (foreign.request_id, "not_found"), ("missing", "not_found"),
+    ]
+    assert result["results"][0]["version"] == 2
+    with Session(engine) as session:
+        row = session.get(DSARRequest, pending.id)
+        assert row.status == "completed" and row.completed_at is not None and row.version == 2
+        assert session.get(DSARRequest, foreign.id).status == "pending"
+    assert _counters(user) == {"completed": 2}
+
+def test_stale_versions_and_from_status_conflict(user, make_request):
+    fresh, stale, rejected = make_request(user), make_request(user), make_request(user, status="rejected")
+    with Session(engine) as session:
+        result = bulk_status.transition_requests(
+            session, user, "processing",
+            request_ids=[fresh.request_id, stale.request_id, rejected.request_id],
+            from_status="pending",
+            versions={fresh.request_id: 1, stale.request_id: 0},
+        )
+        session.commit()
+    assert _outcomes(result) == {
+        fresh.request_id: "updated", stale.request_id: "conflict", rejected.request_id: "conflict",
+    }
+    with Session(engine) as session:
+        assert session.get(DSARRequest, stale.id).version == 1
+
+def test_concurrent_change_is_a_conflict_not_an_overwrite(monkeypatch, user, make_request):
+    row = make_request(user)
+    real_execute = Session.execute
+
+    def execute(session, statement, *args, **kwargs):
+        if getattr(statement, "is_update", False):
+            # The row moves on between the SELECT and the guarded UPDATE (on
+            # SQLite, inside the same transaction: another writer can't get in)
+            session.connection().exec_driver_sql("UPDATE dsarrequest SET version = 5 WHERE id = ?", (row.id,))
+        return real_execute(session, statement, *args, **kwargs)
+    monkeypatch.setattr(Session, "execute", execute)
+    with Session(engine) as session:
+        result = bulk_status.transition_requests(session, user, "completed", request_ids=[row.request_id])
+        session.commit()
+    assert result["updated"] == 0
+    assert _outcomes(result) == {row.request_id: "conflict"}
+
+def test_filter_selects_rows_not_already_in_the_target(user, make_request):
+    make_request(user, request_type="erasure")
+    make_request(user, request_type="erasure", status="rejected")
+    make_request(user, request_type="access")
+    with Session(engine) as session:
+        before = get_version(session, user, REQUESTS)
+        result = bulk_status.transition_requests(
+            session, user, "rejected", filters={"request_type": "erasure"},
+        )
+        session.commit()
+        assert result["updated"] == 1 and len(result["results"]) == 1
+        assert get_version(session, user, REQUESTS) == before + 1
+    assert _counters(user) == {"pending": 1, "rejected": 2}
+
+def test_invalid_status():
+    with Session(engine) as session, pytest.raises(ValueError):
+        bulk_status.transition_requests(session, 1, "archived", request_ids=["x"])
+
+async def test_bulk_status_endpoint(api, user, make_request):
+    rows = [make_request(user) for _ in range(3)]
+    client = api(router)
+    response = await client.post("/api/v1/requests/bulk-status", json={
+        "status": "completed", "request_ids": [r.request_id for r in rows],
+    })
+    assert response.status_code == 200
+    assert response.json()["updated"] == 3
+
+    neither = await client.post("/api/v1/requests/bulk-status", json={"status": "completed"})
+    assert neither.status_code == 422
+    invalid = await client.post("/api/v1/requests/bulk-status", json={"status": "nope", "request_ids": ["x"]})
+    assert invalid.status_code == 400
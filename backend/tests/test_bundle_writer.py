@@ -0,0 +1,77 @@
+import hashlib
+import io
+import os
+import zipfile
+import pytest
+from app.services import bundle_writer, storage
+from app.services.bundle_writer import BundleAborted, FIXED_DATE_TIME, stream_bundle
+
+def _entries():
+    yield "report.json", bundle_writer.json_chunks({"subject": "ayse@example.com", "orders": list(range(500))})
+    yield "orders.csv", bundle_writer.csv_chunks(["id", "total"], ([i, i * 1.5] for i in range(20_000)))
+
+def _collect():
+    received = []
+
+    def upload(fileobj):
+        while chunk := fileobj.read(bundle_writer.CHUNK_BYTES):
+            received.append(chunk)
+    return received, upload
+
+def test_hash_and_size_match_the_uploaded_bytes():
+    received, upload = _collect()
+    result = stream_bundle(_entries(), upload)
+    data = b"".join(received)
+    assert result.upload_error is None
+    assert (result.size, result.sha256) == (len(data), hashlib.sha256(data).hexdigest())
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        assert z.namelist() == ["report.json", "orders.csv"]
+        assert z.read("orders.csv").decode().splitlines()[:2] == ["id,total", "0,0.0"]
+    assert [m.name for m in result.members] == ["report.json", "orders.csv"]
+
+def test_fixed_timestamps_are_reproducible():
+    first = stream_bundle(_entries(), date_time=FIXED_DATE_TIME)
+    assert stream_bundle(_entries(), date_time=FIXED_DATE_TIME).sha256 == first.sha256
+
+def test_upload_failure_is_returned_and_the_bundle_still_hashed():
+    def upload(fileobj):
+        fileobj.read(10)
+        raise ConnectionError("store down")
+    result = stream_bundle(_entries(), upload, date_time=FIXED_DATE_TIME)
+    assert isinstance(result.upload_error, ConnectionError)
+    assert result.sha256 == stream_bundle(_entries(), date_time=FIXED_DATE_TIME).sha256
+
+def _failing_entries(after_bytes):
+    def chunks():
+        yield os.urandom(after_bytes)
+        raise RuntimeError("source query failed")
+    yield "data.bin", chunks()
+
+def test_writer_failure_reaches_the_reader_as_aborted():
+    seen = []
+
+    def upload(fileobj):
+        try:
+            while fileobj.read(bundle_writer.CHUNK_BYTES):
+                pass
+        except BundleAborted as e:
+            seen.append(e)
+            raise
+    with pytest.raises(RuntimeError, match="source query failed"):
+        stream_bundle(_failing_entries(1000), upload)
+    assert len(seen) == 1
+
+def test_writer_failure_leaves_no_object_and_no_open_upload(s3):
+    bucket = storage.bucket()
+    upload = bundle_writer.s3_uploader(s3, bucket, "bundles/failed.zip")
+    # More than one part (8 MB) goes out before the source fails
+    with pytest.raises(RuntimeError):
+        stream_bundle(_failing_entries(12 * 1024 * 1024), upload)
+    assert s3.list_objects_v2(Bucket=bucket)["KeyCount"] == 0
+    assert s3.list_multipart_uploads(Bucket=bucket).get("Uploads", []) == []
+
+def test_bundle_lands_under_its_key(s3):
+    bucket = storage.bucket()
+    result = stream_bundle(_entries(), bundle_writer.s3_uploader(s3, bucket, "bundles/ok.zip"))
+    body = s3.get_object(Bucket=bucket, Key="bundles/ok.zip")["Body"].read()
+    assert hashlib.sha256(body).hexdigest() == result.sha256
@@ -0,0 +1,133 @@
+import io
+import os
+import zipfile
+from datetime import timedelta
+import boto3
+import botocore.config
+import pytest
+from sqlmodel import Session, select
+from app.database import engine
+from app.models import CasObject, ExportManifest
+from app.services import cas, storage
+from app.services.cas import CasStore, blob_key, collect_garbage, collect_staging, release_expired_manifests
+
+class CountingClient:
+    """Delegates to the real client, counting uploads and downloads."""
+
+    def __init__(self, client):
+        self._client, self.uploads, self.downloads = client, 0, 0
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def get_object(self, **kwargs):
+        self.downloads += 1
+        return self._client.get_object(**kwargs)
+
+    def put_object(self, **kwargs):
+        self.uploads += 1
+        return self._client.put_object(**kwargs)
+
+    def create_multipart_upload(self, **kwargs):
+        self.uploads += 1
+        return self._client.create_multipart_upload(**kwargs)
+
+@pytest.fixture
+def client(s3):
+    return CountingClient(s3)
+
+@pytest.fixture
+def spools(monkeypatch):
+    """Every Spooled the store opens, to check they are all closed."""
+    opened = []
+    real = cas.Spooled.__init__
+
+    def init(self, *args, **kwargs):
+        real(self, *args, **kwargs)
+        opened.append(self)
+    monkeypatch.setattr(cas.Spooled, "__init__", init)
+    return opened
+
+def _entries(orders=b"id,total\n1,10\n"):
+    return [("report.json", [b'{"subject": "a@example.com"}']), ("orders.csv", [orders])]
+
+def _objects(s3):
+    return sorted(o["Key"] for o in s3.list_objects_v2(Bucket=storage.bucket()).get("Contents", []))
+
+def test_bundle_is_written_and_uploaded_in_one_pass(client, s3, spools):
+    store = CasStore(client, storage.bucket())
+    result, key = store.store_bundle("shop-1", "r1", _entries())
+    assert result.upload_error is None and key.startswith(cas.BUNDLE_PREFIX)
+    # Only the ZIP went up: no entry blobs, no spool files, nothing read back, no staging left
+    assert _objects(s3) == [key] and client.uploads == 1 and client.downloads == 0
+    assert spools == []
+
+    body = s3.get_object(Bucket=storage.bucket(), Key=key)["Body"].read()
+    with zipfile.ZipFile(io.BytesIO(body)) as z:
+        assert z.read("orders.csv") == b"id,total\n1,10\n"
+
+    # Identical content: the stored bundle is kept and the new copy dropped
+    again, same_key = store.store_bundle("shop-1", "r2", _entries())
+    assert (same_key, again.sha256) == (key, result.sha256) and _objects(s3) == [key]
+
+    _, other = store.store_bundle("shop-1", "r3", _entries(b"id,total\n1,11\n"))
+    assert other != key and _objects(s3) == sorted([key, other])
+
+def test_large_bundles_are_copied_server_side(client, s3):
+    data = os.urandom(9 << 20)
+    result, key = CasStore(client, storage.bucket()).store_bundle("shop-1", "r1", [("blob.bin", [data])])
+    assert result.upload_error is None and _objects(s3) == [key]
+    assert s3.head_object(Bucket=storage.bucket(), Key=key)["ContentLength"] == result.size > len(data)
+
+def test_manifests_hold_references_until_released(client, s3):
+    store = CasStore(client, storage.bucket())
+    # An entry whose bytes are already a stored blob (e.g. a stitched snapshot) is referenced too
+    report = cas.Spooled([b'{"subject": "a@example.com"}'])
+    report_key = store.put(report)
+    report.close()
+    _, key = store.store_bundle("shop-1", "r1", _entries())
+    store.store_bundle("shop-1", "r2", _entries())
+    with Session(engine) as session:
+        assert session.get(CasObject, key).refcount == 2
+        assert session.get(CasObject, report_key).refcount == 2
+        manifest = session.exec(select(ExportManifest)).first()
+        assert [(e["name"], e["stored"]) for e in manifest.entries] == [("report.json", True), ("orders.csv", False)]
+        assert "compression" in manifest.entries[0]
+
+    assert release_expired_manifests(timedelta(days=1)) == 0
+    assert collect_garbage(store, grace=timedelta(0)) == 0
+    assert release_expired_manifests(timedelta(0)) == 2
+    # Unreferenced objects wait out the grace period
+    assert collect_garbage(store) == 0
+    assert collect_garbage(store, grace=timedelta(0)) == 2
+    assert _objects(s3) == []
+
+def test_archive_copy(client, s3, spools):
+    result, _ = CasStore(client, storage.bucket()).store_bundle("shop-1", "r1", _entries(), archive=True)
+    with Session(engine) as session:
+        entries = session.exec(select(ExportManifest)).one().entries
+    archive = entries[-1]
+    assert archive["name"] == cas.ARCHIVE_ENTRY and archive["compression"]["method"] == "zstd"
+    assert archive["stored"] and blob_key(archive["sha256"]) in _objects(s3)
+    assert spools and all(spool.file.closed for spool in spools)
+
+def test_without_an_object_store_the_bundle_is_still_written(spools):
+    # Nothing listens on the endpoint: every call fails with a BotoCoreError
+    offline = boto3.client(
+        "s3", endpoint_url="http://127.0.0.1:9", region_name="us-east-1",
+        config=botocore.config.Config(retries={"max_attempts": 1}, connect_timeout=0.2),
+    )
+    result, key = CasStore(offline, storage.bucket()).store_bundle("shop-1", "r1", _entries())
+    assert result.upload_error is not None and result.size > 0 and key.startswith(cas.BUNDLE_PREFIX)
+    assert spools == []
+    with Session(engine) as session:
+        assert session.exec(select(CasObject)).all() == []
+        assert session.exec(select(ExportManifest)).all() == []
+
+def test_abandoned_staging_objects_are_collected(s3):
+    store = CasStore(s3, storage.bucket())
+    staged = cas.staging_key("shop-1", "r1", "e1")
+    s3.put_object(Bucket=storage.bucket(), Key=staged, Body=b"zip")
+    assert collect_staging(store) == 0  # may still be publishing
+    assert collect_staging(store, older_than=timedelta(0)) == 1
+    assert _objects(s3) == []
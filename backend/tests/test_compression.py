@@ -0,0 +1,98 @@
+import io
+import os
+import tarfile
+import zipfile
+import pyarrow as pa
+import pytest
+from app.config import settings
+from app.services import cas
+from app.services.bundle_writer import stream_bundle, write_bundle
+from app.services.compression import CompressionPolicy, peek, queue_backlog, write_archive
+from app.services.export_progress import ExportProgress
+from app.tasks import ops
+
+TEXT = b"order,total,currency\n" * 2000
+
+@pytest.mark.parametrize("size, level", [(10_000, 9), (10 << 20, 6), (100 << 20, 3), (1 << 30, 1), (None, 6)])
+def test_level_follows_member_size(size, level):
+    assert CompressionPolicy().level_for(size) == level
+
+def test_backlog_caps_the_level(monkeypatch):
+    monkeypatch.setattr(settings, "compression_backlog_busy", 20)
+    monkeypatch.setattr(settings, "compression_backlog_high", 100)
+    assert CompressionPolicy(backlog=19).level_for(10_000) == 9
+    assert CompressionPolicy(backlog=20).level_for(10_000) == 3
+    assert CompressionPolicy(backlog=100).level_for(10_000) == 1
+
+def test_compressed_and_incompressible_members_are_stored():
+    policy = CompressionPolicy()
+    assert policy.choose("report.pdf", TEXT).reason == "compressed format"
+    assert policy.choose("data/orders.PARQUET", TEXT).method == zipfile.ZIP_STORED
+    assert policy.choose("blob.bin", os.urandom(70_000)).reason == "incompressible"
+    assert policy.choose("empty.csv", b"").reason == "empty"
+    text = policy.choose("data/data.csv", TEXT)
+    assert (text.method, text.level) == (zipfile.ZIP_DEFLATED, 9)
+
+def test_pinned_choices_win_over_the_backlog():
+    first = CompressionPolicy(backlog=0)
+    first.choose("data/data.csv", TEXT)
+    retry = CompressionPolicy(backlog=10_000, pinned=first.decisions())
+    assert retry.choose("data/data.csv", TEXT).level == 9
+    assert retry.choose("data/other.csv", TEXT).level == 1
+    assert retry.decisions()["data/data.csv"] == [zipfile.ZIP_DEFLATED, 9, ""]
+
+def test_queue_backlog_reads_the_broker_queue(redis_client):
+    assert queue_backlog() == 0
+    redis_client.rpush("celery", *range(7))
+    assert queue_backlog() == 7
+    assert CompressionPolicy.adaptive().backlog == 7
+    assert CompressionPolicy.adaptive(backlog=3).backlog == 3
+
+def test_peek_keeps_the_whole_stream():
+    sample, chunks = peek(["ab", b"cd", "ef"], size=3)
+    assert sample == b"abcd" and b"".join(chunks) == b"abcdef"
+
+def test_member_stats():
+    result = stream_bundle([("report.pdf", [b"%PDF" + os.urandom(5000)]), ("data.csv", [TEXT])])
+    pdf, csv = result.members
+    assert (pdf.method, pdf.compressed_size) == ("stored", pdf.size)
+    assert csv.method == "deflated" and csv.ratio < 0.1
+    summary = result.compression()
+    assert summary["size"] == pdf.size + csv.size and len(summary["members"]) == 2
+
+def test_archive_is_reproducible_zstd_tar():
+    def members():
+        return [("a.csv", len(TEXT), [TEXT]), ("b.json", 2, ["{}"])]
+    first, second = io.BytesIO(), io.BytesIO()
+    write_archive(members(), first)
+    write_archive(members(), second)
+    assert first.getvalue() == second.getvalue()
+    raw = pa.CompressedInputStream(pa.BufferReader(first.getvalue()), "zstd").read()
+    with tarfile.open(fileobj=io.BytesIO(raw)) as tar:
+        assert tar.extractfile("a.csv").read() == TEXT
+
+def test_an_export_pins_its_backlog_across_retries(s3, redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "report_render_workers", 0)
+    backlogs = []
+    real = cas.CasStore.store_bundle
+
+    def store_bundle(self, *args, backlog=None, **kwargs):
+        backlogs.append(backlog)
+        return real(self, *args, backlog=backlog, **kwargs)
+    monkeypatch.setattr(cas.CasStore, "store_bundle", store_bundle)
+
+    redis_client.rpush("celery", *range(150))
+    ops.package_sources.apply(args=([], "r1", "1", ["json"]), kwargs={"export_id": "e1"}).get()
+    redis_client.delete("celery")
+    # A retry of the same export decides as the first attempt did
+    ops.package_sources.apply(args=([], "r1", "1", ["json"]), kwargs={"export_id": "e1"}).get()
+    assert backlogs == [150, 150]
+    assert ExportProgress("e1").get("compression_backlog") == "150"
+
+def test_each_member_is_deflated_at_its_own_level():
+    text = b"".join(b"%d,%d\n" % (i, i * 7 % 1000) for i in range(50_000))
+    pinned = {"fast.csv": [zipfile.ZIP_DEFLATED, 1, ""], "small.csv": [zipfile.ZIP_DEFLATED, 9, ""]}
+    fast, small = write_bundle([("fast.csv", [text]), ("small.csv", [text])], io.BytesIO(),
+                               policy=CompressionPolicy(pinned=pinned))
+    assert (fast.level, small.level) == (1, 9)
+    assert small.compressed_size < fast.compressed_size
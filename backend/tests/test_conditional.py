@@ -0,0 +1,57 @@
+import pytest
+from app.requests import router
+from app.routes.breach import router as breach_router
+
+pytestmark = pytest.mark.anyio
+
+async def test_request_list_revalidates_until_the_collection_changes(api, user, make_request):
+    make_request(user)
+    client = api(router)
+
+    first = await client.get("/api/v1/requests/")
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"') and first.headers["Cache-Control"] == "private, no-cache"
+
+    cached = await client.get("/api/v1/requests/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    # Another page/filter of the same collection is another representation
+    other = await client.get("/api/v1/requests/", params={"status": "pending"}, headers={"If-None-Match": etag})
+    assert other.status_code == 200
+
+    created = await client.post("/api/v1/requests/", json={"subject_email": "n@example.com", "subject_name": "N"})
+    assert created.status_code == 200
+    changed = await client.get("/api/v1/requests/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json()) == 2
+
+async def test_single_request_etag_follows_its_version(api, user, make_request):
+    request = make_request(user)
+    client = api(router)
+    url = f"/api/v1/requests/{request.request_id}"
+
+    etag = (await client.get(url)).headers["ETag"]
+    # Weak comparison, list of tags
+    assert (await client.get(url, headers={"If-None-Match": f'"x", {etag.removeprefix("W/")}'})).status_code == 304
+
+    await client.patch(url, params={"status": "processing"})
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+
+async def test_tenants_do_not_share_etags(api, user, other_user, make_request):
+    make_request(user)
+    make_request(other_user)
+    mine = (await api(router).get("/api/v1/requests/")).headers["ETag"]
+    theirs = await api(router, user_id=other_user).get("/api/v1/requests/", headers={"If-None-Match": mine})
+    assert theirs.status_code == 200
+
+async def test_breach_list_304(api):
+    client = api(breach_router)
+    etag = (await client.get("/api/v1/breaches")).headers["ETag"]
+    assert (await client.get("/api/v1/breaches", headers={"If-None-Match": etag})).status_code == 304
+
+    await client.post("/api/v1/breaches", json={
+        "breach_type": "leak", "description": "d", "affected_data": {"email": True}, "affected_individuals": 1,
+    })
+    assert (await client.get("/api/v1/breaches", headers={"If-None-Match": etag})).status_code == 200
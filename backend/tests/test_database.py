@@ -0,0 +1,75 @@
+from datetime import datetime
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from app.database import _async_url, engine, get_session, get_session_dep, session_scope, tenant_session
+from app.models import DataBreachReport, User
+from app.routes.breach import router as breach_router
+
+pytestmark = pytest.mark.anyio
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///./app.db", "sqlite+aiosqlite:///./app.db"),
+    ("postgresql://u:p@db/app", "postgresql+asyncpg://u:p@db/app"),
+    ("postgresql+psycopg2://u:p@db/app", "postgresql+asyncpg://u:p@db/app"),
+    ("postgresql+psycopg://u:p@db/app", "postgresql+psycopg://u:p@db/app"),
+])
+def test_async_url(url, expected):
+    assert _async_url(url) == expected
+
+def test_session_scope_rolls_back_on_error():
+    with pytest.raises(RuntimeError):
+        with session_scope() as session:
+            session.add(User(email="gone@example.com", full_name="Gone", company_name="X"))
+            session.flush()
+            raise RuntimeError("boom")
+    with Session(engine) as session:
+        assert session.exec(select(User).where(User.email == "gone@example.com")).first() is None
+
+def test_session_dependency_yields_a_session():
+    dependency = get_session_dep()
+    session = next(dependency)
+    assert session.exec(select(User)).all() == []
+    dependency.close()
+
+def test_get_session_is_a_context_manager_and_a_dependency():
+    with pytest.raises(RuntimeError):
+        with get_session() as session:
+            session.add(User(email="gone@example.com", full_name="Gone", company_name="X"))
+            session.flush()
+            raise RuntimeError("boom")
+    with get_session() as session:
+        assert session.exec(select(User)).all() == []
+
+    app = FastAPI()
+
+    @app.get("/users")
+    def users(session: Session = Depends(get_session)):
+        return len(session.exec(select(User)).all())
+    assert TestClient(app).get("/users").json() == 0
+
+async def test_tenant_session_commits(user):
+    async with tenant_session(str(user)) as session:
+        session.add(DataBreachReport(
+            user_id=user, breach_type="leak", description="d", affected_data={"email": True},
+            affected_individuals=3, discovery_date=datetime.utcnow(), status="new",
+        ))
+        await session.commit()
+    with Session(engine) as session:
+        assert session.exec(select(DataBreachReport.breach_type)).all() == ["leak"]
+
+async def test_async_breach_routes(api):
+    client = api(breach_router)
+    created = await client.post("/api/v1/breaches", json={
+        "breach_type": "leak", "description": "laptop", "affected_data": {"email": True},
+        "affected_individuals": 10,
+    })
+    assert created.status_code == 200
+    breach_id = created.json()["breach_id"]
+
+    triaged = await client.post(f"/api/v1/breaches/{breach_id}/triage", json={"risk_level": "high", "reportable": True})
+    assert triaged.json()["sla_deadline"] is not None
+
+    listed = (await client.get("/api/v1/breaches")).json()["breaches"]
+    assert [(b["id"], b["status"], b["risk_level"]) for b in listed] == [(breach_id, "triage", "high")]
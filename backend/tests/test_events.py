@@ -0,0 +1,179 @@
+import asyncio
+import json
+import time
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session
+from app.config import settings
+from app.database import engine
+from app.models import DSARRequest
+from app.requests import router as requests_router
+from app.routes import events as events_route
+from app.services import events, export_progress
+from app.services.export_progress import ExportProgress
+from app.services.request_stats import set_request_status
+from app.tasks import ops
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def hub():
+    return events.EventHub()
+
+def _listen(redis_client, tenant):
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(events.channel(tenant))
+    return pubsub
+
+def _messages(pubsub, wait=0.5):
+    found, deadline = [], time.monotonic() + wait
+    while time.monotonic() < deadline:
+        message = pubsub.get_message(timeout=0.1)
+        if message is not None:
+            found.append(json.loads(message["data"]))
+    return found
+
+def test_sync_commit_publishes_status_changes(user, make_request, redis_client):
+    request = make_request(user)
+    pubsub = _listen(redis_client, user)
+    with Session(engine) as session:
+        row = session.get(DSARRequest, request.id)
+        set_request_status(session, row, "processing")
+        session.flush()
+        assert _messages(pubsub) == []  # nothing before commit
+        session.commit()
+    [event] = _messages(pubsub)
+    assert (event["type"], event["status"], event["previous"]) == ("request.status", "processing", "pending")
+
+def test_rollback_drops_events(user, make_request, redis_client):
+    request = make_request(user)
+    pubsub = _listen(redis_client, user)
+    with Session(engine) as session:
+        set_request_status(session, session.get(DSARRequest, request.id), "rejected")
+        session.flush()
+        session.rollback()
+    assert _messages(pubsub) == []
+
+async def test_async_routes_publish_after_the_scope_closes(api, user, make_request, redis_client):
+    request = make_request(user)
+    pubsub = _listen(redis_client, user)
+    await api(requests_router).patch(f"/api/v1/requests/{request.request_id}", params={"status": "completed"})
+    assert [e["status"] for e in _messages(pubsub)] == ["completed"]
+
+async def _next(queue):
+    return json.loads(await asyncio.wait_for(queue.get(), timeout=3))
+
+async def _wait_subscribed(hub, tenant):
+    for _ in range(150):
+        if hub._pubsub is not None and events.channel(tenant).encode() in hub._pubsub.channels:
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("hub never subscribed")
+
+async def _close(hub, tenant=None, queue=None, stream=None):
+    # fakeredis may swallow a cancel that lands mid-command (redis-py
+    # re-raises it), so keep cancelling the reader until the hub stops it.
+    reader = hub._reader
+    task = asyncio.ensure_future(stream.aclose() if stream else hub.unsubscribe(tenant, queue))
+    while not task.done():
+        reader.cancel()
+        await asyncio.wait([task], timeout=0.1)
+    await task
+
+async def test_hub_fans_out_one_subscription(hub):
+    first, second = await hub.subscribe("1"), await hub.subscribe("1")
+    other = await hub.subscribe("2")
+    await _wait_subscribed(hub, "1")
+    await events.apublish("1", {"status": "done"})
+    assert (await _next(first))["status"] == "done"
+    assert (await _next(second))["status"] == "done"
+    assert other.empty()
+
+    await hub.unsubscribe("1", first)
+    await hub.unsubscribe("1", second)
+    assert hub._reader is not None  # tenant 2 still listening
+    await _close(hub, "2", other)
+    assert hub._reader is None and not hub._queues
+
+async def test_hub_restarts_after_the_last_client_left(hub):
+    queue = await hub.subscribe("1")
+    await _close(hub, "1", queue)
+    queue = await hub.subscribe("1")
+    await _wait_subscribed(hub, "1")
+    await events.apublish("1", {"status": "again"})
+    assert (await _next(queue))["status"] == "again"
+    await _close(hub, "1", queue)
+
+async def test_tickets_are_single_use():
+    ticket = await events.issue_ticket("5")
+    assert await events.redeem_ticket(ticket) == "5"
+    assert await events.redeem_ticket(ticket) is None
+
+async def test_stream_auth(api):
+    assert await events_route.stream_user(ticket=(await events.issue_ticket("9")), credentials=None) == "9"
+    for ticket in (None, "forged"):
+        with pytest.raises(HTTPException) as e:
+            await events_route.stream_user(ticket=ticket, credentials=None)
+        assert e.value.status_code == 401
+    # The JWT is no longer accepted in the query string
+    response = await api(events_route.router).get("/api/v1/events/stream", params={"token": "jwt"})
+    assert response.status_code == 401
+
+    issued = (await api(events_route.router).post("/api/v1/events/ticket")).json()
+    assert issued["expires_in"] == events.TICKET_TTL
+
+class _Client:
+    def __init__(self):
+        self.gone = False
+
+    async def is_disconnected(self):
+        return self.gone
+
+async def test_event_stream_frames(monkeypatch, hub):
+    monkeypatch.setattr(events_route, "hub", hub)
+    client = _Client()
+    stream = events_route.event_stream(client, "3")
+    assert await stream.__anext__() == f"retry: {events_route.RETRY_MS}\n\n"
+    await _wait_subscribed(hub, "3")
+    await events.apublish("3", {"status": "processing"})
+    frame = await asyncio.wait_for(stream.__anext__(), timeout=3)
+    assert frame.startswith("event: status\ndata: ") and '"processing"' in frame
+    await _close(hub, stream=stream)
+    assert hub._reader is None
+
+def test_export_lifecycle_is_published(user, redis_client, s3, monkeypatch):
+    monkeypatch.setattr(settings, "report_render_workers", 0)
+    progress = ExportProgress("e1")
+    pubsub = _listen(redis_client, user)
+    progress.start(request_id="r1", account_id=str(user), state="fetching")
+    ops._package_bundle(None, "r1", str(user), {"findings": []}, ["json"], "a@example.com", progress)
+    published = _messages(pubsub)
+    assert [(e["type"], e["status"], e["previous"]) for e in published] == [
+        ("export.status", "fetching", None), ("export.status", "packaging", "fetching"),
+        ("export.status", "done", "packaging"),
+    ]
+    assert {(e["export_id"], e["request_id"]) for e in published} == {("e1", "r1")}
+    progress.set(state="done")  # no change, no event
+    assert _messages(pubsub, wait=0.2) == []
+
+def test_failed_export_is_published(user, redis_client, monkeypatch):
+    progress = ExportProgress("e1")
+    progress.start(request_id="r1", account_id=str(user), state="packaging")
+    pubsub = _listen(redis_client, user)
+
+    def broken(*args):
+        raise RuntimeError("render failed")
+    monkeypatch.setattr(ops, "_package_bundle", broken)
+    with pytest.raises(RuntimeError):
+        ops._package(None, "r1", str(user), {"findings": []}, ["json"], progress=progress)
+    [event] = _messages(pubsub)
+    assert (event["status"], event["error"]) == ("failed", "render failed")
+
+async def test_export_start_and_cancel_are_published(user, redis_client):
+    pubsub = _listen(redis_client, user)
+    await export_progress.start_export("e1", "r1", str(user))
+    await export_progress.request_cancel("e1")
+    ops.cleanup_cancelled_export("e1")
+    assert [(e["status"], e["previous"]) for e in _messages(pubsub)] == [
+        ("queued", None), ("cancelling", "queued"), ("cancelled", "cancelling"),
+    ]
@@ -0,0 +1,67 @@
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import pytest
+from app.services.multipart import MIN_PART_SIZE, CheckpointStore, MultipartUpload
+
+BENCH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools", "export_bench.py")
+
+@pytest.fixture(scope="module")
+def bench():
+    spec = importlib.util.spec_from_file_location("export_bench", BENCH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_counts_and_sources(bench):
+    assert [bench.parse_count(c) for c in ("1k", "2.5m", "300")] == [1000, 2_500_000, 300]
+    split = bench.sources(10, 3)
+    assert [len(s) for s in split.values()] == [4, 3, 3]
+    # Deterministic and regenerated on every pass
+    first = split["source0"]
+    assert list(first) == list(first) and len(list(first)) == 4
+
+def test_local_s3_stand_in_takes_multipart_uploads(bench, tmp_path):
+    client = bench.LocalS3(str(tmp_path))
+    data = os.urandom(MIN_PART_SIZE * 2 + 10)
+    upload = MultipartUpload(client, "bench", "k", part_size=MIN_PART_SIZE, checkpoints=CheckpointStore())
+    result = upload.upload(io.BytesIO(data))
+    assert result["parts"] == 3
+    assert client.get_object(Bucket="bench", Key="k")["Body"].read() == data
+
+def _row(**fields):
+    return dict({"stage": "bundle", "format": None, "records": 1000, "sources": 4,
+                 "records_per_s": 1000.0, "peak_rss_mb": 100.0}, **fields)
+
+def test_regressions_against_a_baseline(bench):
+    baseline = {"results": [_row()]}
+    assert bench.compare([_row(records_per_s=850.0, peak_rss_mb=130.0)], baseline, 0.2) == []
+    slower = bench.compare([_row(records_per_s=700.0)], baseline, 0.2)
+    assert [r["metric"] for r in slower] == ["records_per_s"]
+    fatter = bench.compare([_row(peak_rss_mb=200.0)], baseline, 0.2)
+    assert [r["metric"] for r in fatter] == ["peak_rss_mb"]
+    # Rows the baseline does not have, or that failed, are not compared
+    failed = {"stage": "bundle", "records": 1000, "sources": 4, "error": "timeout"}
+    assert bench.compare([_row(records=5), failed], baseline, 0.2) == []
+
+def test_rates(bench):
+    row = bench.with_rates({"seconds": 2.0, "output_bytes": 4 * 2**20}, "bundle", 1000, 4)
+    assert (row["records_per_s"], row["mb_per_s"], row["stage"]) == (500.0, 2.0, "bundle")
+
+def test_machine_readable_run(tmp_path):
+    out = tmp_path / "bench.json"
+    proc = subprocess.run(
+        [sys.executable, BENCH, "--records", "1k", "--stages", "generate,bundle", "--formats", "ndjson",
+         "--sources", "2", "--out", str(out), "--timeout", "120"],
+        cwd=os.path.dirname(os.path.dirname(BENCH)), capture_output=True, text=True, timeout=180,
+    )
+    assert proc.returncode == 0, proc.stderr
+    report = json.loads(out.read_text())
+    assert report["meta"]["s3"] == "local"
+    rows = {row["stage"]: row for row in report["results"]}
+    assert set(rows) == {"generate", "bundle"}
+    for row in rows.values():
+        assert row["records"] == 1000 and row["records_per_s"] > 0 and row["peak_rss_mb"] > 0
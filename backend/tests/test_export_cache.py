@@ -0,0 +1,86 @@
+from datetime import datetime
+import pytest
+from app import requests as requests_module
+from app.requests import router
+from app.services import export_cache, storage
+from app.services.export_cache import claim, findings_fingerprint, lookup, release, request_fingerprint, store
+from app.services.export_progress import ExportProgress
+
+pytestmark = pytest.mark.anyio
+
+SOURCES = [(1, datetime(2026, 1, 1)), (2, datetime(2026, 2, 1))]
+
+def test_request_fingerprint_follows_what_is_asked():
+    base = request_fingerprint("r1", "access", "A@Example.com ", ["json", "csv"], SOURCES)
+    assert base == request_fingerprint("r1", "access", "a@example.com", ["csv", "json"], SOURCES[::-1])
+    assert base != request_fingerprint("r1", "access", "a@example.com", ["json"], SOURCES)
+    assert base != request_fingerprint("r1", "access", "a@example.com", ["json", "csv"],
+                                       [(1, datetime(2026, 1, 2)), SOURCES[1]])
+
+def test_findings_fingerprint():
+    fetched = [{"source": "shop.orders", "fingerprint": "fp", "records_key": "cas/x"}]
+    skipped = [{"source": "shop.orders", "fingerprint": "fp"}]
+    assert findings_fingerprint("req", fetched) == findings_fingerprint("req", skipped)
+    assert findings_fingerprint("req", [{"source": "s", "records": [1]}]) is None
+
+def test_concurrent_claims_join_the_running_export():
+    assert claim("fp", "e1") == export_cache.Claim("e1")
+    assert claim("fp", "e2").export_id == "e1"
+    release("fp", "e2")  # not the holder: no effect
+    assert claim("fp", "e3").export_id == "e1"
+    release("fp", "e1")
+    assert claim("fp", "e4").export_id == "e4"
+
+def test_a_dead_holder_is_taken_over():
+    claim("fp", "e1")
+    ExportProgress("e1").set(state="failed")
+    assert claim("fp", "e2").export_id == "e2"
+
+def test_results_are_cached_under_both_fingerprints():
+    store("req", "found", "cas/bundles/a.zip", "abc", "e1")
+    assert claim("req", "e2").result["key"] == "cas/bundles/a.zip"
+    assert lookup("found")["sha256"] == "abc"
+    assert claim("req", "e2", use_cache=False).export_id == "e2"  # refresh bypasses the cache
+    export_cache.forget("req")
+    assert claim("req", "e3").result is None
+    assert lookup(None) is None
+
+@pytest.fixture
+def queued(monkeypatch):
+    calls = []
+    monkeypatch.setattr(requests_module.export_dsar_task, "apply_async",
+                        lambda *args, **kwargs: calls.append(kwargs["task_id"]))
+    return calls
+
+def _fingerprint(request):
+    return request_fingerprint(request.request_id, request.request_type, request.subject_email, None, [])
+
+async def test_repeat_export_returns_the_cached_bundle(api, user, make_request, queued, s3):
+    request = make_request(user)
+    s3.put_object(Bucket=storage.bucket(), Key="cas/bundles/a.zip", Body=b"zip")
+    store(_fingerprint(request), None, "cas/bundles/a.zip", "abc", "e1")
+    client = api(router)
+
+    body = (await client.post(f"/api/v1/requests/{request.request_id}/export")).json()
+    assert (body["status"], body["task_id"], body["cached"]) == ("completed", "e1", True)
+    assert body["download_token"] and queued == []
+
+    refreshed = (await client.post(f"/api/v1/requests/{request.request_id}/export", params={"refresh": True})).json()
+    assert refreshed["status"] == "queued" and queued == [refreshed["task_id"]]
+
+async def test_a_collected_bundle_is_rebuilt(api, user, make_request, queued, s3):
+    request = make_request(user)
+    fingerprint = _fingerprint(request)
+    store(fingerprint, None, "cas/bundles/gone.zip", "abc", "e1")
+    body = (await api(router).post(f"/api/v1/requests/{request.request_id}/export")).json()
+    assert body["status"] == "queued" and "cached" not in body
+    assert queued == [body["task_id"]]
+    assert lookup(fingerprint) is None
+
+async def test_double_click_joins_the_first_export(api, user, make_request, queued):
+    request = make_request(user)
+    client = api(router)
+    first = (await client.post(f"/api/v1/requests/{request.request_id}/export")).json()
+    second = (await client.post(f"/api/v1/requests/{request.request_id}/export")).json()
+    assert second["coalesced"] and second["task_id"] == first["task_id"]
+    assert queued == [first["task_id"]]
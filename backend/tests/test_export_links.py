@@ -0,0 +1,96 @@
+import datetime as dt
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+import pytest
+import redis
+from sqlmodel import Session, select
+from app.database import engine, write_queue
+from app.models import DownloadToken
+from app.routes import downloads
+from app.services import export_links
+from app.services.export_links import TokenUnavailable, create_download_token, redeem, revoke_token
+
+pytestmark = pytest.mark.anyio
+
+def _reason(token):
+    with pytest.raises(TokenUnavailable) as e:
+        redeem(token)
+    return e.value.reason
+
+def _try(token):
+    try:
+        return redeem(token)
+    except TokenUnavailable as e:
+        return e.reason
+
+def test_a_token_is_redeemed_once():
+    token = create_download_token(1, "cas/bundles/a.zip")
+    assert redeem(token) == "cas/bundles/a.zip"
+    assert _reason(token) == "used"
+    with Session(engine) as session:
+        assert session.exec(select(DownloadToken.used_at)).one() is not None
+
+def test_terminal_states_are_answered_from_redis(monkeypatch):
+    token = create_download_token(1, "k")
+    redeem(token)
+    calls = []
+    monkeypatch.setattr(write_queue, "run", lambda *args: calls.append(args))
+    assert _reason(token) == "used" and calls == []
+
+def test_concurrent_clicks_get_exactly_one_key():
+    token = create_download_token(1, "k")
+    barrier = threading.Barrier(8)
+
+    def click(_):
+        barrier.wait()
+        return _try(token)
+    with ThreadPoolExecutor(8) as pool:
+        outcomes = list(pool.map(click, range(8)))
+    assert outcomes.count("k") == 1
+    assert set(outcomes) - {"k"} <= {"busy", "used"}
+
+def test_without_redis_the_database_still_decides(monkeypatch):
+    def down():
+        raise redis.ConnectionError("down")
+    monkeypatch.setattr(export_links, "_redis", down)
+    token = create_download_token(1, "k")
+    with ThreadPoolExecutor(4) as pool:
+        outcomes = list(pool.map(lambda _: _try(token), range(4)))
+    assert outcomes.count("k") == 1 and outcomes.count("used") == 3
+
+def test_unusable_tokens():
+    assert _reason(str(uuid4())) == "not_found"
+    revoked = create_download_token(1, "k")
+    assert revoke_token(revoked)
+    assert _reason(revoked) == "revoked"
+    assert not revoke_token(str(uuid4()))
+
+    expired = create_download_token(1, "k")
+    with Session(engine) as session:
+        row = session.exec(select(DownloadToken).where(DownloadToken.token == expired)).one()
+        row.expires_at = dt.datetime.utcnow() - dt.timedelta(seconds=1)
+        session.add(row)
+        session.commit()
+    assert _reason(expired) == "expired"
+
+def test_a_failed_redemption_frees_the_token(monkeypatch):
+    token = create_download_token(1, "k")
+    real = write_queue.run
+
+    def broken(*args):
+        raise RuntimeError("database down")
+    monkeypatch.setattr(write_queue, "run", broken)
+    with pytest.raises(RuntimeError):
+        redeem(token)
+    monkeypatch.setattr(write_queue, "run", real)
+    assert redeem(token) == "k"  # not left "busy"
+
+async def test_download_route(api, monkeypatch):
+    monkeypatch.setattr(downloads, "presign_get_url", lambda key, expires_seconds: f"https://r2.example/{key}")
+    client = api(downloads.router)
+    token = create_download_token(1, "cas/bundles/a.zip")
+    first = await client.get(f"/api/v1/downloads/{token}")
+    assert first.status_code == 302 and first.headers["location"] == "https://r2.example/cas/bundles/a.zip"
+    assert (await client.get(f"/api/v1/downloads/{token}")).status_code == 410
+    assert (await client.get(f"/api/v1/downloads/{uuid4()}")).status_code == 404
@@ -0,0 +1,92 @@
+import pytest
+from app.celery_app import celery_app
+from app.database import write_queue
+from app.requests import router
+from app.services import export_progress, storage
+from app.services.cas import CasStore, Spooled, acquire
+from app.services.export_progress import ExportCancelled, ExportProgress, summarize
+from app.tasks import ops
+
+pytestmark = pytest.mark.anyio
+
+def test_summary_halves_and_eta():
+    fetching = summarize({"state": "fetching", "sources_total": "4", "sources_done": "1", "started_at": "100"}, now=112.5)
+    assert (fetching["percent"], fetching["eta_seconds"], fetching["elapsed_seconds"]) == (12.5, 88, 12)
+    packaging = summarize({"state": "packaging", "sources_total": "4", "sources_done": "4",
+                           "entries_total": "4", "entries_done": "3", "started_at": "100"}, now=187.5)
+    assert (packaging["percent"], packaging["eta_seconds"]) == (87.5, 12)
+    # Never 100 before it is done; no ETA once it stopped
+    assert summarize({"state": "packaging", "entries_total": "2", "entries_done": "2"})["percent"] == 99.9
+    assert summarize({"state": "failed", "started_at": "1", "error": "boom"})["eta_seconds"] is None
+    assert summarize({"state": "done"})["percent"] == 100.0 and summarize({})["state"] == "queued"
+
+def test_counters_add_up_across_tasks():
+    first, second = ExportProgress("e1"), ExportProgress("e1")
+    first.add(records_fetched=500)
+    second.add(records_fetched=20, bytes_written=100)
+    first.flush()
+    second.flush()
+    assert first.get("records_fetched") == "520" and first.get("bytes_written") == "100"
+
+    first.remember("staged", "cas/a", "cas/b")
+    first.forget("staged", "cas/a")
+    assert second.members("staged") == ["cas/b"]
+
+def test_cancel_flag_is_seen_and_throttled(redis_client):
+    progress = ExportProgress("e1")
+    progress.set(state="fetching")
+    progress.check()
+    redis_client.hset("export:e1", "cancel", 1)
+    assert not progress.is_set()  # checked less than a second ago
+    progress._checked_at = 0.0
+    with pytest.raises(ExportCancelled):
+        progress.check()
+
+def test_without_an_export_id_everything_is_a_noop():
+    progress = ExportProgress()
+    progress.set(state="x")
+    progress.add(records_fetched=1)
+    progress.flush()
+    assert progress.get("state") is None and progress.members("tasks") == [] and not progress.is_set()
+
+async def test_progress_and_cancel_endpoints(api, user, make_request, monkeypatch):
+    request = make_request(user)
+    revoked = []
+    monkeypatch.setattr(celery_app.control, "revoke", revoked.append)
+    client = api(router)
+    base = f"/api/v1/requests/{request.request_id}/export"
+
+    await export_progress.start_export("e1", request.request_id, str(user))
+    ExportProgress("e1").set(state="fetching", sources_total=2, sources_done=1)
+    body = (await client.get(f"{base}/e1")).json()
+    assert (body["state"], body["percent"], body["sources_done"]) == ("fetching", 25.0, 1)
+    assert (await client.get(f"{base}/unknown")).status_code == 404
+
+    other = make_request(user)
+    assert (await client.get(f"/api/v1/requests/{other.request_id}/export/e1")).status_code == 404
+
+    response = await client.post(f"{base}/e1/cancel")
+    assert response.status_code == 202
+    assert revoked == [["e1"]]
+    assert ExportProgress("e1").is_set() and ExportProgress("e1").state() == "cancelling"
+
+    ExportProgress("e1").set(state="done")
+    assert (await client.post(f"{base}/e1/cancel")).status_code == 409
+
+def test_cleanup_removes_staged_records_and_open_uploads(s3):
+    bucket, progress = storage.bucket(), ExportProgress("e1")
+    progress.set(state="cancelling")
+    cas = CasStore(s3, bucket)
+    spools = [Spooled([b"staged"]), Spooled([b"kept"])]
+    staged_key, kept_key = [cas.put(spooled) for spooled in spools]
+    for spooled in spools:
+        spooled.close()
+    write_queue.run(acquire, [kept_key])  # referenced by a bundle: survives
+    s3.create_multipart_upload(Bucket=bucket, Key="cas/bundles/x.zip")
+    progress.remember("staged", staged_key, kept_key)
+    progress.remember("uploads", "cas/bundles/x.zip")
+
+    result = ops.cleanup_cancelled_export("e1")
+    assert (result["aborted_uploads"], result["deleted_objects"]) == (1, 1)
+    assert [o["Key"] for o in s3.list_objects_v2(Bucket=bucket)["Contents"]] == [kept_key]
+    assert progress.state() == "cancelled"
@@ -0,0 +1,107 @@
+import pytest
+from celery import chord
+from sqlmodel import Session
+from app.config import settings
+from app.database import engine
+from app.models import DataSource
+from app.services import connectors, fetch, storage
+from app.services.cas import CasStore
+from app.tasks import ops
+
+class StubConnector(connectors.Connector):
+    collections = ("customers", "orders")
+    fail = None
+
+    def fingerprint(self, email):
+        return "fp-1"
+
+    def fetch(self, email):
+        if self.fail:
+            raise self.fail
+        return {
+            "customers": iter([{"email": email}]),
+            "orders": (dict(id=i, total=i * 2) for i in range(1200)),
+        }
+
+@pytest.fixture(autouse=True)
+def stub_connector(monkeypatch):
+    monkeypatch.setitem(connectors.CONNECTORS, "stub", StubConnector)
+    return StubConnector
+
+@pytest.fixture
+def sources(user):
+    with Session(engine) as session:
+        rows = [
+            DataSource(user_id=user, name="Main Shop!", type="stub", config={"max_concurrency": 3}),
+            DataSource(user_id=user, name="Blog", type="stub", config={}),
+            DataSource(user_id=user, name="Old", type="stub", config={}, is_active=False),
+        ]
+        session.add_all(rows)
+        session.commit()
+        return [row.id for row in rows]
+
+@pytest.fixture
+def cas(s3):
+    return CasStore(s3, storage.bucket())
+
+def test_active_sources_and_names(user, make_request, sources):
+    request = make_request(user)
+    assert fetch.active_sources(request.request_id) == (str(user), sources[:2])
+    assert fetch.active_sources("unknown") == (None, [])
+    main = fetch.load_source(sources[0])
+    assert fetch.source_name(main) == "main-shop"
+    assert fetch.concurrency_limit(main) == 3
+    assert fetch.concurrency_limit(fetch.load_source(sources[1])) == 1  # no FETCH_CONCURRENCY entry for "stub"
+
+def test_slots_cap_concurrent_fetches_per_source():
+    slots = fetch.SourceSlots()
+    assert slots.acquire(1, 2, "a") and slots.acquire(1, 2, "b")
+    assert not slots.acquire(1, 2, "c")
+    assert slots.acquire(1, 2, "a")  # a holder's retry keeps its slot
+    assert slots.acquire(2, 2, "c")  # other sources are independent
+    slots.release(1, "a")
+    assert slots.acquire(1, 2, "c")
+
+def test_fetch_stages_each_collection(cas, sources):
+    findings = fetch.fetch_source(cas, fetch.load_source(sources[0]), "1", "a@example.com", ["json"])
+    assert [(f["source"], f["objects"]) for f in findings] == [("main-shop.customers", 1), ("main-shop.orders", 1200)]
+    merged, failed = fetch.merge_findings(cas, [findings, fetch.failed("blog", RuntimeError("down\ntrace"))])
+    assert failed == [{"source": "blog", "error": "down"}]
+    orders = merged[1]["records"]
+    assert len(orders) == 1200 and list(orders)[-1] == {"id": 1199, "total": 2398}
+    assert list(orders) == list(orders)  # re-iterable for several formats
+
+def test_expired_staging_is_a_failed_source(cas):
+    merged, failed = fetch.merge_findings(cas, [[{"source": "s.orders", "records_key": "cas/" + "0" * 64}]])
+    assert merged == [] and failed == [{"source": "s.orders", "error": "staged records expired"}]
+
+def test_pipeline_is_a_chord_over_sources():
+    pipeline = ops.export_pipeline("r1", "1", "a@example.com", [4, 5, 6], ["json"])
+    assert isinstance(pipeline, chord)
+    assert [task.args[2] for task in pipeline.tasks] == [4, 5, 6]
+    assert pipeline.body.task == "app.tasks.package_sources"
+    # No sources: straight to packaging, with an empty result list
+    empty = ops.export_pipeline("r1", "1", "a@example.com", [], ["json"])
+    assert empty.task == "app.tasks.package_sources" and empty.args[0] == []
+
+def test_fetch_task_isolates_a_failing_source(s3, sources, stub_connector, monkeypatch, caplog):
+    monkeypatch.setattr(stub_connector, "fail", connectors.ConnectorError("401 from shop"))
+    result = ops.fetch_source.apply(args=("r1", "1", sources[0], "a@example.com", ["json"])).get()
+    assert result == [{"source": "main-shop", "error": "401 from shop"}]
+    [record] = [r for r in caplog.records if r.name == ops.logger.name]
+    assert record.levelname == "WARNING" and record.exc_info
+    assert f"request r1, source {sources[0]}" in record.getMessage()
+    # The slot is released for the next fetch
+    assert fetch.SourceSlots().acquire(sources[0], 1, "next")
+
+def test_fetch_task_reports_a_missing_source(s3):
+    assert ops.fetch_source.apply(args=("r1", "1", 999, "a@example.com", ["json"])).get() == [
+        {"source": "source-999", "error": "data source not found"}
+    ]
+
+def test_fetch_task_gives_up_waiting_for_a_slot(s3, sources, monkeypatch):
+    fetch.SourceSlots().acquire(sources[1], 1, "busy")
+    monkeypatch.setattr(settings, "fetch_slot_wait_s", 0)
+    [result] = ops.fetch_source.apply(args=("r1", "1", sources[1], "a@example.com", ["json"]),
+                                      kwargs={"queued_at": 1.0}).get()
+    assert "no fetch slot" in result["error"]
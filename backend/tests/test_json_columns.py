@@ -0,0 +1,63 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session
+from app.database import engine
+from app.json_columns import json_has_key, json_text
+from app.models import DataBreachReport, DSARRequest
+from app.requests import router
+from app.routes.breach import router as breach_router
+
+pytestmark = pytest.mark.anyio
+
+def test_objects_are_stored_as_json_not_strings(user, make_request):
+    row = make_request(user, additional_info={"shop_domain": "a.shop", "customer_id": 123})
+    with Session(engine) as session:
+        stored = session.execute(
+            text("SELECT json_type(additional_info) FROM dsarrequest WHERE id = :id"), {"id": row.id}
+        ).scalar()
+        assert stored == "object"
+        assert session.get(DSARRequest, row.id).additional_info == {"shop_domain": "a.shop", "customer_id": 123}
+
+async def test_listing_filters_on_json_keys(api, user, make_request):
+    make_request(user, additional_info={"shop_domain": "a.shop", "customer_id": 123})
+    make_request(user, additional_info={"shop_domain": "b.shop", "customer_id": "456"})
+    make_request(user)
+    client = api(router)
+
+    rows = (await client.get("/api/v1/requests/", params={"shop_domain": "a.shop"})).json()
+    assert len(rows) == 1
+    # Numeric and string ids both match their text form, as with Postgres ->>
+    assert len((await client.get("/api/v1/requests/", params={"customer_id": "123"})).json()) == 1
+    assert len((await client.get("/api/v1/requests/", params={"customer_id": "456"})).json()) == 1
+
+def test_json_key_filter_uses_the_expression_index(user):
+    query = select(DSARRequest.id).where(
+        DSARRequest.user_id == user, json_text(DSARRequest.additional_info, "customer_id") == "123"
+    )
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    assert "ix_dsarrequest_user_customer_id" in plan
+
+def test_postgres_rendering():
+    expr = json_text(DSARRequest.additional_info, "shop_domain")
+    assert str(expr.compile(dialect=postgresql.dialect())) == "(dsarrequest.additional_info ->> 'shop_domain')"
+    has_key = json_has_key(DataBreachReport.affected_data, "email")
+    assert "databreachreport.affected_data ?" in str(has_key.compile(dialect=postgresql.dialect()))
+
+def test_unsafe_key_is_rejected():
+    with pytest.raises(ValueError):
+        json_text(DSARRequest.additional_info, "x') OR 1=1 --")
+
+async def test_breach_listing_by_affected_data_key(api, user):
+    with Session(engine) as session:
+        for data in ({"email": True}, {"iban": True}):
+            session.add(DataBreachReport(
+                user_id=user, breach_type="leak", description="d", affected_data=data,
+                affected_individuals=1, discovery_date=datetime.utcnow(), status="new",
+            ))
+        session.commit()
+    breaches = (await api(breach_router).get("/api/v1/breaches", params={"affected_data_key": "iban"})).json()["breaches"]
+    assert [b["affected_data"] for b in breaches] == [{"iban": True}]
@@ -0,0 +1,96 @@
+import io
+import os
+import threading
+from datetime import timedelta
+import pytest
+from app.services import storage
+from app.services.multipart import (
+    MIN_PART_SIZE, CheckpointStore, MultipartUpload, UploadCancelled, abort_stale_uploads, checkpoint_meta,
+)
+
+KEY = "bundles/big.zip"
+
+@pytest.fixture
+def data():
+    return os.urandom(MIN_PART_SIZE * 3 + 1000)
+
+class FlakyClient:
+    """Delegates to the real client; upload_part fails from part `fail_from` on."""
+
+    def __init__(self, client, fail_from):
+        self._client, self.fail_from = client, fail_from
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def upload_part(self, **kwargs):
+        if kwargs["PartNumber"] >= self.fail_from:
+            raise ConnectionError("connection reset")
+        return self._client.upload_part(**kwargs)
+
+def _upload(client, source, **kwargs):
+    kwargs.setdefault("concurrency", 1)
+    return MultipartUpload(client, storage.bucket(), KEY, part_size=MIN_PART_SIZE, **kwargs).upload(source)
+
+def _stored(s3):
+    return s3.get_object(Bucket=storage.bucket(), Key=KEY)["Body"].read()
+
+def test_small_sources_are_one_put(s3):
+    result = _upload(s3, io.BytesIO(b"tiny"))
+    assert (result["parts"], result["resumed_parts"]) == (1, 0)
+    assert s3.list_multipart_uploads(Bucket=storage.bucket()).get("Uploads", []) == []
+    assert _stored(s3) == b"tiny"
+
+def test_parts_upload_in_parallel(s3, data):
+    seen = []
+    result = _upload(s3, io.BytesIO(data), concurrency=3, progress=seen.append)
+    assert (result["parts"], result["resumed_parts"]) == (4, 0)
+    assert sum(seen) == len(data)
+    assert _stored(s3) == data
+    assert CheckpointStore().load(storage.bucket(), KEY) is None
+
+def test_retry_resumes_from_the_checkpoint(s3, data):
+    with pytest.raises(ConnectionError):
+        _upload(FlakyClient(s3, fail_from=3), io.BytesIO(data), meta=lambda: {"compression": {"a": [8, 1, ""]}})
+    # The upload and its checkpoint stay for the retry
+    assert len(s3.list_multipart_uploads(Bucket=storage.bucket())["Uploads"]) == 1
+    assert checkpoint_meta(storage.bucket(), KEY) == {"compression": {"a": [8, 1, ""]}}
+
+    result = _upload(s3, io.BytesIO(data))
+    assert (result["parts"], result["resumed_parts"]) == (4, 2)
+    assert _stored(s3) == data
+    assert checkpoint_meta(storage.bucket(), KEY) == {}
+
+def test_changed_bytes_are_uploaded_again(s3, data):
+    with pytest.raises(ConnectionError):
+        _upload(FlakyClient(s3, fail_from=3), io.BytesIO(data))
+    changed = data[:MIN_PART_SIZE] + b"x" * MIN_PART_SIZE + data[2 * MIN_PART_SIZE:]
+    result = _upload(s3, io.BytesIO(changed))
+    assert result["resumed_parts"] == 1
+    assert _stored(s3) == changed
+
+def test_resume_without_a_checkpoint_discovers_the_upload(s3, data):
+    with pytest.raises(ConnectionError):
+        _upload(FlakyClient(s3, fail_from=2), io.BytesIO(data))
+    CheckpointStore().clear(storage.bucket(), KEY)
+    assert _upload(s3, io.BytesIO(data))["resumed_parts"] == 1
+
+def test_cancel_aborts_the_upload(s3, data):
+    cancel = threading.Event()
+
+    def progress(n):
+        cancel.set()
+    with pytest.raises(UploadCancelled):
+        _upload(s3, io.BytesIO(data), cancel_event=cancel, progress=progress)
+    assert s3.list_multipart_uploads(Bucket=storage.bucket()).get("Uploads", []) == []
+    assert CheckpointStore().load(storage.bucket(), KEY) is None
+
+def test_stale_uploads_are_aborted(s3):
+    # moto reports every upload as initiated in 2010, so both are stale
+    bucket, checkpoints = storage.bucket(), CheckpointStore()
+    s3.create_multipart_upload(Bucket=bucket, Key="bundles/old.zip")
+    s3.create_multipart_upload(Bucket=bucket, Key="archives/old.tar")
+    checkpoints.save(bucket, "bundles/old.zip", {"upload_id": "x", "parts": {}})
+    assert abort_stale_uploads(s3, bucket, "bundles/", older_than=timedelta(hours=1)) == 1
+    assert [u["Key"] for u in s3.list_multipart_uploads(Bucket=bucket)["Uploads"]] == ["archives/old.tar"]
+    assert checkpoints.load(bucket, "bundles/old.zip") is None
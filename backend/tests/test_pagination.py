@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from app.pagination import decode_cursor, encode_cursor
+from app.requests import router
+
+pytestmark = pytest.mark.anyio
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 3, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+def test_bad_cursor_is_rejected():
+    with pytest.raises(HTTPException) as e:
+        decode_cursor("not-a-cursor")
+    assert e.value.status_code == 400
+
+async def test_pages_cover_every_row_once_newest_first(api, user, make_request):
+    created_at = datetime(2026, 1, 1)
+    # Equal timestamps across a page boundary: the id breaks the tie
+    for i in range(7):
+        make_request(user, created_at=created_at + timedelta(minutes=i // 2))
+    client = api(router)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/api/v1/requests/", params=params)
+        assert response.status_code == 200
+        seen.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert len(seen) == 7
+    assert len({row["id"] for row in seen}) == 7
+    order = [(row["created_at"], row["id"]) for row in seen]
+    assert order == sorted(order, reverse=True)
+
+async def test_filters_and_tenant_scope(api, user, other_user, make_request):
+    soon = datetime.utcnow() + timedelta(days=2)
+    make_request(user, status="pending", request_type="deletion", due_date=soon)
+    make_request(user, status="completed", request_type="deletion")
+    make_request(user, status="pending", request_type="access")
+    make_request(other_user, status="pending", request_type="deletion", due_date=soon)
+    client = api(router)
+
+    rows = (await client.get("/api/v1/requests/", params={"status": "pending", "request_type": "deletion"})).json()
+    assert [(r["status"], r["request_type"]) for r in rows] == [("pending", "deletion")]
+
+    rows = (await client.get("/api/v1/requests/", params={"due_before": (soon + timedelta(days=1)).isoformat()})).json()
+    assert len(rows) == 1
+
+async def test_limit_is_bounded(api):
+    response = await api(router).get("/api/v1/requests/", params={"limit": 10_000})
+    assert response.status_code == 422
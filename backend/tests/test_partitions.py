@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+from sqlmodel import Session, select
+from app.config import settings
+from app.database import engine
+from app.models import AuditLog
+from app.services import partitions
+from app.tasks.monitoring import enforce_log_retention
+
+class FakeResult:
+    def __init__(self, scalar=None, rows=(), rowcount=0):
+        self._scalar, self._rows, self.rowcount = scalar, list(rows), rowcount
+
+    def scalar(self):
+        return self._scalar
+
+    def all(self):
+        return self._rows
+
+class FakePostgres:
+    """Records statements; answers the catalog and default-partition probes."""
+
+    class dialect:
+        name = "postgresql"
+
+    def __init__(self, partitions_of, default_has_rows=False):
+        self.partitions_of = partitions_of
+        self.default_has_rows = default_has_rows
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if "pg_partitioned_table" in sql:
+            return FakeResult(scalar=1)
+        if "pg_inherits" in sql:
+            return FakeResult(rows=[(name,) for name in self.partitions_of])
+        if sql.startswith("SELECT 1 FROM"):
+            return FakeResult(scalar=1 if self.default_has_rows else None)
+        self.statements.append(sql)
+        return FakeResult(rowcount=2)
+
+def test_month_arithmetic():
+    assert partitions.add_months(datetime(2026, 11, 1), 3) == datetime(2027, 2, 1)
+    assert partitions.add_months(datetime(2026, 1, 1), -1) == datetime(2025, 12, 1)
+    assert partitions.month_start(datetime(2026, 5, 31, 23, 59)) == datetime(2026, 5, 1)
+    assert partitions.partition_name("auditlog", datetime(2026, 5, 1)) == "auditlog_y2026m05"
+
+def test_sqlite_retention_is_one_delete(user):
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        for age in (400, 10):
+            session.add(AuditLog(user_id=user, action="a", resource_type="r", created_at=now - timedelta(days=age)))
+        session.commit()
+    with engine.begin() as conn:
+        assert partitions.ensure_partitions(conn, "auditlog", now) == []
+    assert enforce_log_retention(now)["auditlog_retired"] == 1
+    with Session(engine) as session:
+        assert len(session.exec(select(AuditLog)).all()) == 1
+
+def test_ensure_partitions_creates_missing_months_only():
+    conn = FakePostgres(["auditlog_default", "auditlog_y2026m10"])
+    names = partitions.ensure_partitions(conn, "auditlog", datetime(2026, 10, 18), months_ahead=2)
+    assert names == ["auditlog_y2026m10", "auditlog_y2026m11", "auditlog_y2026m12"]
+    assert conn.statements == [
+        "CREATE TABLE IF NOT EXISTS auditlog_y2026m11 PARTITION OF auditlog "
+        "FOR VALUES FROM ('2026-11-01') TO ('2026-12-01')",
+        "CREATE TABLE IF NOT EXISTS auditlog_y2026m12 PARTITION OF auditlog "
+        "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')",
+    ]
+
+def test_rows_in_default_are_moved_into_the_new_partition():
+    conn = FakePostgres(["breachevent_default"], default_has_rows=True)
+    partitions.ensure_partitions(conn, "breachevent", datetime(2026, 10, 18), months_ahead=0)
+    detach, create, move, attach = conn.statements
+    assert detach == "ALTER TABLE breachevent DETACH PARTITION breachevent_default"
+    assert create.startswith("CREATE TABLE IF NOT EXISTS breachevent_y2026m10 PARTITION OF breachevent")
+    assert "DELETE FROM breachevent_default" in move and "INSERT INTO breachevent_y2026m10" in move
+    assert attach == "ALTER TABLE breachevent ATTACH PARTITION breachevent_default DEFAULT"
+
+def test_retention_drops_whole_expired_months_and_cleans_default():
+    conn = FakePostgres(["auditlog_default", "auditlog_y2025m08", "auditlog_y2025m09", "auditlog_y2025m10"])
+    dropped = partitions.drop_expired_partitions(conn, "auditlog", datetime(2025, 10, 1))
+    assert dropped == 2
+    assert conn.statements[0] == "DELETE FROM auditlog_default WHERE created_at < :cutoff"
+    assert "DROP TABLE auditlog_y2025m08" in conn.statements
+    assert "DROP TABLE auditlog_y2025m09" in conn.statements
+    # The cutoff's own month is kept until it has fully aged out
+    assert "DROP TABLE auditlog_y2025m10" not in conn.statements
+
+def test_retention_days_come_from_settings(monkeypatch, user):
+    monkeypatch.setattr(settings, "audit_log_retention_days", 5)
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        session.add(AuditLog(user_id=user, action="a", resource_type="r", created_at=now - timedelta(days=6)))
+        session.commit()
+    assert enforce_log_retention(now)["auditlog_retired"] == 1
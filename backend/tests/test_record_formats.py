@@ -0,0 +1,76 @@
+import io
+import json
+import zipfile
+from datetime import datetime
+import pyarrow.parquet as pq
+import pytest
+from app.services import bundle_writer
+from app.services.bundle_writer import check_formats, record_entries, source_chunks, stream_bundle
+
+ORDERS = [
+    {"id": 1, "total": 12.5, "created": datetime(2026, 1, 2), "lines": [{"sku": "A", "qty": 2}]},
+    {"id": 2, "total": 7, "created": datetime(2026, 1, 3), "lines": []},
+    {"id": 3, "total": "n/a", "created": None, "note": "gift"},
+]
+
+def _bytes(fmt, records):
+    return b"".join(source_chunks(fmt, records))
+
+def test_ndjson_is_one_record_per_line():
+    lines = _bytes("ndjson", ORDERS).decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [1, 2, 3]
+    assert json.loads(lines[0])["lines"] == [{"sku": "A", "qty": 2}]
+
+def test_ndjson_pulls_records_lazily():
+    pulled = []
+
+    def records():
+        for i in range(100_000):
+            pulled.append(i)
+            yield {"i": i}
+    chunks = source_chunks("ndjson", records())
+    next(chunks)
+    assert len(pulled) < 100_000
+
+def test_parquet_keeps_misfits_in_extra():
+    # The schema comes from the first row group (the first two orders)
+    data = b"".join(bundle_writer.parquet_chunks(ORDERS, rows_per_group=2))
+    table = pq.read_table(io.BytesIO(data))
+    assert table.column_names == ["id", "total", "created", "lines", "_extra"]
+    assert table.schema.field("total").type == "double"
+    rows = table.to_pylist()
+    assert json.loads(rows[0]["lines"]) == [{"sku": "A", "qty": 2}]  # nested values are JSON text
+    # A string in the float column and an unknown field are kept, not dropped or coerced
+    assert rows[2]["total"] is None
+    assert json.loads(rows[2]["_extra"]) == {"total": "n/a", "note": "gift"}
+
+def test_mixed_first_group_columns_are_strings():
+    table = pq.read_table(io.BytesIO(_bytes("parquet", ORDERS)))
+    assert table.schema.field("total").type == "string"
+
+def test_parquet_writes_one_row_group_per_chunk():
+    data = b"".join(bundle_writer.parquet_chunks(({"i": i} for i in range(25)), rows_per_group=10))
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.metadata.num_row_groups == 3
+    assert parquet.read().column("i").to_pylist() == list(range(25))
+
+def test_empty_sources_are_valid_files():
+    assert pq.read_table(io.BytesIO(_bytes("parquet", []))).num_rows == 0
+    assert _bytes("ndjson", []) == b""
+
+def test_bundle_entries_per_format():
+    sources = {"orders": ORDERS, "customer": [{"email": "a@example.com"}]}
+    entries = record_entries("data/", sources, ["json", "ndjson", "parquet"])
+    data = io.BytesIO()
+    stream_bundle(entries, lambda pipe: data.write(pipe.read()))
+    with zipfile.ZipFile(io.BytesIO(data.getvalue())) as z:
+        assert z.namelist() == [
+            "data/orders.ndjson", "data/customer.ndjson", "data/orders.parquet", "data/customer.parquet",
+        ]
+        assert z.getinfo("data/orders.parquet").compress_type == zipfile.ZIP_STORED
+
+def test_check_formats():
+    assert check_formats(["ndjson", "json", "ndjson"]) == ["ndjson", "json"]
+    for formats in ([], ["xml"]):
+        with pytest.raises(ValueError):
+            check_formats(formats)
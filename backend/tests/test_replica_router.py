@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.database import STICKY_PREFIX, ReplicaRouter
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def replica(tmp_path):
+    return create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+
+@pytest.fixture
+async def routers():
+    made = []
+
+    def make(engines, **kwargs) -> ReplicaRouter:
+        kwargs = {"max_lag": 5, "check_interval": 60, "sticky_seconds": 5, **kwargs}
+        router = ReplicaRouter(engines, **kwargs)
+        made.append(router)
+        return router
+    yield make
+    for router in made:
+        # fakeredis's async client can swallow a cancel that lands mid-command: repeat it
+        while router._listener is not None and not router._listener.done():
+            router._listener.cancel()
+            await asyncio.wait([router._listener], timeout=0.1)
+
+async def _until(predicate, timeout=3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.02)
+
+async def test_no_replicas_reads_primary(routers):
+    assert await routers([]).pick("1") is None
+
+async def test_writer_reads_its_own_writes(routers, replica):
+    router = routers([replica])
+    assert await router.pick("1") is replica
+    await router.remember_write("1")
+    assert await router.pick("1") is None
+    assert await router.pick("2") is replica
+
+async def test_lagging_replica_is_skipped(routers, replica, monkeypatch):
+    router = routers([replica], max_lag=1)
+    async def lag(engine):
+        return 30.0
+    monkeypatch.setattr(router, "replica_lag", lag)
+    assert await router.pick("1") is None
+
+async def test_marker_is_shared_with_other_processes(routers, replica, redis_client):
+    writer, reader = routers([replica]), routers([replica])
+    await writer.remember_write("7")
+    assert redis_client.pttl(f"{STICKY_PREFIX}7") > 0
+
+    # Listener down: the Redis marker is checked directly
+    assert await reader.is_sticky("7")
+    await _until(lambda: reader._listening)
+    await writer.remember_write("8")
+    await _until(lambda: "8" in reader._recent_writes)
+    assert await reader.pick("8") is None
+
+async def test_markers_written_before_subscribing_are_loaded(routers, replica, redis_client):
+    redis_client.set(f"{STICKY_PREFIX}9", "1", px=5000)
+    reader = routers([replica])
+    await reader.is_sticky("other")
+    await _until(lambda: reader._listening)
+    assert "9" in reader._recent_writes
+    assert await reader.is_sticky("9")
@@ -0,0 +1,58 @@
+import re
+from concurrent.futures.process import BrokenProcessPool
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from app.config import settings
+from app.services import report_pdf
+from app.services.report_pdf import FONT, TABLE_SIZE, TEMPLATE_VERSION, clip, render_pdf, static_pages
+
+def _pages(pdf: bytes) -> int:
+    return len(re.findall(rb"/Type /Page\b(?!s)", pdf))
+
+def _findings(n):
+    return {"findings": [
+        {"source": "shopify", "records": [{"id": i, "email": f"c{i}@example.com", "total": i * 1.5} for i in range(n)]},
+        {"source": "mailchimp", "objects": 0, "records": []},
+    ]}
+
+def test_static_layers_are_laid_out_once_per_language():
+    assert static_pages(TEMPLATE_VERSION, "tr") is static_pages(TEMPLATE_VERSION, "tr")
+    assert static_pages(TEMPLATE_VERSION, "tr") != static_pages(TEMPLATE_VERSION, "en")
+
+def test_clip_fits_the_column():
+    assert clip("short", 200) == "short"
+    clipped = clip("x" * 500, 100)
+    assert clipped.endswith("…") and stringWidth(clipped, FONT, TABLE_SIZE) <= 100
+
+def test_every_record_gets_a_row_across_pages():
+    static = len(static_pages(TEMPLATE_VERSION, "tr"))
+    small, large = render_pdf("r1", _findings(10)), render_pdf("r1", _findings(2000))
+    assert small.startswith(b"%PDF")
+    assert _pages(small) == 1 + static + 1
+    # ~50 rows per page: the record table grows, nothing is truncated away
+    assert _pages(large) > _pages(small) + 30
+
+def test_wide_records_overflow_into_one_column():
+    header, rows = report_pdf._record_table([{f"k{i}": i for i in range(10)}], "other")
+    assert header == ["#", "k0", "k1", "k2", "k3", "k4", "other"]
+    assert next(rows)[-1] == {f"k{i}": i for i in range(5, 10)}
+
+def test_failed_sources_and_unknown_language():
+    pdf = render_pdf("r1", {"findings": [], "failed_sources": [{"source": "s", "error": "timeout"}]}, language="xx")
+    assert _pages(pdf) == 1 + len(static_pages(TEMPLATE_VERSION, "tr"))
+
+def test_render_report_falls_back_inline(monkeypatch):
+    class DeadPool:
+        def submit(self, *args):
+            raise BrokenProcessPool("worker died")
+    monkeypatch.setattr(report_pdf, "_pool", None)
+    monkeypatch.setattr(report_pdf, "_get_pool", lambda: DeadPool())
+    assert report_pdf.render_report("r1", _findings(3)).startswith(b"%PDF")
+
+def test_render_report_in_the_pool(monkeypatch):
+    monkeypatch.setattr(settings, "report_render_workers", 1)
+    monkeypatch.setattr(report_pdf, "_pool", None)
+    try:
+        assert _pages(report_pdf.render_report("r1", _findings(3), "en")) == 2 + len(static_pages(TEMPLATE_VERSION, "en"))
+    finally:
+        if report_pdf._pool is not None:
+            report_pdf._pool.shutdown()
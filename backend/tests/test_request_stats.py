@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlmodel import Session, select
+from app.database import engine
+from app.models import DSARRequest, RequestStatusCounter
+from app.requests import router
+from app.services.request_stats import (
+    count_by_status, get_request_stats, rebuild_request_stats, set_request_status,
+)
+
+pytestmark = pytest.mark.anyio
+
+def _counters(user_id):
+    with Session(engine) as session:
+        rows = session.exec(
+            select(RequestStatusCounter.status, RequestStatusCounter.count)
+            .where(RequestStatusCounter.user_id == user_id)
+        ).all()
+    return {status: count for status, count in rows if count}
+
+def _insert_uncounted(user_id, status):
+    with Session(engine) as session:
+        session.add(DSARRequest(
+            user_id=user_id, request_type="access", subject_email="s@example.com", subject_name="S",
+            status=status, due_date=datetime.utcnow() + timedelta(days=30),
+        ))
+        session.commit()
+
+def test_counters_follow_status_transitions(user, make_request):
+    first = make_request(user)
+    make_request(user)
+    with Session(engine) as session:
+        request = session.get(DSARRequest, first.id)
+        set_request_status(session, request, "completed")
+        session.commit()
+        assert request.version == 2
+        assert request.completed_at is not None
+
+    assert _counters(user) == {"pending": 1, "completed": 1}
+    with Session(engine) as session:
+        assert _counters(user) == count_by_status(session, user)
+
+def test_tenant_without_counters_reads_group_by(user):
+    _insert_uncounted(user, "pending")
+    _insert_uncounted(user, "rejected")
+    with Session(engine) as session:
+        stats = get_request_stats(session, user)
+    assert stats == {"total": 2, "pending": 1, "processing": 0, "completed": 0, "rejected": 1}
+    assert _counters(user) == {}  # a read never writes counters
+
+def test_first_tracked_write_seeds_existing_rows_once(user, make_request):
+    _insert_uncounted(user, "processing")
+    _insert_uncounted(user, "processing")
+    make_request(user)  # seeds, its own row included, no extra delta
+    assert _counters(user) == {"processing": 2, "pending": 1}
+
+def test_rebuild_repairs_drifted_counters(user, make_request):
+    make_request(user)
+    make_request(user, status="completed")
+    with Session(engine) as session:
+        counter = session.exec(select(RequestStatusCounter).where(RequestStatusCounter.status == "pending")).one()
+        counter.count = 99
+        session.add(counter)
+        session.commit()
+    with Session(engine) as session:
+        assert rebuild_request_stats(session, user) == {"pending": 1, "completed": 1}
+    assert _counters(user) == {"pending": 1, "completed": 1}
+
+async def test_stats_endpoint_and_status_patch(api, user, make_request):
+    request = make_request(user)
+    make_request(user)
+    client = api(router)
+
+    response = await client.patch(f"/api/v1/requests/{request.request_id}", params={"status": "processing"})
+    assert response.json() == {"status": "updated", "new_status": "processing"}
+
+    stats = (await client.get("/api/v1/requests/stats")).json()
+    assert stats == {"total": 2, "pending": 1, "processing": 1, "completed": 0, "rejected": 0}
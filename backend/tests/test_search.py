@@ -0,0 +1,55 @@
+import pytest
+from sqlmodel import Session
+from app.database import engine
+from app.models import DSARRequest
+from app.requests import router
+from app.services import search
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def subjects(user, other_user, make_request):
+    rows = {
+        "ayse": make_request(user, subject_email="ayse.yilmaz@gmail.com", subject_name="Ayşe Yılmaz"),
+        "mehmet": make_request(user, subject_email="mehmet@example.com", subject_name="Mehmet Kaya",
+                               description="asked about gmail forwarding"),
+        "other": make_request(other_user, subject_email="ayse@gmail.com", subject_name="Ayse Other"),
+    }
+    return {name: row.id for name, row in rows.items()}
+
+def _ids(found):
+    return [req.id for req, _ in found]
+
+@pytest.mark.parametrize("rows", [1, None], ids=["tenant-scan", "fts5"])
+def test_fragments_match_within_the_tenant(user, subjects, rows):
+    with Session(engine) as session:
+        found = session.exec(search.search_query("sqlite", user, ["gmail"], 10, rows)).all()
+        assert sorted(_ids(found)) == sorted([subjects["ayse"], subjects["mehmet"]])
+
+        found = session.exec(search.search_query("sqlite", user, ["gmail", "yilmaz"], 10, rows)).all()
+        assert _ids(found) == [subjects["ayse"]]
+
+def test_fts_index_follows_updates(user, subjects):
+    with Session(engine) as session:
+        row = session.get(DSARRequest, subjects["mehmet"])
+        row.subject_name = "Mehmet Demirci"
+        session.add(row)
+        session.commit()
+        found = session.exec(search.search_query("sqlite", user, ["demirci"], 10, None)).all()
+        assert _ids(found) == [subjects["mehmet"]]
+        assert session.exec(search.search_query("sqlite", user, ["kaya"], 10, None)).all() == []
+
+def test_tenant_rows_come_from_counters(user, subjects):
+    with Session(engine) as session:
+        assert search.tenant_rows(session, user) == 2
+
+def test_short_terms_are_rejected():
+    with pytest.raises(ValueError):
+        search.parse_terms("ab gmail")
+    assert search.parse_terms("  gmail   ayse ") == ["gmail", "ayse"]
+
+async def test_search_endpoint(api, subjects):
+    client = api(router)
+    results = (await client.get("/api/v1/requests/search", params={"q": "AYSE gmail"})).json()
+    assert [r["id"] for r in results] == [subjects["ayse"]]
+    assert (await client.get("/api/v1/requests/search", params={"q": "gmail xy"})).status_code == 400
@@ -0,0 +1,78 @@
+from datetime import timedelta
+import pytest
+from sqlmodel import Session, select
+from app.database import engine
+from app.models import CasObject, SourceSnapshot
+from app.services import snapshots, storage
+from app.services.snapshots import IncrementalExport, SnapshotStore, content_hash, unchanged_sources
+
+ACCOUNT, EMAIL = "shop-1", "Ayse@Example.com"
+
+@pytest.fixture
+def store(s3):
+    return SnapshotStore(s3, storage.bucket())
+
+def _export(store, sources, formats=("ndjson",)):
+    """One export: entries consumed as the bundle writer would, then saved."""
+    export = IncrementalExport(store, ACCOUNT, EMAIL, formats)
+    contents = {name: b"".join(chunks) for name, chunks in export.entries("data/", sources)}
+    export.save()
+    return export, contents
+
+ORDERS = [{"id": 1, "total": 10}, {"id": 2, "total": 20}]
+
+def test_content_hash_ignores_key_order_not_record_order():
+    assert content_hash([{"a": 1, "b": 2}]) == content_hash([{"b": 2, "a": 1}])
+    assert content_hash(ORDERS) != content_hash(ORDERS[::-1])
+
+def test_unchanged_records_are_stitched_in(store):
+    first, built = _export(store, [{"source": "orders", "records": ORDERS, "fingerprint": "v1"}])
+    assert first.rebuilt == ["data/orders.ndjson"]
+    again, stitched = _export(store, [{"source": "orders", "records": [dict(r) for r in ORDERS]}])
+    assert (again.reused, again.rebuilt) == (["data/orders.ndjson"], [])
+    assert stitched == built
+
+def test_changed_records_replace_the_snapshot(store):
+    _export(store, [{"source": "orders", "records": ORDERS}])
+    changed = ORDERS + [{"id": 3, "total": 5}]
+    export, contents = _export(store, [{"source": "orders", "records": changed}])
+    assert export.rebuilt == ["data/orders.ndjson"]
+    assert contents["data/orders.ndjson"].count(b"\n") == 3
+    with Session(engine) as session:
+        [row] = session.exec(select(SourceSnapshot)).all()
+        assert row.record_count == 3
+        # The replaced blob lost its reference, the new one holds it
+        refs = {o.key: o.refcount for o in session.exec(select(CasObject)).all()}
+        assert refs[row.blob_key] == 1 and sorted(refs.values()) == [0, 1]
+
+def test_unfetched_sources_by_fingerprint(store):
+    _export(store, [{"source": "orders", "records": ORDERS, "fingerprint": "v1"}], formats=("ndjson", "json"))
+    assert unchanged_sources(ACCOUNT, EMAIL, {"orders": "v1", "refunds": "v1"}, ["ndjson", "json"]) == {"orders"}
+    assert unchanged_sources(ACCOUNT, EMAIL, {"orders": "v2"}, ["ndjson"]) == set()
+    # A format the snapshot never had still needs the records
+    assert unchanged_sources(ACCOUNT, EMAIL, {"orders": "v1"}, ["parquet"]) == set()
+
+    export, _ = _export(store, [{"source": "orders", "fingerprint": "v1"}], formats=("ndjson", "json"))
+    assert export.reused == ["data/orders.ndjson", "data/orders.json"]
+    with pytest.raises(ValueError):
+        _export(store, [{"source": "orders", "fingerprint": "v2"}])
+
+def test_missing_blob_is_rebuilt(store, s3):
+    _export(store, [{"source": "orders", "records": ORDERS}])
+    with Session(engine) as session:
+        key = session.exec(select(SourceSnapshot.blob_key)).one()
+    s3.delete_object(Bucket=storage.bucket(), Key=key)
+    export, _ = _export(store, [{"source": "orders", "records": ORDERS}])
+    assert export.rebuilt == ["data/orders.ndjson"]
+
+def test_erasure_drops_snapshots_and_blobs(store, s3):
+    _export(store, [{"source": "orders", "records": ORDERS}, {"source": "customer", "records": [{"n": 1}]}])
+    assert snapshots.forget_subject(store, EMAIL.lower()) == 2
+    with Session(engine) as session:
+        assert session.exec(select(SourceSnapshot)).all() == []
+    assert s3.list_objects_v2(Bucket=storage.bucket())["KeyCount"] == 0
+
+def test_expired_snapshots(store):
+    _export(store, [{"source": "orders", "records": ORDERS}])
+    assert snapshots.expire_snapshots(timedelta(days=1)) == 0
+    assert snapshots.expire_snapshots(timedelta(0)) == 1
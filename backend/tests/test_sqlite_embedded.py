@@ -0,0 +1,66 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlalchemy import event, text
+from sqlmodel import Session, select
+from app.database import engine, write_queue
+from app.models import User
+from app.sqlite_embedded import WriteQueue
+
+pytestmark = pytest.mark.anyio
+
+def test_connections_use_wal_and_busy_timeout():
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() > 0
+
+def _add_user(session, email):
+    session.add(User(email=email, full_name="W", company_name="W"))
+    return threading.current_thread().name
+
+def test_write_queue_serializes_writers_and_commits():
+    with ThreadPoolExecutor(8) as pool:
+        threads = list(pool.map(lambda i: write_queue.run(_add_user, f"w{i}@example.com"), range(40)))
+    assert set(threads) == {"sqlite-writer"}
+    with Session(engine) as session:
+        assert len(session.exec(select(User)).all()) == 40
+
+def _fail(session):
+    session.add(User(email="never@example.com", full_name="N", company_name="N"))
+    session.flush()
+    raise LookupError("boom")
+
+def test_errors_reach_the_caller_and_roll_back():
+    with pytest.raises(LookupError):
+        write_queue.run(_fail)
+    with Session(engine) as session:
+        assert session.exec(select(User).where(User.email == "never@example.com")).first() is None
+
+def _nested(session):
+    # A job that writes again from the writer thread runs inline instead of deadlocking
+    return write_queue.run(_add_user, "nested@example.com")
+
+def test_nested_job_runs_inline():
+    assert write_queue.run(_nested) == "sqlite-writer"
+
+async def test_async_callers_await_the_writer():
+    assert await write_queue.arun(_add_user, "async@example.com") == "sqlite-writer"
+
+def test_disabled_queue_runs_inline():
+    inline = WriteQueue(engine, enabled=False)
+    assert inline.run(_add_user, "inline@example.com") == threading.current_thread().name
+
+def test_writes_begin_immediate_reads_deferred():
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with write_queue.engine.begin() as conn:
+            conn.execute(text("SELECT 1"))
+        with engine.begin() as conn:
+            conn.execute(text("SELECT 1"))
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert [s for s in statements if s.startswith("BEGIN")] == ["BEGIN IMMEDIATE", "BEGIN"]
@@ -0,0 +1,67 @@
+import threading
+import types
+import pytest
+from app.services import storage
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = types.SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(storage, "time", types.SimpleNamespace(time=lambda: now.value))
+    storage._presigned.clear()
+    yield now
+    storage._presigned.clear()
+
+@pytest.fixture
+def signed(s3, monkeypatch):
+    """Keys signed by the client; a cache hit signs nothing."""
+    keys, real = [], s3.generate_presigned_url
+
+    def sign(**kwargs):
+        keys.append(kwargs["Params"]["Key"])
+        return real(**kwargs)
+    monkeypatch.setattr(s3, "generate_presigned_url", sign)
+    return keys
+
+def test_one_client_per_store_and_process(s3):
+    assert storage.client() is s3
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(storage.client())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(c is s3 for c in clients)
+    assert storage.client("r2") is not s3
+
+def test_clients_are_rebuilt_in_a_new_process(s3, monkeypatch):
+    monkeypatch.setattr(storage, "_pid", -1)  # as seen by a forked child
+    fresh = storage.client()
+    assert fresh is not s3 and storage.client() is fresh
+    storage._reset()
+    assert storage.client() is not fresh
+
+def test_pool_size_comes_from_settings(s3):
+    assert s3.meta.config.max_pool_connections == storage.settings.s3_max_pool_connections
+    assert s3.meta.config.tcp_keepalive
+
+@pytest.mark.parametrize("expires_in", [20, 900])
+def test_cached_urls_keep_at_least_half_their_validity(signed, clock, expires_in):
+    url = storage.presigned_get("cas/a.zip", expires_in)
+    assert "cas/a.zip" in url
+    clock.value += expires_in / 2 - 1
+    assert storage.presigned_get("cas/a.zip", expires_in) == url and len(signed) == 1
+    clock.value += 2
+    storage.presigned_get("cas/a.zip", expires_in)
+    assert len(signed) == 2
+    storage.presigned_get("cas/a.zip", expires_in + 1)  # its own expiry, its own entry
+    assert len(signed) == 3
+
+def test_presign_cache_is_bounded(signed, clock, monkeypatch):
+    monkeypatch.setattr(storage, "PRESIGN_CACHE_SIZE", 3)
+    for key in "abcd":
+        storage.presigned_get(key, 900)
+    storage.presigned_get("c", 900)  # recently used: kept
+    storage.presigned_get("e", 900)
+    assert [k for _, k, _ in storage._presigned] == ["d", "c", "e"]
+    storage.presigned_get("b", 900)
+    assert signed == ["a", "b", "c", "d", "e", "b"]
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""Export pipeline benchmark - synthetic subjects, 1k-10M records
+
+Her (aşama, kayıt sayısı) ayrı bir process'te koşar: kayıtlar --sources kaynağa
+bölünmüş deterministik sentetik veridir, S3 yerine yerel bir dizin (veya
+--s3-endpoint ile MinIO, bkz. docker-compose) kullanılır. Her koşu için
+kayıt/s, MB/s (üretilen byte), peak RSS ve peak temp-disk raporlanır.
+
+Aşamalar:
+	generate        sadece sentetik kayıt üretimi (diğer aşamaların tabanı)
+	formatters      kaynak başına json/csv/ndjson/parquet yazıcıları (format başına bir satır)
+	bundle          record_entries + stream_bundle, S3'e multipart upload ile
+	package         tasks.ops.package: PDF rapor, artımlı snapshot'lar, CAS, zip
+	export_service  ExportService.create_export_bundle (import edilebiliyorsa)
+
+Sonuçlar --out ile JSON olarak yazılır; --baseline ile önceki bir sonuçla
+karşılaştırılır ve kayıt/s düşüşü ya da RSS artışı --tolerance'ı aşarsa
+exit code 1 döner (release öncesi regresyon kontrolü).
+
+	python tools/export_bench.py --records 1k,10k,100k --out bench.json
+	python tools/export_bench.py --records 1k,10k,100k,1m,10m --stages bundle,package --baseline bench.json
+"""
+import argparse, hashlib, json, os, platform, random, resource, shutil, subprocess, sys, tempfile, threading, time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ("generate", "formatters", "bundle", "package", "export_service")
+FORMATS = ("json", "csv", "ndjson", "parquet")
+BUCKET = "bench"
+SUBJECT = "bench.subject@example.com"
+RSS_SLACK_MB = 16  # küçük koşularda RSS gürültüsü
+
+# --- synthetic data ------------------------------------------------------------
+
+class Synthetic:
+	"""Bir kaynağın sentetik kayıtları: deterministik, her iterasyonda yeniden üretilir (bellekte tutulmaz)."""
+
+	def __init__(self, source, n, seed=0):
+		self.source, self.n, self.seed = source, n, seed
+
+	def __len__(self):
+		return self.n
+
+	def __iter__(self):
+		rng = random.Random(f"{self.source}:{self.seed}")
+		for i in range(self.n):
+			yield {
+				"id": i,
+				"source": self.source,
+				"email": SUBJECT,
+				"created_at": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00Z",
+				"total": round(rng.uniform(1, 500), 2),
+				"currency": rng.choice(("EUR", "USD", "TRY")),
+				"status": rng.choice(("paid", "refunded", "pending")),
+				"items": [{"sku": f"SKU-{rng.randint(1, 9999)}", "qty": rng.randint(1, 4)} for _ in range(rng.randint(1, 3))],
+				"address": {"city": rng.choice(("Berlin", "İstanbul", "Paris")), "zip": f"{rng.randint(10000, 99999)}"},
+				"note": "x" * rng.randint(0, 80),
+			}
+
+def sources(n, count):
+	per, extra = divmod(n, count)
+	return {f"source{i}": Synthetic(f"source{i}", per + (1 if i < extra else 0)) for i in range(count)}
+
+# --- local S3 stand-in ---------------------------------------------------------
+
+class _Body:
+	def __init__(self, path):
+		self._f = open(path, "rb")
+
+	def iter_chunks(self, size):
+		while True:
+			chunk = self._f.read(size)
+			if not chunk:
+				return
+			yield chunk
+
+	def read(self):
+		return self._f.read()
+
+	def close(self):
+		self._f.close()
+
+class LocalS3:
+	"""MultipartUpload ve CasStore'un kullandığı S3 çağrıları, bir dizine yazan sade bir istemci."""
+
+	def __init__(self, root):
+		self.root = root
+		os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+		os.makedirs(os.path.join(root, "uploads"), exist_ok=True)
+		self._n = 0
+
+	def _path(self, key):
+		return os.path.join(self.root, "objects", hashlib.sha1(key.encode()).hexdigest())
+
+	def _missing(self, op):
+		from botocore.exceptions import ClientError
+		return ClientError({"Error": {"Code": "404"}}, op)
+
+	def put_object(self, Bucket, Key, Body, **kw):
+		with open(self._path(Key), "wb") as f:
+			f.write(Body if isinstance(Body, bytes) else Body.read())
+		return {"ETag": '"put"'}
+
+	def head_object(self, Bucket, Key):
+		if not os.path.exists(self._path(Key)):
+			raise self._missing("HeadObject")
+		return {"ContentLength": os.path.getsize(self._path(Key))}
+
+	def get_object(self, Bucket, Key):
+		if not os.path.exists(self._path(Key)):
+			raise self._missing("GetObject")
+		return {"Body": _Body(self._path(Key))}
+
+	def copy(self, CopySource, Bucket, Key):
+		if not os.path.exists(self._path(CopySource["Key"])):
+			raise self._missing("CopyObject")
+		shutil.copyfile(self._path(CopySource["Key"]), self._path(Key))
+
+	def delete_objects(self, Bucket, Delete):
+		for obj in Delete["Objects"]:
+			if os.path.exists(self._path(obj["Key"])):
+				os.remove(self._path(obj["Key"]))
+
+	def create_multipart_upload(self, Bucket, Key, **kw):
+		self._n += 1
+		upload_id = f"u{self._n}"
+		os.makedirs(os.path.join(self.root, "uploads", upload_id))
+		return {"UploadId": upload_id}
+
+	def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kw):
+		with open(os.path.join(self.root, "uploads", UploadId, f"{PartNumber:05d}"), "wb") as f:
+			f.write(Body)
+		return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}
+
+	def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+		parts_dir = os.path.join(self.root, "uploads", UploadId)
+		with open(self._path(Key), "wb") as out:
+			for part in MultipartUpload["Parts"]:
+				with open(os.path.join(parts_dir, f"{part['PartNumber']:05d}"), "rb") as f:
+					shutil.copyfileobj(f, out)
+		shutil.rmtree(parts_dir)
+		return {"ETag": '"mpu"'}
+
+	def abort_multipart_upload(self, Bucket, Key, UploadId):
+		shutil.rmtree(os.path.join(self.root, "uploads", UploadId), ignore_errors=True)
+
+	def list_multipart_uploads(self, Bucket, Prefix="", **kw):
+		return {"Uploads": []}
+
+	def list_parts(self, **kw):
+		from botocore.exceptions import ClientError
+		raise ClientError({"Error": {"Code": "NoSuchUpload"}}, "ListParts")
+
+def s3_client(opts):
+	if not opts.s3_endpoint:
+		return LocalS3(os.path.join(opts.workdir, "s3"))
+	import boto3
+	client = boto3.client("s3", endpoint_url=opts.s3_endpoint, region_name="us-east-1")
+	try:
+		client.create_bucket(Bucket=BUCKET)
+	except Exception:
+		pass
+	return client
+
+# --- measurement ---------------------------------------------------------------
+
+def _rss_mb():
+	with open("/proc/self/statm") as f:
+		return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+class TempDiskSampler(threading.Thread):
+	"""tmpdir'deki dosyalar + silinmiş ama açık spool dosyaları (/proc/self/fd), peak byte."""
+
+	def __init__(self, tmpdir, interval=0.02):
+		super().__init__(daemon=True)
+		self.tmpdir, self.interval, self.peak = tmpdir, interval, 0
+		self._done = threading.Event()
+
+	def _usage(self):
+		seen, total = set(), 0
+		for fd in os.listdir("/proc/self/fd"):
+			try:
+				target = os.readlink(f"/proc/self/fd/{fd}")
+				if target.startswith(self.tmpdir):
+					st = os.fstat(int(fd))
+					if st.st_ino not in seen:
+						seen.add(st.st_ino)
+						total += st.st_size
+			except OSError:
+				continue
+		for dirpath, _, files in os.walk(self.tmpdir):
+			for name in files:
+				try:
+					st = os.stat(os.path.join(dirpath, name))
+					if st.st_ino not in seen:
+						seen.add(st.st_ino)
+						total += st.st_size
+				except OSError:
+					continue
+		return total
+
+	def run(self):
+		while not self._done.is_set():
+			self.peak = max(self.peak, self._usage())
+			self._done.wait(self.interval)
+
+	def finish(self):
+		self._done.set()
+		self.join()
+		self.peak = max(self.peak, self._usage())
+
+def measure(fn):
+	"""fn() -> üretilen byte; süre, peak RSS ve peak temp-disk ile birlikte."""
+	tmpdir = tempfile.gettempdir()
+	baseline = _rss_mb()
+	sampler = TempDiskSampler(tmpdir)
+	sampler.start()
+	started = time.perf_counter()
+	try:
+		output = fn()
+	finally:
+		seconds = time.perf_counter() - started
+		sampler.finish()
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+	return {
+		"seconds": round(seconds, 3),
+		"output_bytes": output,
+		"peak_rss_mb": round(peak, 1),
+		"rss_delta_mb": round(max(peak - baseline, 0), 1),
+		"peak_tmp_mb": round(sampler.peak / 2**20, 2),
+	}
+
+def _drain(chunks):
+	total = 0
+	for chunk in chunks:
+		total += len(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+	return total
+
+# --- stages (child process) -------------------------------------------------------
+
+def run_stage(opts):
+	sys.path.insert(0, BACKEND_DIR)
+	data = sources(opts.records, opts.sources)
+	formats = opts.formats.split(",")
+	if "parquet" in formats and opts.stage != "generate":
+		import pyarrow.parquet  # noqa: F401 - import maliyeti ölçüme girmesin
+
+	if opts.stage == "generate":
+		def generate():
+			for records in data.values():
+				for _ in records:
+					pass
+			return 0
+		return [measure(generate)]
+
+	if opts.stage == "formatters":
+		from app.services.bundle_writer import source_chunks
+		rows = []
+		for fmt in formats:
+			row = measure(lambda: sum(_drain(source_chunks(fmt, records)) for records in data.values()))
+			rows.append(dict(row, format=fmt))
+		return rows
+
+	client = s3_client(opts)
+
+	if opts.stage == "bundle":
+		from app.services.bundle_writer import record_entries, s3_uploader, stream_bundle
+		record_formats = [f for f in formats if f in ("ndjson", "parquet")] or ["ndjson"]
+		def bundle():
+			result = stream_bundle(record_entries("data/", data, record_formats), s3_uploader(client, BUCKET, "bench/bundle.zip"))
+			if result.upload_error:
+				raise result.upload_error
+			return result.size
+		return [dict(measure(bundle), format="+".join(record_formats))]
+
+	if opts.stage == "package":
+		from app.database import create_db_and_tables
+		from app.tasks import ops
+		create_db_and_tables()
+		ops.s3, ops.S3_BUCKET = (lambda: client), BUCKET
+		findings = {"findings": [{"source": name, "records": records} for name, records in data.items()]}
+		def package():
+			result = ops.package.run("bench", "bench", findings, formats=formats, subject_email=SUBJECT)
+			return client.head_object(Bucket=BUCKET, Key=result["key"])["ContentLength"]
+		return [dict(measure(package), format="+".join(formats))]
+
+	if opts.stage == "export_service":
+		try:
+			from app.services.export_service import ExportService
+		except Exception as e:
+			return [{"skipped": f"{type(e).__name__}: {e}"}]
+		import asyncio
+		from types import SimpleNamespace
+		service = ExportService.__new__(ExportService)
+		service.s3_client = client
+		request = SimpleNamespace(
+			id=1, subject_email=SUBJECT, subject_name="Bench", created_at=datetime.utcnow(), due_date=datetime.utcnow(),
+			request_type=SimpleNamespace(value="access"), status=SimpleNamespace(value="processing"),
+		)
+		def export():
+			# ExportService veriyi liste olarak alır: kayıtlar bu aşamada bellekte
+			bundle = asyncio.run(service.create_export_bundle(request, {k: list(v) for k, v in data.items()}, formats))
+			return bundle.file_size
+		return [dict(measure(export), format="+".join(formats))]
+
+	raise ValueError(opts.stage)
+
+# --- orchestration -------------------------------------------------------------------
+
+def parse_count(text):
+	text = text.strip().lower()
+	scale = {"k": 10**3, "m": 10**6}.get(text[-1], 1)
+	return int(float(text.rstrip("km")) * scale)
+
+def child_env(workdir, tmpdir):
+	return dict(os.environ,
+		DATABASE_URL=f"sqlite:///{workdir}/bench.db",
+		APP_ENV="bench",
+		REDIS_URL=os.environ.get("BENCH_REDIS_URL", "redis://127.0.0.1:1/0"),  # checkpoint'ler olmadan
+		TMPDIR=tmpdir,
+	)
+
+def run_one(stage, records, opts):
+	workdir = tempfile.mkdtemp(prefix="export-bench-")
+	tmpdir = os.path.join(workdir, "tmp")
+	os.makedirs(tmpdir)
+	args = [
+		"--role", "run", "--stage", stage, "--records", str(records), "--sources", str(opts.sources),
+		"--formats", opts.formats, "--workdir", workdir,
+	] + (["--s3-endpoint", opts.s3_endpoint] if opts.s3_endpoint else [])
+	try:
+		proc = subprocess.run(
+			[sys.executable, os.path.abspath(__file__), *args],
+			cwd=BACKEND_DIR, env=child_env(workdir, tmpdir), capture_output=True, text=True, timeout=opts.timeout,
+		)
+		if proc.returncode != 0:
+			return [{"error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}]
+		return json.loads(proc.stdout.strip().splitlines()[-1])
+	except subprocess.TimeoutExpired:
+		return [{"error": f"timeout after {opts.timeout}s"}]
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+
+def with_rates(row, stage, records, sources_n):
+	row = dict(stage=stage, records=records, sources=sources_n, **row)
+	seconds = row.get("seconds")
+	if seconds:
+		row["records_per_s"] = round(records / seconds, 1)
+		row["mb_per_s"] = round((row.get("output_bytes") or 0) / 2**20 / seconds, 2)
+	return row
+
+def compare(results, baseline, tolerance):
+	"""Baseline'a göre regresyonlar: kayıt/s düşüşü veya peak RSS artışı > tolerance."""
+	key = lambda r: (r["stage"], r.get("format"), r["records"], r["sources"])
+	previous = {key(r): r for r in baseline["results"] if "records_per_s" in r}
+	regressions = []
+	for row in results:
+		old = previous.get(key(row))
+		if not old or "records_per_s" not in row:
+			continue
+		if row["records_per_s"] < old["records_per_s"] * (1 - tolerance):
+			regressions.append(dict(key=key(row), metric="records_per_s", baseline=old["records_per_s"], current=row["records_per_s"]))
+		if row["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerance) + RSS_SLACK_MB:
+			regressions.append(dict(key=key(row), metric="peak_rss_mb", baseline=old["peak_rss_mb"], current=row["peak_rss_mb"]))
+	return regressions
+
+def _git_rev():
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip() or None
+	except OSError:
+		return None
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--role", choices=["run"])
+	parser.add_argument("--stage", choices=STAGES)
+	parser.add_argument("--workdir")
+	parser.add_argument("--records", default="1k,10k,100k", help="virgülle: 1k,10k,100k,1m,10m")
+	parser.add_argument("--sources", type=int, default=4, help="kayıtların bölündüğü kaynak sayısı")
+	parser.add_argument("--stages", default=",".join(STAGES))
+	parser.add_argument("--formats", default=",".join(FORMATS))
+	parser.add_argument("--s3-endpoint", help="gerçek S3 uyumlu hedef (örn. MinIO http://localhost:9000)")
+	parser.add_argument("--timeout", type=int, default=3600, help="koşu başına saniye")
+	parser.add_argument("--out", help="sonuç JSON dosyası")
+	parser.add_argument("--baseline", help="karşılaştırılacak önceki sonuç JSON'u")
+	parser.add_argument("--tolerance", type=float, default=0.2)
+	opts = parser.parse_args()
+
+	if opts.role == "run":
+		opts.records = int(opts.records)
+		print(json.dumps(run_stage(opts)))
+		return
+
+	counts = [parse_count(c) for c in opts.records.split(",")]
+	stages = [s for s in opts.stages.split(",") if s]
+	results = []
+	print(f"{'stage':<15}{'format':<28}{'records':>10}{'rec/s':>12}{'MB/s':>9}{'peak RSS':>10}{'Δ RSS':>8}{'tmp MB':>9}{'sec':>9}")
+	for stage in stages:
+		for records in counts:
+			for row in run_one(stage, records, opts):
+				row = with_rates(row, stage, records, opts.sources)
+				results.append(row)
+				if "seconds" in row:
+					print(f"{stage:<15}{row.get('format') or '-':<28}{records:>10}{row['records_per_s']:>12}{row['mb_per_s']:>9}"
+						f"{row['peak_rss_mb']:>10}{row['rss_delta_mb']:>8}{row['peak_tmp_mb']:>9}{row['seconds']:>9}")
+				else:
+					print(f"{stage:<15}{'-':<28}{records:>10}  {row.get('skipped') or row.get('error')}")
+
+	report = {
+		"meta": {
+			"git": _git_rev(), "python": platform.python_version(), "platform": platform.platform(),
+			"cpus": os.cpu_count(), "at": datetime.utcnow().isoformat() + "Z",
+			"s3": opts.s3_endpoint or "local", "sources": opts.sources, "formats": opts.formats,
+		},
+		"results": results,
+	}
+	if opts.out:
+		with open(opts.out, "w") as f:
+			json.dump(report, f, indent=2)
+	if opts.baseline:
+		with open(opts.baseline) as f:
+			regressions = compare(results, json.load(f), opts.tolerance)
+		for r in regressions:
+			print(f"REGRESSION {r['key']}: {r['metric']} {r['baseline']} -> {r['current']}")
+		if regressions:
+			sys.exit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""SQLite yazma benchmark'ı - varsayılan ayarlar vs embedded mod
+
+API (thread'li webhook yazımları) ve Celery worker'ları (status güncellemeleri)
+ayrı process'ler olarak aynı dosyaya eşzamanlı yazar. Her mod için toplam
+yazma/saniye, "database is locked" hataları ve p95 gecikme raporlanır.
+
+	python tools/sqlite_bench.py --seconds 10 --api-threads 8 --workers 2
+"""
+import argparse, json, os, random, subprocess, sys, tempfile, threading, time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_REQUESTS = 1000
+
+def _app():
+	# Engine import sırasında kurulur: DATABASE_URL / SQLITE_EMBEDDED önceden set edilmiş olmalı
+	sys.path.insert(0, BACKEND_DIR)
+	from sqlmodel import select
+	from app import database, models
+	from app.services.request_stats import record_status_change, set_request_status
+	return database, models, select, record_status_change, set_request_status
+
+def setup():
+	database, models, _, record_status_change, _ = _app()
+	database.create_db_and_tables()
+	now = datetime.utcnow()
+
+	def seed(session):
+		session.add(models.User(id=1, email="bench@example.com", full_name="Bench", company_name="Bench"))
+		for i in range(SEED_REQUESTS):
+			session.add(models.DSARRequest(
+				user_id=1, request_type="access", subject_email=f"seed{i}@example.com",
+				subject_name="Seed", due_date=now + timedelta(days=30), source="bench",
+			))
+		session.flush()
+		record_status_change(session, 1, None, "pending")
+
+	database.write_queue.run(seed)
+	return {"seeded": SEED_REQUESTS}
+
+def api_write(session, models, record_status_change, n):
+	# Webhook: yeni DSAR + sayaç (sayaç önce okur, sonra yazar)
+	request = models.DSARRequest(
+		user_id=1, request_type="access", subject_email=f"api{n}@example.com",
+		subject_name="Bench", due_date=datetime.utcnow() + timedelta(days=30), source="shopify",
+	)
+	session.add(request)
+	record_status_change(session, 1, None, request.status)
+
+def worker_write(session, models, select, set_request_status):
+	# Worker: bir DSAR'ı oku, status'ünü ilerlet
+	request = session.exec(
+		select(models.DSARRequest).where(models.DSARRequest.id == random.randint(1, SEED_REQUESTS))
+	).first()
+	if request:
+		set_request_status(session, request, random.choice(["processing", "completed", "pending"]))
+
+def load(role: str, seconds: float, threads: int):
+	database, models, select, record_status_change, set_request_status = _app()
+	deadline = time.monotonic() + seconds
+	lock = threading.Lock()
+	stats = {"ok": 0, "locked": 0, "errors": 0, "latencies": []}
+
+	def loop(tid):
+		n = 0
+		while time.monotonic() < deadline:
+			n += 1
+			started = time.monotonic()
+			try:
+				if role == "api":
+					database.write_queue.run(api_write, models, record_status_change, f"{os.getpid()}-{tid}-{n}")
+				else:
+					database.write_queue.run(worker_write, models, select, set_request_status)
+				key = "ok"
+			except Exception as e:
+				key = "locked" if "locked" in str(e) or "busy" in str(e) else "errors"
+			with lock:
+				stats[key] += 1
+				if key == "ok":
+					stats["latencies"].append(time.monotonic() - started)
+
+	pool = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+	for t in pool:
+		t.start()
+	for t in pool:
+		t.join()
+	return stats
+
+def _spawn(args, env):
+	return subprocess.Popen(
+		[sys.executable, os.path.abspath(__file__), *args],
+		cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+	)
+
+def _result(proc):
+	out, _ = proc.communicate()
+	return json.loads(out.strip().splitlines()[-1])
+
+def run_mode(embedded: bool, opts):
+	with tempfile.TemporaryDirectory() as tmp:
+		env = dict(os.environ,
+			DATABASE_URL=f"sqlite:///{tmp}/bench.db",
+			SQLITE_EMBEDDED="true" if embedded else "false",
+			APP_ENV="bench",
+		)
+		_result(_spawn(["--role", "setup"], env))
+
+		seconds = str(opts.seconds)
+		procs = [_spawn(["--role", "api", "--seconds", seconds, "--threads", str(opts.api_threads)], env)]
+		procs += [_spawn(["--role", "worker", "--seconds", seconds, "--threads", str(opts.worker_threads)], env)
+			for _ in range(opts.workers)]
+		results = [_result(p) for p in procs]
+
+	latencies = sorted(l for r in results for l in r["latencies"])
+	ok = sum(r["ok"] for r in results)
+	return {
+		"mode": "embedded" if embedded else "default",
+		"writes": ok,
+		"writes_per_sec": round(ok / opts.seconds, 1),
+		"api_writes": results[0]["ok"],
+		"worker_writes": sum(r["ok"] for r in results[1:]),
+		"locked": sum(r["locked"] for r in results),
+		"errors": sum(r["errors"] for r in results),
+		"p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+	}
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--role", choices=["setup", "api", "worker"])
+	parser.add_argument("--threads", type=int, default=1)
+	parser.add_argument("--seconds", type=float, default=10)
+	parser.add_argument("--api-threads", type=int, default=8)
+	parser.add_argument("--workers", type=int, default=2, help="worker process sayısı")
+	parser.add_argument("--worker-threads", type=int, default=4, help="process başına (Celery concurrency)")
+	parser.add_argument("--mode", choices=["default", "embedded", "both"], default="both")
+	opts = parser.parse_args()
+
+	if opts.role == "setup":
+		print(json.dumps(setup()))
+		return
+	if opts.role:
+		print(json.dumps(load(opts.role, opts.seconds, opts.threads)))
+		return
+
+	modes = {"default": [False], "embedded": [True], "both": [False, True]}[opts.mode]
+	print(f"{'mode':<10}{'writes/s':>10}{'api':>8}{'worker':>8}{'locked':>8}{'errors':>8}{'p95 ms':>9}")
+	for embedded in modes:
+		r = run_mode(embedded, opts)
+		print(f"{r['mode']:<10}{r['writes_per_sec']:>10}{r['api_writes']:>8}{r['worker_writes']:>8}"
+			f"{r['locked']:>8}{r['errors']:>8}{str(r['p95_ms']):>9}")
+
+if __name__ == "__main__":
+	main()